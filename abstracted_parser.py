@@ -1,41 +1,171 @@
 import os
+import signal
 import sys
+import time
+import traceback
 from copy import copy, deepcopy
-from typing import List, Dict
+from typing import List, Dict, Iterable, Optional, Tuple
 
+from analysis.energy_profile import EnergyProfile
+from analysis.energy_profile_csv_writer import write_profile_csv
 from analysis.function.function import Function
 from analysis.function.function_csv_writer import write_csv
+from analysis.function.function_table import FunctionTable
 from analysis.single_threaded_analyzer import SingleThreadedAnalyzer
-from parsers.parse_to_abstract import parse_to_abstract
+from analysis.stack_analyzer import StackAnalyzer
+from analysis.statistical_analysis import StatisticalAnalyzer
+from analysis.trace_aggregate import TraceAggregate
+from analysis.vectorized_analyzer import VectorizedAnalyzer
+from parsers.parse_to_abstract import parse_to_abstract, stream_to_abstract, parse_to_table
 from parsers.parser_args import ParserArgs
-from trace_reader_utils.pickle_utils import gzip_pickle
-from trace_representation.app_sample import AppState, PowerSample
+from trace_reader_utils.catalog import Catalog
+from trace_reader_utils.manifest import Manifest, describe_inputs, create_entry
+from trace_reader_utils.pickle_utils import gzip_pickle, gzip_unpickle
+from trace_reader_utils.result_file import write_result_file, write_summary_file, is_result_file, \
+    EXTENSION as RESULT_EXTENSION
+from trace_representation.app_sample import AppState
+from trace_representation.trace_table import TraceTable, TraceTableBuilder
 
 from multiprocessing import Pool
 
 
-def parse_single_trace(args: ParserArgs):
-    (states, power_samples) = parse_to_abstract(args)
+def parse_single_trace(args: ParserArgs, overwrite: bool = False) -> List[str]:
+    """
+    Parses and analyzes one trace, and writes its outputs.
+    :param overwrite: replace existing outputs, instead of writing to new numbered files
+    :return: files that were written
+    """
+    table = None
+    if args.trace_table:
+        table = parse_to_table(args)
+        funs = analyze_state_list(args, table)
+        power_samples = table.power_samples
+    elif args.streaming:
+        encountered_power_states = {}
+        states = stream_to_abstract(args, encountered_power_states)
+        builder = None
+        if args.pickle_trace:
+            # only the compact columns are kept while streaming, not the states themselves
+            builder = TraceTableBuilder()
+            states = _record_states(states, builder)
+        funs = analyze_state_list(args, states)
+        power_samples = list(encountered_power_states.values())
+        if builder is not None:
+            table = builder.build()
+    else:
+        (states, power_samples) = parse_to_abstract(args)
+        funs = analyze_state_list(args, states)
+        if args.pickle_trace:
+            table = TraceTable.from_states(states, power_samples)
 
-    funs = analyze_state_list(args, states)
+    if args.function_table:
+        funs = FunctionTable.from_functions(funs, power_samples, args.filter_dupes)
 
     output_filepath = args.output_dir + args.shared_filename
+    outputs = []
+    if args.pickle_trace:
+        outputs.append(pickle_trace(table, output_filepath, overwrite))
+    return outputs + write_results(args, args.shared_filename, funs, power_samples, output_filepath, overwrite)
+
+
+def write_results(args: ParserArgs, name: str, funs, power_samples, output_filepath: str,
+                  overwrite: bool = False) -> List[str]:
+    """
+    Writes the analysis results in every format that is enabled in args.
+    :param name: name of the trace (or merged traces), used in the catalog
+    :param funs: function dict or FunctionTable
+    :param power_samples: PowerSamples of the trace
+    :param output_filepath: output path, without extension
+    :param overwrite: replace existing outputs, instead of writing to new numbered files
+    :return: files that were written
+    """
+    outputs = []
+    result_file = None
     if args.pickle_functions:
-        pickle_results(funs, power_samples, output_filepath)
+        outputs += save_results(args, funs, power_samples, output_filepath, overwrite)
+        result_file = outputs[0]
+    if args.catalog_file:
+        catalog_results(args, name, result_file, funs, power_samples)
     if args.output_csv:
         fun_list = sorted(list(funs.values()), key=(lambda f: f.local_energy_cost), reverse=True)
-        write_csv(output_filepath, fun_list)
+        outputs.append(write_csv(output_filepath, fun_list, overwrite))
+    return outputs
+
+
+def create_analyzer(args: ParserArgs, states: Iterable[AppState]) -> StatisticalAnalyzer:
+    begin_time = args.get_begin_time()
+    end_time = args.get_end_time()
+    if args.analyzer == 'vectorized':
+        table = states if isinstance(states, TraceTable) else TraceTable.from_states(states)
+        return VectorizedAnalyzer(table, begin_time, end_time, args.filter_dupes, args.alpha)
+    elif args.analyzer == 'stack':
+        return StackAnalyzer(states, begin_time, end_time, args.filter_dupes, args.alpha)
+    return SingleThreadedAnalyzer(states, begin_time, end_time, args.filter_dupes, args.alpha)
 
 
-def analyze_state_list(args: ParserArgs, states: List[AppState]) -> Dict[int, Function]:
-    analyzer = SingleThreadedAnalyzer(states, filter_dupes=args.filter_dupes)
+def analyze_state_list(args: ParserArgs, states: Iterable[AppState]) -> Dict[int, Function]:
+    analyzer = create_analyzer(args, states)
     analyzer.perform_analysis()
     return analyzer.function_dict
 
 
-def pickle_results(function_dict, power_samples, shared_file_name):
-    gzip_pickle(obj=function_dict, file_name=shared_file_name)
-    gzip_pickle(obj=power_samples, file_name=f'{shared_file_name}_power')
+def aggregate_single_trace(args: ParserArgs) -> TraceAggregate:
+    """
+    Parses and analyzes one trace, and reduces the result to a TraceAggregate that can be merged with the
+    aggregates of other traces.
+    :param args: ParserArgs of the trace
+    :return: aggregate of the trace
+    """
+    encountered_power_states = {}
+    if args.trace_table:
+        states = parse_to_table(args)
+        power_samples = states.power_samples
+    elif args.streaming:
+        states = stream_to_abstract(args, encountered_power_states)
+        power_samples = None
+    else:
+        (states, power_samples) = parse_to_abstract(args)
+
+    analyzer = create_analyzer(args, states)
+    analyzer.perform_analysis()
+    if power_samples is None:
+        power_samples = list(encountered_power_states.values())
+    return TraceAggregate.from_analysis(analyzer.function_dict, power_samples, analyzer.total_samples,
+                                       analyzer.total_time)
+
+
+def save_results(args: ParserArgs, function_dict, power_samples, shared_file_name,
+                 overwrite: bool = False) -> List[str]:
+    """
+    :return: files that were written, starting with the file the functions were written to
+    """
+    if args.result_format == 'trr':
+        return [write_result_file(shared_file_name, function_dict, power_samples, overwrite)]
+    return pickle_results(function_dict, power_samples, shared_file_name, overwrite)
+
+
+def pickle_results(function_dict, power_samples, shared_file_name, overwrite: bool = False) -> List[str]:
+    output_file = gzip_pickle(obj=function_dict, file_name=shared_file_name, overwrite=overwrite)
+    power_file = gzip_pickle(obj=power_samples, file_name=f'{shared_file_name}_power', overwrite=overwrite)
+    # the totals of the trace can then be read without unpickling the functions, like from a result file header
+    summary_file = write_summary_file(output_file, function_dict, power_samples)
+    return [output_file, power_file, summary_file]
+
+
+def catalog_results(args: ParserArgs, name: str, result_file: Optional[str], function_dict, power_samples):
+    with Catalog(args.catalog_file) as catalog:
+        catalog.add_trace(name, args.output_dir, os.path.abspath(result_file) if result_file else None,
+                          function_dict, power_samples)
+
+
+def pickle_trace(table: TraceTable, shared_file_name, overwrite: bool = False) -> str:
+    return gzip_pickle(obj=table, file_name=f'{shared_file_name}_trace', overwrite=overwrite)
+
+
+def _record_states(states: Iterable[AppState], builder: TraceTableBuilder) -> Iterable[AppState]:
+    for state in states:
+        builder.add_state(state)
+        yield state
 
 
 def _filter_valid_files(args: ParserArgs, filename):
@@ -49,56 +179,239 @@ def _filter_valid_files(args: ParserArgs, filename):
     return False
 
 
-def output_exists(args: ParserArgs):
-    output_path = f'{args.output_dir}/{args.shared_filename}.csv'
-    return os.path.isfile(output_path)
-
-
 def parse_and_merge(args: ParserArgs):
     if not args.merge_name:
         raise AttributeError(f'Need merged filename in args')
 
-    new_args = copy(args)
-    merged_list: List[AppState] = []
-    merged_power_samples: List[PowerSample] = []
     files = os.listdir(args.log_dir())
+    file_args: List[ParserArgs] = []
     for file in filter(lambda f: _filter_valid_files(args, f), files):
+        new_args = copy(args)
         new_args.shared_filename = str(file).removesuffix('.data')
-        (states, power_samples) = parse_to_abstract(new_args)
-        merged_list += states
-        merged_power_samples += power_samples
+        file_args.append(new_args)
 
-    funs = analyze_state_list(args, merged_list)
-    output_filepath = args.output_dir + args.merge_name
-    if args.pickle_functions:
-        pickle_results(funs, merged_power_samples, output_filepath)
-    if args.output_csv:
-        fun_list = sorted(list(funs.values()), key=(lambda f: f.local_energy_cost), reverse=True)
-        write_csv(output_filepath, fun_list)
+    # every trace is parsed and reduced in a worker, only the small aggregates are sent back and merged here.
+    merged = TraceAggregate()
+    with Pool() as p:
+        for aggregate in p.imap(aggregate_single_trace, file_args):
+            merged.merge(aggregate)
+    funs = merged.to_functions(args.filter_dupes, args.alpha)
+    merged_power_samples = merged.power_samples
+    if args.function_table:
+        funs = FunctionTable.from_functions(funs, merged_power_samples, args.filter_dupes)
+
+    write_results(args, args.merge_name, funs, merged_power_samples, args.output_dir + args.merge_name)
+
+
+def _get_stored_traces(directory: str) -> Dict[str, Dict[str, str]]:
+    """
+    Finds the stored sample tables and results in a directory.
+    :return: for every trace name, the paths of its stored 'trace' (TraceTable) and/or 'result' (functions)
+    """
+    stored: Dict[str, Dict[str, str]] = {}
+    for file in sorted(os.listdir(directory)):
+        path = f'{directory}{file}'
+        if file.endswith('_trace.pickle.gz'):
+            stored.setdefault(file.removesuffix('_trace.pickle.gz'), {})['trace'] = path
+        elif is_result_file(file):
+            # result files are preferred over pickles, they can be read without unpickling
+            stored.setdefault(file.removesuffix(RESULT_EXTENSION), {})['result'] = path
+        elif file.endswith('.pickle.gz') and not file.endswith('_power.pickle.gz'):
+            stored.setdefault(file.removesuffix('.pickle.gz'), {}).setdefault('result', path)
+    return stored
+
+
+def _get_reanalysis_name(args: ParserArgs) -> str:
+    name = f'{args.shared_filename}-alpha{args.alpha}-{"filtered" if args.filter_dupes else "unfiltered"}'
+    if args.begin_time is not None:
+        name += f'-from{args.begin_time}'
+    if args.end_time is not None:
+        name += f'-to{args.end_time}'
+    return name
+
+
+def reanalyze_trace(args: ParserArgs, trace_file: Optional[str], result_file: Optional[str]):
+    """
+    Recomputes the statistics of a trace for the filter_dupes, alpha and time window in args, without parsing it.
+    Without a time window, only the statistics are derived again from the raw counts and sums of the stored result.
+    A time window needs the stored sample table, which is analyzed again.
+    :param args: ParserArgs with the trace name as shared_filename
+    :param trace_file: pickled TraceTable of the trace, if there is one
+    :param result_file: stored functions of the trace, if there are any
+    """
+    windowed = args.begin_time is not None or args.end_time is not None
+    if result_file is not None and not windowed:
+        funs = gzip_unpickle(result_file)
+        if not isinstance(funs, FunctionTable):
+            funs = FunctionTable.from_functions(funs)
+        if len(funs) > 0:
+            funs.post_process(int(funs.total_samples.max()), float(funs.total_runtime_seconds.max()),
+                              args.filter_dupes, args.alpha)
+    elif trace_file is not None:
+        table = gzip_unpickle(trace_file)
+        # the vectorized analyzer gives the same functions as the others, and is the fastest on a stored table
+        analyzer = VectorizedAnalyzer(table, args.get_begin_time(), args.get_end_time(), args.filter_dupes,
+                                      args.alpha)
+        analyzer.perform_analysis()
+        funs = FunctionTable.from_functions(analyzer.function_dict, table.power_samples, args.filter_dupes)
+    else:
+        print(f'Warning, no stored sample table for {args.shared_filename}, can\'t apply a time window')
+        return
 
+    # the results are registered in the catalog under the reanalyzed directory, not as traces of the output directory
+    reanalysis_args = copy(args)
+    reanalysis_args.output_dir = f'{args.output_dir}reanalyzed/'
+    os.makedirs(reanalysis_args.output_dir, exist_ok=True)
+    name = _get_reanalysis_name(args)
+    write_results(reanalysis_args, name, funs, funs.power_samples, reanalysis_args.output_dir + name)
 
-def recursive_parse_directory(args: ParserArgs):
-    if not os.path.exists(args.output_dir):
-        os.mkdir(args.output_dir)
 
+def _reanalyze_stored(task):
+    reanalyze_trace(*task)
+
+
+def reanalyze_directory(args: ParserArgs):
+    """
+    Reanalyzes every stored trace in the output directory, see reanalyze_trace.  The results are written to the
+    reanalyzed subdirectory, named after the trace and the analysis parameters.
+    """
+    tasks = []
+    for name, stored in _get_stored_traces(args.output_dir).items():
+        new_args = copy(args)
+        new_args.shared_filename = name
+        tasks.append((new_args, stored.get('trace'), stored.get('result')))
+
+    with Pool() as p:
+        p.map(_reanalyze_stored, tasks)
+
+
+def profile_trace(args: ParserArgs, trace_file: str) -> str:
+    """
+    Writes the energy of every function per profile_window of a stored sample table, within the time window in args.
+    :param args: ParserArgs with the trace name as shared_filename
+    :param trace_file: pickled TraceTable of the trace
+    :return: file that was written
+    """
+    profile = EnergyProfile(gzip_unpickle(trace_file))
+    output_dir = f'{args.output_dir}profiles/'
+    os.makedirs(output_dir, exist_ok=True)
+    return write_profile_csv(f'{output_dir}{args.shared_filename}-{args.profile_window}ms', profile,
+                             args.get_profile_window(), args.get_begin_time(), args.get_end_time())
+
+
+def _profile_stored(task):
+    profile_trace(*task)
+
+
+def profile_directory(args: ParserArgs):
+    """
+    Profiles every stored sample table in the output directory, see profile_trace.  The profiles are written to the
+    profiles subdirectory.
+    """
+    tasks = []
+    for name, stored in _get_stored_traces(args.output_dir).items():
+        if 'trace' not in stored:
+            continue
+        new_args = copy(args)
+        new_args.shared_filename = name
+        tasks.append((new_args, stored['trace']))
+    if len(tasks) == 0:
+        print(f'Warning, no stored sample tables in {args.output_dir}, they are written with pickle_trace')
+
+    with Pool() as p:
+        p.map(_profile_stored, tasks)
+
+
+def _get_job_size(args: ParserArgs) -> int:
+    return os.path.getsize(args.get_simpleperf_log_file()) + os.path.getsize(args.get_env_log_file())
+
+
+def find_recursive_jobs(args: ParserArgs) -> List[ParserArgs]:
+    """
+    Finds the traces in shared_dir and all of its subdirectories that are new, or changed since they were last
+    parsed according to the manifest of their output directory.  The directory structure is mirrored in output_dir,
+    the output directories are created here.
+    :return: ParserArgs of every trace, largest input files first
+    """
+    jobs: List[ParserArgs] = []
+    for directory, subdirectories, files in os.walk(args.shared_dir):
+        subdirectories.sort()
+        relative_dir = os.path.relpath(directory, args.shared_dir)
+        dir_args = copy(args)
+        dir_args.shared_dir = os.path.join(directory, '')
+        dir_args.output_dir = os.path.join(args.output_dir, relative_dir, '') if relative_dir != '.' \
+            else args.output_dir
+        os.makedirs(dir_args.output_dir, exist_ok=True)
+        manifest = Manifest(dir_args.output_dir)
+        for file in sorted(files):
+            if not _filter_valid_files(dir_args, file):
+                continue
+            file_args = copy(dir_args)
+            file_args.shared_filename = file.removesuffix('.data')
+            if not manifest.is_up_to_date(file_args):
+                jobs.append(file_args)
+    # start the largest traces first, so a big trace doesn't end up running alone at the end
+    jobs.sort(key=_get_job_size, reverse=True)
+    return jobs
+
+
+def _parse_job(args: ParserArgs) -> Tuple[ParserArgs, Optional[dict], Optional[str]]:
+    """
+    Parses one trace in a worker, replacing its earlier outputs.  A failure is returned instead of raised, so it
+    doesn't stop the other traces.
+    :return: the args of the job, its manifest entry and the error, or None if it succeeded
+    """
+    try:
+        # the inputs are described before parsing, so a change while parsing is seen on the next run
+        inputs = describe_inputs(args)
+        outputs = parse_single_trace(args, overwrite=True)
+    except Exception:
+        return args, None, traceback.format_exc()
+    return args, create_entry(args, inputs, outputs), None
+
+
+def run_parse_jobs(jobs: List[ParserArgs]):
+    """
+    Parses the traces on one pool of workers, and records every parsed trace in the manifest of its output
+    directory as soon as it is done, so an interrupted batch can be resumed.
+    :param jobs: ParserArgs of every trace
+    """
+    manifests: Dict[str, Manifest] = {}
+    failed: List[ParserArgs] = []
+    with Pool() as p:
+        for done, (job, entry, error) in enumerate(p.imap_unordered(_parse_job, jobs), start=1):
+            trace = f'{job.log_dir()}{job.shared_filename}'
+            if error is None:
+                if job.output_dir not in manifests:
+                    manifests[job.output_dir] = Manifest(job.output_dir)
+                manifests[job.output_dir].add_entry(job.shared_filename, entry)
+                print(f'[{done}/{len(jobs)}] parsed {trace}')
+            else:
+                print(f'[{done}/{len(jobs)}] failed to parse {trace}:\n{error}')
+                failed.append(job)
+    if failed:
+        print(f'Warning, {len(failed)} of {len(jobs)} traces failed to parse:')
+        for job in failed:
+            print(f'  {job.log_dir()}{job.shared_filename}')
+
+
+def recursive_parse_directory(args: ParserArgs):
+    """
+    Parses every new or changed trace in shared_dir and its subdirectories on one shared pool of workers.
+    """
     if not args.shared_dir:
         raise NotImplementedError
     # enforce use of shared_dir here since it's recursively looking anyway
 
-    items = os.listdir(args.shared_dir)
-    directories = [file for file in items if os.path.isdir(f'{args.shared_dir}/{file}')]
-    files = [x for x in items if os.path.isfile(f'{args.shared_dir}/{x}')]
-    if len(files) > 0:
-        parse_directory(args, files=files, ignore_existing=True)
-
-    for dir in directories:
-        newargs = deepcopy(args)
-        newargs.shared_dir = f'{newargs.shared_dir}/{dir}/'
-        newargs.output_dir = f'{newargs.output_dir}/{dir}/'
-        recursive_parse_directory(newargs)
+    run_parse_jobs(find_recursive_jobs(args))
 
 
 def parse_directory(args: ParserArgs, files: List[str] = None, ignore_existing: bool = False):
+    """
+    Parses the traces in a directory.
+    :param files: files to consider, all the files in the directory if not given
+    :param ignore_existing: skip the traces that are up to date according to the manifest of the output directory
+    """
     if files is None:
         files = os.listdir(args.log_dir())
 
@@ -107,15 +420,85 @@ def parse_directory(args: ParserArgs, files: List[str] = None, ignore_existing:
         file_args.shared_filename = str(file).removesuffix('.data')
         return file_args
 
-    with Pool() as p:
-        filtered_args = [(get_args_for_file(file, args))
-                         for file in files
-                         if _filter_valid_files(args, file)]
-        if ignore_existing:
-            filtered_args = filter(lambda a: not output_exists(a), filtered_args)
-
-
-        p.map(parse_single_trace, filtered_args)
+    filtered_args = [(get_args_for_file(file, args))
+                     for file in files
+                     if _filter_valid_files(args, file)]
+    if ignore_existing:
+        manifest = Manifest(args.output_dir)
+        filtered_args = [a for a in filtered_args if not manifest.is_up_to_date(a)]
+    run_parse_jobs(filtered_args)
+
+
+def _get_input_state(args: ParserArgs) -> Optional[Tuple[int, int, int, int]]:
+    """
+    :return: size and modification time of both input files of the trace, or None if one of them is missing
+    """
+    try:
+        data_stat = os.stat(args.get_simpleperf_log_file())
+        env_stat = os.stat(args.get_env_log_file())
+    except FileNotFoundError:
+        return None
+    return data_stat.st_size, data_stat.st_mtime_ns, env_stat.st_size, env_stat.st_mtime_ns
+
+
+def _ignore_interrupt():
+    # only the watching process handles ctrl-c, the workers are terminated with the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def watch_directory(args: ParserArgs):
+    """
+    Keeps polling the input directory, and parses every trace as soon as it is complete.  A trace is complete once
+    the sizes and modification times of its .data and .txt files have not changed for watch_settle_time seconds.
+    The traces are parsed on one persistent pool of workers, and recorded in the manifest of the output directory
+    as they finish, so traces that are up to date are not parsed again after a restart.  Runs until interrupted.
+    """
+    manifest = Manifest(args.output_dir)
+    # input state of every trace that is waiting to settle, with the time it was first seen in that state
+    settling: Dict[str, Tuple[Tuple[int, int, int, int], float]] = {}
+    # input state of every trace that was parsed (or failed) or found up to date, it is only looked at again
+    # once that state changes
+    handled: Dict[str, Tuple[int, int, int, int]] = {}
+    running = {}
+    print(f'Watching {args.log_dir()} for new traces')
+    with Pool(initializer=_ignore_interrupt) as p:
+        try:
+            while True:
+                now = time.monotonic()
+                for file in sorted(os.listdir(args.log_dir())):
+                    if not file.endswith('.data'):
+                        continue
+                    file_args = copy(args)
+                    file_args.shared_filename = file.removesuffix('.data')
+                    name = file_args.shared_filename
+                    state = _get_input_state(file_args)
+                    if state is None or name in running or handled.get(name) == state:
+                        continue
+                    if name not in settling or settling[name][0] != state:
+                        settling[name] = (state, now)
+                        continue
+                    if now - settling[name][1] < args.watch_settle_time:
+                        continue
+                    del settling[name]
+                    if manifest.is_up_to_date(file_args):
+                        handled[name] = state
+                        continue
+                    running[name] = (p.apply_async(_parse_job, (file_args,)), state)
+
+                for name, (result, state) in list(running.items()):
+                    if not result.ready():
+                        continue
+                    del running[name]
+                    handled[name] = state
+                    job, entry, error = result.get()
+                    if error is None:
+                        manifest.add_entry(name, entry)
+                        print(f'parsed {job.log_dir()}{name}')
+                    else:
+                        print(f'failed to parse {job.log_dir()}{name}:\n{error}')
+                time.sleep(args.watch_interval)
+        except KeyboardInterrupt:
+            print(f'Stopped watching, {len(running)} traces were still being parsed')
 
 
 if __name__ == "__main__":
@@ -138,6 +521,12 @@ if __name__ == "__main__":
         parse_directory(pa)
     elif 'single' in pa.mode:
         parse_single_trace(pa)
+    elif 'reanalyze' in pa.mode:
+        reanalyze_directory(pa)
+    elif 'profile' in pa.mode:
+        profile_directory(pa)
+    elif 'watch' in pa.mode:
+        watch_directory(pa)
     elif 'recursive' in pa.mode:
         recursive_parse_directory(pa)
     else:
@@ -0,0 +1,163 @@
+from typing import List, Optional, Set, Tuple
+
+import numpy as np
+
+from analysis.vectorized_analyzer import CallchainVisits
+from trace_representation.time_unit import TimeUnit
+from trace_representation.trace_table import TraceTable
+
+
+class _EnergyIndex(object):
+    """
+    Energy of a set of visits, grouped per function and in time order within each function, with a running sum.
+    The visits of function f are a contiguous block of keys, and the energy of visits a up to b is
+    cumulative[b] - cumulative[a].
+    """
+
+    def __init__(self, fun_ids: np.ndarray, sample_ids: np.ndarray, energy: np.ndarray, num_funs: int,
+                 num_samples: int):
+        # the samples are in time order, so a stable sort on function keeps every function in time order
+        order = np.argsort(fun_ids, kind='stable')
+        # sample ids are unique within a function, so this key is sorted and every function is a contiguous block
+        self.keys: np.ndarray = fun_ids[order] * (num_samples + 1) + sample_ids[order]
+        self.energy: np.ndarray = energy[order]
+        self.cumulative: np.ndarray = np.zeros(len(order) + 1, dtype=np.float64)
+        np.cumsum(self.energy, out=self.cumulative[1:])
+        self.num_funs: int = num_funs
+        self.num_samples: int = num_samples
+
+    def get_energy(self, begin: int, end: int) -> np.ndarray:
+        """
+        :return: energy of function f in the samples begin up to end at index f
+        """
+        base = np.arange(self.num_funs, dtype=np.int64) * (self.num_samples + 1)
+        return self.cumulative[np.searchsorted(self.keys, base + end, 'left')] - \
+            self.cumulative[np.searchsorted(self.keys, base + begin, 'left')]
+
+    def get_window_energy(self, sample_bounds: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Sums the visits per window and function, only for the (window, function) pairs that have visits.
+        :param sample_bounds: increasing sample indices, window i holds the samples bounds[i] up to bounds[i + 1]
+        :return: window, function and energy of every pair, sorted on window and then function
+        """
+        fun_ids, sample_ids = np.divmod(self.keys, self.num_samples + 1)
+        windows = np.searchsorted(sample_bounds, sample_ids, 'right') - 1
+        valid = (windows >= 0) & (windows < len(sample_bounds) - 1)
+        pair_keys, inverse = np.unique(windows[valid] * self.num_funs + fun_ids[valid], return_inverse=True)
+        energy = np.bincount(inverse, weights=self.energy[valid], minlength=len(pair_keys))
+        pair_windows, pair_funs = np.divmod(pair_keys, self.num_funs)
+        return pair_windows, pair_funs, energy
+
+
+class EnergyProfile(object):
+    """
+    Time index over the energy of the functions in a TraceTable.  The table is laid out once, like in
+    VectorizedAnalyzer, after which the energy of every function in any time window, or in a whole sequence of
+    windows, is found with binary searches and running sums instead of a new pass over the samples.
+    Local energy is the energy of the samples a function is the leaf of, accumulated energy that of all the samples
+    it is in the callchain of (once per sample for recursive calls), the same as local_energy and accumulated_energy
+    of the analyzed Functions up to float rounding.
+    """
+
+    def __init__(self, table: TraceTable):
+        """
+        :param table: samples to index, sorted by time first if they are not in time order yet
+        """
+        table = table.sort_by_time()
+        visits = CallchainVisits(table)
+        self.timestamp: np.ndarray = table.timestamp
+        self.addrs: List[int] = visits.addrs
+        self.name_sets: List[Set[str]] = [set() for _ in self.addrs]
+        symbols = table.symbol_table.symbols
+        for sym_id in np.flatnonzero(np.bincount(visits.visit_sym, minlength=len(symbols))).tolist():
+            self.name_sets[visits.sym_to_fun[sym_id]].add(symbols[sym_id].symbol_name)
+
+        num_samples = len(table)
+        self._local = _EnergyIndex(visits.leaf_fun, np.arange(num_samples, dtype=np.int64), table.energy,
+                                   visits.num_funs, num_samples)
+        count_state = visits.count_state
+        self._accumulated = _EnergyIndex(visits.count_fun, count_state, table.energy[count_state], visits.num_funs,
+                                         num_samples)
+        self._total = np.zeros(num_samples + 1, dtype=np.float64)
+        np.cumsum(table.energy, out=self._total[1:])
+
+    def __len__(self):
+        return len(self.addrs)
+
+    def _get_index(self, accumulated: bool) -> _EnergyIndex:
+        return self._accumulated if accumulated else self._local
+
+    def _get_sample_index(self, time: Optional[TimeUnit], side: str, default: int) -> int:
+        return default if time is None else int(np.searchsorted(self.timestamp, time.to_nanos(), side))
+
+    def _get_window_bounds(self, begin_time: Optional[TimeUnit], end_time: Optional[TimeUnit]) -> Tuple[int, int]:
+        begin = self._get_sample_index(begin_time, 'left', 0)
+        end = self._get_sample_index(end_time, 'right', len(self.timestamp))
+        return begin, max(begin, end)
+
+    def get_total_energy(self, begin_time: Optional[TimeUnit] = None, end_time: Optional[TimeUnit] = None) -> float:
+        """
+        :param begin_time: if given, the window starts at this time
+        :param end_time: if given, the window ends at this time (inclusive)
+        :return: energy of all the samples in the window
+        """
+        begin, end = self._get_window_bounds(begin_time, end_time)
+        return float(self._total[end] - self._total[begin])
+
+    def get_energy(self, begin_time: Optional[TimeUnit] = None, end_time: Optional[TimeUnit] = None,
+                   accumulated: bool = False) -> np.ndarray:
+        """
+        :param begin_time: if given, the window starts at this time
+        :param end_time: if given, the window ends at this time (inclusive), like TraceTable.between
+        :param accumulated: return the accumulated energy instead of the local energy
+        :return: energy of function i in the window at index i, see addrs
+        """
+        return self._get_index(accumulated).get_energy(*self._get_window_bounds(begin_time, end_time))
+
+    def get_top_functions(self, begin_time: Optional[TimeUnit] = None, end_time: Optional[TimeUnit] = None,
+                          count: int = 10, accumulated: bool = False) -> List[Tuple[int, Set[str], float]]:
+        """
+        :return: address, names and energy of the count functions with the most energy in the window, most first
+        """
+        energy = self.get_energy(begin_time, end_time, accumulated)
+        top = np.argsort(-energy, kind='stable')[:count]
+        return [(self.addrs[fun_id], self.name_sets[fun_id], float(energy[fun_id]))
+                for fun_id in top.tolist() if energy[fun_id] > 0]
+
+    def get_windows(self, window_size: TimeUnit, begin_time: Optional[TimeUnit] = None,
+                    end_time: Optional[TimeUnit] = None) -> np.ndarray:
+        """
+        :param window_size: length of every window
+        :param begin_time: start of the first window, the first sample if not given
+        :param end_time: time the last window has to reach, the last sample if not given
+        :return: start times of the windows in nanoseconds
+        """
+        if window_size.to_nanos() <= 0:
+            raise ValueError('window size has to be positive')
+        if len(self.timestamp) == 0 and (begin_time is None or end_time is None):
+            return np.zeros(0, dtype=np.int64)
+        begin = int(self.timestamp[0]) if begin_time is None else begin_time.to_nanos()
+        end = int(self.timestamp[-1]) if end_time is None else end_time.to_nanos()
+        num_windows = max(0, (end - begin) // window_size.to_nanos() + 1)
+        return begin + np.arange(num_windows, dtype=np.int64) * window_size.to_nanos()
+
+    def get_profile(self, window_size: TimeUnit, begin_time: Optional[TimeUnit] = None,
+                    end_time: Optional[TimeUnit] = None, accumulated: bool = False) \
+            -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Energy of every function in consecutive windows, e.g. per second over the whole trace.
+        The windows include their start and exclude their end, so every sample is in at most one window.
+        Most functions only run in a few of the windows, so the result only has the functions that have samples in a
+        window, instead of every function for every window.
+        :param window_size: length of every window
+        :param begin_time: start of the first window, the first sample if not given
+        :param end_time: time the last window has to reach, the last sample if not given
+        :param accumulated: profile the accumulated energy instead of the local energy
+        :return: start times of the windows in nanoseconds (see get_windows), and the window index, function index
+            (see addrs) and energy of every function in every window it has samples in, sorted on window and then
+            function
+        """
+        starts = self.get_windows(window_size, begin_time, end_time)
+        edges = np.append(starts, starts[-1] + window_size.to_nanos()) if len(starts) > 0 else starts
+        sample_bounds = np.searchsorted(self.timestamp, edges, 'left').astype(np.int64)
+        return (starts,) + self._get_index(accumulated).get_window_energy(sample_bounds)
@@ -0,0 +1,42 @@
+import csv
+from typing import Optional
+
+import numpy as np
+
+from analysis.energy_profile import EnergyProfile
+from trace_reader_utils.file_utils import get_filename, atomic_output
+from trace_representation.time_unit import TimeUnit
+
+csv_header = ['window start', 'function address', 'name set', 'local energy', 'accumulated energy']
+
+
+def write_profile_csv(file_name: str, profile: EnergyProfile, window_size: TimeUnit,
+                      begin_time: Optional[TimeUnit] = None, end_time: Optional[TimeUnit] = None,
+                      overwrite: bool = False) -> str:
+    """
+    Writes the local and accumulated energy of every function in every window it has samples in, one row per window
+    and function, see EnergyProfile.get_profile.
+    :return: file that was written
+    """
+    output_file = get_filename(file_name, ext='.csv', overwrite=overwrite)
+    starts, local_windows, local_funs, local_energy = profile.get_profile(window_size, begin_time, end_time)
+    _, acc_windows, acc_funs, acc_energy = profile.get_profile(window_size, begin_time, end_time, accumulated=True)
+
+    # a function can be a leaf in a window without being in a callchain there, and the other way around
+    num_funs = len(profile)
+    local_keys = local_windows * num_funs + local_funs
+    acc_keys = acc_windows * num_funs + acc_funs
+    keys = np.union1d(local_keys, acc_keys)
+    local = np.zeros(len(keys), dtype=np.float64)
+    local[np.searchsorted(keys, local_keys)] = local_energy
+    accumulated = np.zeros(len(keys), dtype=np.float64)
+    accumulated[np.searchsorted(keys, acc_keys)] = acc_energy
+
+    with atomic_output(output_file) as temp_file, open(temp_file, mode='w', newline='') as csvfile:
+        writer = csv.writer(csvfile, delimiter='\t', quotechar='|')
+        writer.writerow(csv_header)
+        for key, local_sum, accumulated_sum in zip(keys.tolist(), local.tolist(), accumulated.tolist()):
+            window, fun_id = divmod(key, num_funs)
+            writer.writerow([int(starts[window]), profile.addrs[fun_id], ' .. '.join(profile.name_sets[fun_id]),
+                             local_sum, accumulated_sum])
+    return output_file
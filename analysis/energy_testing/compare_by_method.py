@@ -6,11 +6,25 @@ from typing import Optional, Callable, Dict, List, Any, MutableMapping, Union, T
 import scipy.stats as stats
 
 from analysis.energy_testing.function_energy_sum import FunctionEnergySum, FunctionEnergySumResult
+from analysis.energy_testing.result_loader import load_files
 from analysis.function.function import Function
+from analysis.function.function_table import to_function_dict, LazyFunctionTable
+from trace_reader_utils.catalog import Catalog
 from trace_reader_utils.pickle_utils import get_dict_from_pickle
+from trace_reader_utils.result_file import ResultFile, is_result_file, read_summary
 
 
 def validate_pickle(file: str) -> Optional[MutableMapping[Any, Function]]:
+    if is_result_file(file):
+        # the header says whether it has functions, the columns are only read when the functions are used
+        try:
+            result_file = ResultFile(file)
+        except (OSError, ValueError):
+            return None
+        return LazyFunctionTable(len(result_file), result_file.to_table) if len(result_file) > 0 else None
+    # pickles that are known to be empty from their summary are not unpickled
+    if (summary := read_summary(file)) is not None and summary['num_functions'] == 0:
+        return None
     try:
         f_dict = get_dict_from_pickle(file)
         if not isinstance(next(iter(f_dict.values())), Function):
@@ -42,7 +56,7 @@ def _add_dict_to_sum(sum_dict: MutableMapping[Any, FunctionEnergySum],
     sum_keys = sum_dict.keys()
     for (key, value) in other_dict.items():
         if key not in sum_keys:
-            sum_dict[key] = FunctionEnergySum(value)
+            sum_dict[key] = copy.deepcopy(value) if isinstance(value, FunctionEnergySum) else FunctionEnergySum(value)
         else:
             fun_sum = sum_dict[key]
             fun_sum += value
@@ -58,7 +72,8 @@ def get_function_sums_from_dicts(dicts: List[MutableMapping[Any, Function]]) ->
     if num_dicts == 0:
         return dict()
 
-    summed_functions = copy.deepcopy(dicts[0])
+    # a FunctionTable is read-only, so it is turned into Functions that can be added to
+    summed_functions = copy.deepcopy(dicts[0]) if isinstance(dicts[0], dict) else to_function_dict(dicts[0])
 
     for x in dicts[1:]:
         _combine_dicts(target_dict=summed_functions, other_dict=x)
@@ -75,16 +90,29 @@ def get_function_energy_sums_from_dicts(dicts: List[MutableMapping[Any, Function
     return sum_dict
 
 
-def _retrieve_filtered_dicts(directory: str, function_filter: [Optional[Callable[[Function], bool]]] = None) -> \
-        List[MutableMapping[Any, Function]]:
-    files = os.listdir(directory)
-    file_paths = [f'{directory}/{file}' for file in files]
+def _load_filtered_dict(file: str, function_filter: [Optional[Callable[[Function], bool]]] = None) -> \
+        Optional[MutableMapping[Any, Function]]:
+    if (fun_dict := validate_pickle(file)) is None:
+        return None
+    return {fun_id: fun for fun_id, fun in fun_dict.items()
+            if function_filter(fun)} if function_filter is not None else fun_dict
+
 
-    function_dicts = [{fun_id: fun for fun_id, fun in fun_dict.items()
-                       if function_filter(fun)} if function_filter is not None else fun_dict
-                      for file in file_paths if (fun_dict := validate_pickle(file)) is not None]
+def _load_energy_sums(file: str, function_filter: [Optional[Callable[[Function], bool]]] = None) -> \
+        Optional[Dict[Any, FunctionEnergySum]]:
+    # only the energy costs and names are needed, so the Functions (and everything they link to) stay in the worker
+    if (fun_dict := _load_filtered_dict(file, function_filter)) is None:
+        return None
+    return {fun_id: FunctionEnergySum(fun) for fun_id, fun in fun_dict.items()}
+
+
+def _get_file_paths(directory: str) -> List[str]:
+    return [f'{directory}/{file}' for file in os.listdir(directory)]
 
-    return function_dicts
+
+def _retrieve_filtered_dicts(directory: str, function_filter: [Optional[Callable[[Function], bool]]] = None) -> \
+        List[MutableMapping[Any, Function]]:
+    return load_files(_load_filtered_dict, _get_file_paths(directory), function_filter)
 
 
 def get_function_sums_from_dir(directory: str, function_filter: [Optional[Callable[[Function], bool]]] = None) -> \
@@ -92,16 +120,46 @@ def get_function_sums_from_dir(directory: str, function_filter: [Optional[Callab
     return get_function_sums_from_dicts(_retrieve_filtered_dicts(directory, function_filter))
 
 
-def get_fes_from_dir(directory: str, function_filter: [Optional[Callable[[Function], bool]]] = None) -> \
-        MutableMapping[Any, FunctionEnergySum]:
-    return get_function_energy_sums_from_dicts(_retrieve_filtered_dicts(directory, function_filter))
+def get_fes_from_dir(directory: str, function_filter: [Optional[Callable[[Function], bool]]] = None,
+                     catalog_file: Optional[str] = None) -> MutableMapping[Any, FunctionEnergySum]:
+    return get_fes_from_dirs([directory], function_filter, catalog_file)[0]
+
+
+def _get_catalog_fes(catalog: Catalog, directory: str) -> MutableMapping[Any, FunctionEnergySum]:
+    trace_dicts: Dict[int, Dict[Any, FunctionEnergySum]] = {}
+    for row in catalog.find_functions(directory=directory):
+        trace_dicts.setdefault(row['trace_id'], {})[row['addr']] = FunctionEnergySum.from_costs(
+            row['addr'], set(row['names'].split(' .. ')), row['local_energy_cost'], row['nonlocal_energy_cost'])
+    return get_function_energy_sums_from_dicts(list(trace_dicts.values()))
+
+
+def get_fes_from_dirs(directories: List[str], function_filter: [Optional[Callable[[Function], bool]]] = None,
+                      catalog_file: Optional[str] = None) -> List[MutableMapping[Any, FunctionEnergySum]]:
+    """
+    Same as get_fes_from_dir for several directories, with the files of all the directories loaded at once.
+    :param catalog_file: Optional catalog that the traces were added to.  Without a filter, the energy costs are then
+        read from the catalog instead of the files.
+    """
+    if catalog_file is not None and function_filter is None:
+        with Catalog(catalog_file) as catalog:
+            return [_get_catalog_fes(catalog, directory) for directory in directories]
+    file_paths = [_get_file_paths(directory) for directory in directories]
+    loaded = load_files(_load_energy_sums, [path for paths in file_paths for path in paths], function_filter,
+                        skip_invalid=False)
+    sums = []
+    begin = 0
+    for paths in file_paths:
+        dicts = [fes_dict for fes_dict in loaded[begin:begin + len(paths)] if fes_dict is not None]
+        sums.append(get_function_energy_sums_from_dicts(dicts))
+        begin += len(paths)
+    return sums
 
 
 def compare_directories_by_method(dir1: str, dir2: str,
-                                  function_filter: [Optional[Callable[[Function], bool]]] = None) -> \
+                                  function_filter: [Optional[Callable[[Function], bool]]] = None,
+                                  catalog_file: Optional[str] = None) -> \
         Tuple[List[FunctionEnergySumResult], List[FunctionEnergySum]]:
-    dir1_sums = get_fes_from_dir(dir1, function_filter)
-    dir2_sums = get_fes_from_dir(dir2, function_filter)
+    dir1_sums, dir2_sums = get_fes_from_dirs([dir1, dir2], function_filter, catalog_file)
 
     results: List[FunctionEnergySumResult] = list()
     unmatched: List[FunctionEnergySum] = list()
@@ -125,10 +183,10 @@ def compare_directories_by_method(dir1: str, dir2: str,
 
 
 def compare_directories_by_method_string(dir1: str, dir2: str,
-                                         function_filter: [Optional[Callable[[Function], bool]]] = None) -> \
+                                         function_filter: [Optional[Callable[[Function], bool]]] = None,
+                                         catalog_file: Optional[str] = None) -> \
         Tuple[List[FunctionEnergySumResult], List[FunctionEnergySum]]:
-    dir1_sums = get_fes_from_dir(dir1, function_filter)
-    dir2_sums = get_fes_from_dir(dir2, function_filter)
+    dir1_sums, dir2_sums = get_fes_from_dirs([dir1, dir2], function_filter, catalog_file)
 
     results: List[FunctionEnergySumResult] = list()
     unmatched: List[FunctionEnergySum] = list()
@@ -1,4 +1,5 @@
 import os
+from collections.abc import Mapping
 import csv
 from functools import singledispatch
 from typing import Union, Callable, Optional, List
@@ -6,6 +7,9 @@ from typing import Union, Callable, Optional, List
 import scipy
 
 from trace_reader_utils.pickle_utils import *
+from trace_reader_utils.catalog import Catalog
+from analysis.energy_testing.result_loader import load_files
+from trace_reader_utils.result_file import read_summary
 
 from analysis.function.function import Function
 
@@ -25,51 +29,65 @@ def sum_full_trace(arg, function_filter) -> float:
 
 @sum_full_trace.register
 def sum_full_trace_str(pickle_file: str, function_filter: Optional[Callable[[Function], bool]] = None) -> float:
+    # result files have the total in their header, and pickles in their summary file, so only the functions have to
+    # be read when filtering.  files without functions are rejected the same way as an empty pickle.
+    if (summary := read_summary(pickle_file)) is not None:
+        if summary['num_functions'] == 0:
+            raise TypeError('Need list of Function type, got empty list')
+        if function_filter is None:
+            return summary['local_energy']
     funs = get_dict_from_pickle(pickle_file)
     return sum_full_trace(funs, function_filter)
 
 
 @sum_full_trace.register
-def sum_full_trace_dict(funs: dict, function_filter: Optional[Callable[[Function], bool]] = None) -> float:
+def sum_full_trace_dict(funs: Mapping, function_filter: Optional[Callable[[Function], bool]] = None) -> float:
     if (arr_len := len(funs)) == 0 or not isinstance(list_type := list(funs.values())[0], Function):
         raise TypeError(f'Need list of Function type, got {type(list_type) if arr_len > 0 else "empty list"}')
 
     return sum(fun.energy.local_energy for fun in funs.values() if function_filter is None or not function_filter(fun))
 
 
-def get_sums_from_dir(directory: str, function_filter: Optional[Callable[[Function], bool]] = None) -> List[float]:
+def get_sums_from_dir(directory: str, function_filter: Optional[Callable[[Function], bool]] = None,
+                      catalog_file: Optional[str] = None) -> List[float]:
     """
     Searches a directory for files containing function dictionary pickles and returns a list of the total energy
     use of each dictionary.
     :param directory: Directory to search
     :param function_filter: Optional filter to remove functions from the list.  The filter should return true
         if the function is to be included in the sum.
-    :return: A list containing the total energy consumption for each of the pickles in the directory.
+    :param catalog_file: Optional catalog that the traces were added to.  Without a filter, the sums are then read
+        from the catalog instead of the files.
+    :return: A list containing the total energy consumption for each of the pickles in the directory.  The pickles
+        are loaded in parallel, and the sums cached until the files change, see result_loader.load_files.
     """
+    if catalog_file is not None and function_filter is None:
+        with Catalog(catalog_file) as catalog:
+            return catalog.get_local_energy_sums(directory)
     files = os.listdir(directory)
-    sums: List[float] = []
-    for file in files:
-        filepath = directory + file
-        try:
-            trace_sum = sum_full_trace(filepath, function_filter)
-            sums.append(trace_sum)
-        except TypeError: #swallow any errors arising from files that don't contain a function pickle.
-            pass
-        except ValueError:
-            pass
-    return sums
+    return load_files(_load_trace_sum, [directory + file for file in files], function_filter)
+
+
+def _load_trace_sum(filepath: str, function_filter: Optional[Callable[[Function], bool]] = None) -> Optional[float]:
+    try:
+        return sum_full_trace(filepath, function_filter)
+    except TypeError: #swallow any errors arising from files that don't contain a function pickle.
+        return None
+    except ValueError:
+        return None
 
 
 def compare_directories(dir1: str, dir2: str, function_filter: Optional[Callable[[Function], bool]] = None,
-                        test: Callable = scipy.stats.mannwhitneyu):
+                        test: Callable = scipy.stats.mannwhitneyu, catalog_file: Optional[str] = None):
     """
     Compares two directories with the provided test and returns the result
 
     :param dir1: Directory containing a set of function dict pickles
     :param dir2: Directory containing a different set of function dict pickles
     :param test: Test to execute and return the result of.  By default, scipy.stats.mannwhitneyu
+    :param catalog_file: Optional catalog to read the sums from, see get_sums_from_dir
     """
-    dir1_sums = get_sums_from_dir(dir1, function_filter)
-    dir2_sums = get_sums_from_dir(dir2, function_filter)
+    dir1_sums = get_sums_from_dir(dir1, function_filter, catalog_file)
+    dir2_sums = get_sums_from_dir(dir2, function_filter, catalog_file)
     return test(dir1_sums, dir2_sums)
 
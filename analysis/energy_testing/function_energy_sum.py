@@ -37,6 +37,19 @@ class FunctionEnergySum(object):
         self.local_energies: List[float] = [fun.local_energy_cost]
         self.non_local_energies: List[float] = [fun.nonlocal_energy_cost]
 
+    @staticmethod
+    def from_costs(addr: int, name_set: Set[str], local_energy_cost: float,
+                   nonlocal_energy_cost: float) -> "FunctionEnergySum":
+        """
+        Sum of one function that is only known by its costs, like a function row of a Catalog.
+        """
+        energy_sum = FunctionEnergySum.__new__(FunctionEnergySum)
+        energy_sum.addr = addr
+        energy_sum.name_set = set(name_set)
+        energy_sum.local_energies = [local_energy_cost]
+        energy_sum.non_local_energies = [nonlocal_energy_cost]
+        return energy_sum
+
     def __add__(self, other: Union[Function, "FunctionEnergySum"]):
         copy_self = copy.deepcopy(self)
         copy_self += other
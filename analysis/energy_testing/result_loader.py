@@ -0,0 +1,116 @@
+import multiprocessing
+import os
+import pickle
+from collections import OrderedDict
+from multiprocessing import Pool
+from typing import Callable, List, Optional, Any, Tuple, Hashable
+
+from analysis.function.function import Function
+from trace_reader_utils.result_file import is_result_file
+
+# number of loaded files that are kept, see set_cache_size
+_cache_size: int = 128
+_cache: "OrderedDict[Tuple[Hashable, ...], Any]" = OrderedDict()
+
+# filter that can't be pickled, inherited by forked workers instead of being sent to them
+_inherited_filter: Optional[Callable[[Function], bool]] = None
+
+
+def set_cache_size(size: int):
+    """
+    :param size: maximum number of loaded files to keep, the least recently used ones are dropped first
+    """
+    global _cache_size
+    _cache_size = size
+    while len(_cache) > _cache_size:
+        _cache.popitem(last=False)
+
+
+def clear_cache():
+    _cache.clear()
+
+
+def _get_key(load_file: Callable, file: str, function_filter) -> Optional[Tuple[Hashable, ...]]:
+    try:
+        mtime = os.stat(file).st_mtime_ns
+        key = (load_file.__module__, load_file.__qualname__, os.path.abspath(file), mtime, function_filter)
+        hash(key)
+    except (OSError, TypeError):
+        # missing files and unhashable filters are simply not cached
+        return None
+    return key
+
+
+def _can_pickle(obj) -> bool:
+    try:
+        pickle.dumps(obj)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+    return True
+
+
+def _is_pickle(file: str) -> bool:
+    return file.endswith('.gz') or file.endswith('.pickle')
+
+
+def _load_task(task):
+    load_file, file, function_filter, inherit_filter = task
+    return load_file(file, _inherited_filter if inherit_filter else function_filter)
+
+
+def _load_in_pool(load_file: Callable[[str, Any], Any], files: List[str], function_filter) -> List[Any]:
+    global _inherited_filter
+    processes = min(len(files), os.cpu_count() or 1)
+    if _can_pickle(function_filter):
+        with Pool(processes) as p:
+            return p.map(_load_task, [(load_file, file, function_filter, False) for file in files])
+    if 'fork' in multiprocessing.get_all_start_methods():
+        # lambdas and closures can't be pickled, but forked workers get a copy of this module with the filter set
+        _inherited_filter = function_filter
+        try:
+            with multiprocessing.get_context('fork').Pool(processes) as p:
+                return p.map(_load_task, [(load_file, file, None, True) for file in files])
+        finally:
+            _inherited_filter = None
+    return [load_file(file, function_filter) for file in files]
+
+
+def load_files(load_file: Callable[[str, Any], Any], files: List[str],
+               function_filter: Optional[Callable[[Function], bool]] = None, skip_invalid: bool = True) -> List[Any]:
+    """
+    Loads result files with load_file, in a pool of worker processes.  load_file gets the file and the filter, so
+    it can filter and reduce the results in the worker and only send back what is needed.
+    Results are cached on the path and modification time of the file, load_file and the filter, so loading the same
+    files again is free until they change.  The cached objects are shared, they should not be modified.
+    Result files (.trr) are loaded in this process, they are memory mapped and don't have to be unpickled.
+    :param load_file: module level function (so workers can use it) that loads one file, None for invalid files
+    :param files: files to load
+    :param function_filter: filter passed on to load_file
+    :param skip_invalid: leave out the files without a result, instead of returning None for them
+    :return: results of load_file, in the order of files
+    """
+    keys = [_get_key(load_file, file, function_filter) for file in files]
+    results = [None] * len(files)
+    pooled = []
+    for i, (file, key) in enumerate(zip(files, keys)):
+        if key in _cache:
+            _cache.move_to_end(key)
+            results[i] = _cache[key]
+        elif _is_pickle(file) and not is_result_file(file):
+            pooled.append(i)
+        else:
+            results[i] = load_file(file, function_filter)
+
+    if len(pooled) == 1:
+        results[pooled[0]] = load_file(files[pooled[0]], function_filter)
+    elif len(pooled) > 1:
+        for i, result in zip(pooled, _load_in_pool(load_file, [files[i] for i in pooled], function_filter)):
+            results[i] = result
+
+    for key, result in zip(keys, results):
+        # files without results (like the power sample pickles) are cached too, so they aren't unpickled again
+        if key is not None and key not in _cache:
+            _cache[key] = result
+            if len(_cache) > _cache_size:
+                _cache.popitem(last=False)
+    return [result for result in results if result is not None] if skip_invalid else results
@@ -0,0 +1,278 @@
+from typing import Dict, List, Mapping, NamedTuple, Tuple, Iterator, Any
+
+import numpy as np
+from scipy.special import ndtr
+from scipy.stats import t as t_distribution
+
+from analysis.function.Comparators.function_result import FunctionResult
+from analysis.function.Comparators.test_result import TestResult
+from analysis.function.function import Function
+from analysis.function.function_table import FunctionTable
+
+WELCH = 'welch'
+MANN_WHITNEY_U = 'mannwhitneyu'
+
+# the power lists that are compared, in the order of the csv columns, with their TestResult identifier
+POWER_KINDS = {'local': 'local power', 'nonlocal': 'nonlocal power', 'combined': 'combined power'}
+
+
+class BatchTestResult(NamedTuple):
+    """
+    Result of one test from a batch, usable wherever a scipy test result is used.
+    """
+    statistic: float
+    pvalue: float
+
+
+def welch_test(n1: np.ndarray, mean1: np.ndarray, var1: np.ndarray, n2: np.ndarray, mean2: np.ndarray,
+               var2: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Welch's t-test from the sizes, means and variances (with one degree of freedom) of the samples, element-wise
+    and with broadcasting.  Gives the same results as ttest_ind(equal_var=False) on the samples themselves.
+    :return: t statistics and two-sided p-values
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vn1 = var1 / n1
+        vn2 = var2 / n2
+        df = (vn1 + vn2) ** 2 / (vn1 ** 2 / (n1 - 1) + vn2 ** 2 / (n2 - 1))
+        # same as scipy: if both variances are zero, df is nan, and the t statistic decides the result
+        df = np.where(np.isnan(df), 1, df)
+        t = (mean1 - mean2) / np.sqrt(vn1 + vn2)
+    return t, 2 * t_distribution.sf(np.abs(t), df)
+
+
+class PowerGroups(object):
+    """
+    Ragged power lists of a number of functions, stored as flat arrays: entry i has power values[i], occurs
+    weights[i] times, and belongs to the list of function groups[i].  The entries of a list are contiguous.
+    """
+
+    def __init__(self, groups: np.ndarray, values: np.ndarray, weights: np.ndarray, num_groups: int):
+        self.groups: np.ndarray = groups
+        self.values: np.ndarray = values
+        self.weights: np.ndarray = weights
+        self.num_groups: int = num_groups
+
+    @staticmethod
+    def _gather(offsets: np.ndarray, ids: np.ndarray, counts: np.ndarray,
+                function_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        lengths = np.diff(offsets)[function_ids]
+        begins = np.zeros(len(function_ids) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=begins[1:])
+        positions = np.repeat(offsets[:-1][function_ids] - begins[:-1], lengths) + \
+            np.arange(begins[-1], dtype=np.int64)
+        groups = np.repeat(np.arange(len(function_ids), dtype=np.int64), lengths)
+        return groups, ids[positions].astype(np.int64), counts[positions].astype(np.int64)
+
+    @staticmethod
+    def from_table(table: FunctionTable, function_ids: np.ndarray, kind: str, filter_dupes: bool) -> "PowerGroups":
+        """
+        The same power lists as get_local_power_list, get_nonlocal_power_list or get_combined_power_list of the
+        functions, taken from the CSR columns of the table.
+        :param table: functions
+        :param function_ids: functions to take the power lists of, in the order of the groups
+        :param kind: local, nonlocal or combined
+        :param filter_dupes: count every PowerSample once per list, instead of as often as it occurs
+        """
+        local = PowerGroups._gather(table.local_power_offsets, table.local_power_ids, table.local_power_counts,
+                                    function_ids)
+        nonlocal_ = PowerGroups._gather(table.nonlocal_power_offsets, table.nonlocal_power_ids,
+                                        table.nonlocal_power_counts, function_ids)
+        if kind == 'local':
+            groups, ids, counts = local
+        elif kind == 'nonlocal':
+            groups, ids, counts = nonlocal_
+        else:
+            groups, ids, counts = (np.concatenate(columns) for columns in zip(local, nonlocal_))
+            order = np.argsort(groups, kind='stable')
+            groups, ids, counts = groups[order], ids[order], counts[order]
+            if filter_dupes:
+                # a PowerSample in both lists is only in their union once
+                keys = groups * max(len(table.power_samples), 1) + ids
+                _, first = np.unique(keys, return_index=True)
+                first.sort()
+                groups, ids, counts = groups[first], ids[first], counts[first]
+
+        power = np.array([sample.power for sample in table.power_samples], dtype=np.float64)
+        weights = np.ones(len(ids), dtype=np.int64) if filter_dupes else counts
+        return PowerGroups(groups, power[ids], weights, len(function_ids))
+
+    def get_stats(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        :return: size, mean and variance (with one degree of freedom) of every list
+        """
+        n = np.bincount(self.groups, weights=self.weights, minlength=self.num_groups)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.bincount(self.groups, weights=self.weights * self.values, minlength=self.num_groups) / n
+            deviation = self.values - mean[self.groups]
+            m2 = np.bincount(self.groups, weights=self.weights * deviation * deviation, minlength=self.num_groups)
+            variance = m2 / (n - 1)
+        return n, mean, variance
+
+    def expand(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: group and value of every occurrence
+        """
+        return np.repeat(self.groups, self.weights), np.repeat(self.values, self.weights)
+
+
+def mann_whitney_u_test(x: PowerGroups, y: PowerGroups) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Mann-Whitney U test between list i of x and list i of y, for all the lists at once.  The lists are ranked
+    together, sorted on (group, value), with the average rank for ties.  Gives the same results as
+    mannwhitneyu(method='asymptotic') with its default continuity correction.
+    :return: U statistics of the lists of x and two-sided p-values
+    """
+    x_groups, x_values = x.expand()
+    y_groups, y_values = y.expand()
+    groups = np.concatenate((x_groups, y_groups))
+    values = np.concatenate((x_values, y_values))
+    from_x = np.concatenate((np.ones(len(x_groups), dtype=bool), np.zeros(len(y_groups), dtype=bool)))
+    order = np.lexsort((values, groups))
+    groups, values, from_x = groups[order], values[order], from_x[order]
+
+    num_groups = x.num_groups
+    n1 = np.bincount(x_groups, minlength=num_groups).astype(np.float64)
+    n2 = np.bincount(y_groups, minlength=num_groups).astype(np.float64)
+    n = n1 + n2
+    group_begin = np.concatenate(([0], np.cumsum(n)[:-1])).astype(np.int64)
+
+    # runs of equal values within a group get the average of their ranks
+    new_run = np.ones(len(values), dtype=bool)
+    new_run[1:] = (groups[1:] != groups[:-1]) | (values[1:] != values[:-1])
+    run_begin = np.flatnonzero(new_run)
+    run_length = np.diff(np.append(run_begin, len(values)))
+    run_rank = run_begin - group_begin[groups[run_begin]] + (run_length + 1) / 2
+    ranks = np.repeat(run_rank, run_length)
+
+    r1 = np.bincount(groups[from_x], weights=ranks[from_x], minlength=num_groups)
+    u1 = r1 - n1 * (n1 + 1) / 2
+    u = np.maximum(u1, n1 * n2 - u1)
+    tie_term = np.bincount(groups[run_begin], weights=run_length.astype(np.float64) ** 3 - run_length,
+                           minlength=num_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = np.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+        z = (u - n1 * n2 / 2 - 0.5) / s
+    p = np.minimum(2 * ndtr(-z), 1.0)
+    return u1, p
+
+
+class ComparisonTable(object):
+    """
+    Results of comparing the power of every function that is in two traces, one row per function, as columns:
+    addr, names, the sample counts of the function in both traces, and for every power list (see POWER_KINDS) the
+    mean in both traces, the test statistic and the p-value, named like local_mean1, local_mean2, local_statistic
+    and local_pvalue.  The columns are numpy arrays, except for the names and the local and nonlocal means, which
+    are lists with the same values as the Function attributes.
+    """
+
+    def __init__(self, columns: Dict[str, Any], test: str):
+        self.columns: Dict[str, Any] = columns
+        self.test: str = test
+
+    def __len__(self):
+        return len(self.columns['addr'])
+
+    def __getitem__(self, name: str):
+        return self.columns[name]
+
+    @staticmethod
+    def get_csv_header() -> List[str]:
+        """
+        :return: the same header as FunctionResult.get_full_csv_header for a welch_power result
+        """
+        header = ['function names', 'func1 loc samp', 'func1 nonloc samp', 'func2 loc samp', 'func2 nonloc samp']
+        for identifier in POWER_KINDS.values():
+            header += [f'{identifier} trace1 mean', f'{identifier} trace2 mean', f'{identifier} p-value']
+        return header
+
+    def iter_csv_rows(self) -> Iterator[list]:
+        """
+        Rows in the order of get_csv_header, generated one at a time.
+        """
+        columns = [_to_list(self.columns[name]) for name in
+                   ['names', 'num_leaf_samples1', 'num_samples1', 'num_leaf_samples2', 'num_samples2']]
+        for kind in POWER_KINDS:
+            columns += [_to_list(self.columns[f'{kind}_{name}']) for name in ['mean1', 'mean2', 'pvalue']]
+        return (list(row) for row in zip(*columns))
+
+    def to_function_results(self, x: Mapping[int, Function], y: Mapping[int, Function]) -> List[FunctionResult]:
+        """
+        :param x: the first functions that were compared
+        :param y: the second functions that were compared
+        :return: a FunctionResult per row, like compare_dict used to return
+        """
+        results = []
+        kinds = {kind: [_to_list(self.columns[f'{kind}_{name}']) for name in
+                        ['mean1', 'mean2', 'statistic', 'pvalue']] for kind in POWER_KINDS}
+        for row, addr in enumerate(self.columns['addr'].tolist()):
+            test_results = [TestResult(identifier, kinds[kind][0][row], kinds[kind][1][row],
+                                       BatchTestResult(kinds[kind][2][row], kinds[kind][3][row]))
+                            for kind, identifier in POWER_KINDS.items()]
+            results.append(FunctionResult(x[addr], y[addr], test_results))
+        return results
+
+
+def _get_function_means(table: FunctionTable, function_ids: np.ndarray, kind: str) -> list:
+    # the same values as the mean power attributes of the functions, which are an int 0 without samples
+    counts = (table.num_leaf_samples if kind == 'local' else table.num_samples)[function_ids].tolist()
+    means = getattr(table, f'mean_{kind}_power')[function_ids].tolist()
+    return [mean if count > 0 else 0 for mean, count in zip(means, counts)]
+
+
+def _to_list(column) -> list:
+    return column.tolist() if isinstance(column, np.ndarray) else column
+
+
+def _to_table(functions: Mapping[int, Function]) -> FunctionTable:
+    return functions if isinstance(functions, FunctionTable) else FunctionTable.from_functions(functions)
+
+
+def compare_tables(x: Mapping[int, Function], y: Mapping[int, Function], filter_dupes: bool = True,
+                   test: str = WELCH) -> ComparisonTable:
+    """
+    Compares the local, nonlocal and combined power of every function of x that is also in y, for all the
+    functions at once.  Welch's t-test only needs the size, mean and variance of every power list, the Mann-Whitney
+    U test ranks all the lists together.
+    (The Wilcoxon signed-rank test of wilcoxon_power needs paired lists of equal length, so it can't be used on
+    power lists of different sizes; Mann-Whitney U is the rank test for independent samples.)
+    :param x: function dict or FunctionTable of the first trace
+    :param y: function dict or FunctionTable of the second trace
+    :param filter_dupes: count every PowerSample once per list
+    :param test: WELCH or MANN_WHITNEY_U
+    :return: table with a row per function of x that is in y, in the order of x
+    """
+    if test not in (WELCH, MANN_WHITNEY_U):
+        raise ValueError(f'unknown test {test}')
+    x_table = _to_table(x)
+    y_table = _to_table(y)
+    addrs = [addr for addr in x_table if addr in y_table]
+    x_ids = np.array([x_table.get_function_id(addr) for addr in addrs], dtype=np.int64)
+    y_ids = np.array([y_table.get_function_id(addr) for addr in addrs], dtype=np.int64)
+
+    columns: Dict[str, Any] = {
+        'addr': np.array(addrs, dtype=np.uint64),
+        'names': [' .. '.join(x_table.name_sets[function_id]) for function_id in x_ids.tolist()],
+        'num_leaf_samples1': x_table.num_leaf_samples[x_ids],
+        'num_samples1': x_table.num_samples[x_ids],
+        'num_leaf_samples2': y_table.num_leaf_samples[y_ids],
+        'num_samples2': y_table.num_samples[y_ids],
+    }
+    for kind in POWER_KINDS:
+        x_groups = PowerGroups.from_table(x_table, x_ids, kind, filter_dupes)
+        y_groups = PowerGroups.from_table(y_table, y_ids, kind, filter_dupes)
+        n1, mean1, var1 = x_groups.get_stats()
+        n2, mean2, var2 = y_groups.get_stats()
+        if test == WELCH:
+            statistic, p_value = welch_test(n1, mean1, var1, n2, mean2, var2)
+        else:
+            statistic, p_value = mann_whitney_u_test(x_groups, y_groups)
+        if kind == 'combined':
+            columns['combined_mean1'], columns['combined_mean2'] = mean1, mean2
+        else:
+            # like compare_function_powers, the means of the functions themselves are reported
+            columns[f'{kind}_mean1'] = _get_function_means(x_table, x_ids, kind)
+            columns[f'{kind}_mean2'] = _get_function_means(y_table, y_ids, kind)
+        columns[f'{kind}_statistic'] = statistic
+        columns[f'{kind}_pvalue'] = p_value
+    return ComparisonTable(columns, test)
@@ -1,14 +1,23 @@
 import csv
-from typing import List
+from typing import List, Union
 
+from analysis.function.Comparators.batch_comparator import ComparisonTable
 from analysis.function.Comparators.function_result import FunctionResult
 
 csv_header = ['name set', 'p-value local', 'p-value nonlocal', 'local-diff', 'nonlocal-diff']
 
 
-def write_compare_csv(output_file: str, comp_list: List[FunctionResult]):
+def write_compare_csv(output_file: str, comp_list: Union[List[FunctionResult], ComparisonTable]):
+    """
+    :param output_file: csv file to write
+    :param comp_list: FunctionResults, or a ComparisonTable, whose rows are written as they are generated
+    """
     with open(output_file, mode='w', newline='') as csvfile:
         writer = csv.writer(csvfile, delimiter='\t', quotechar='|')
+        if isinstance(comp_list, ComparisonTable):
+            writer.writerow(comp_list.get_csv_header())
+            writer.writerows(comp_list.iter_csv_rows())
+            return
         writer.writerow(comp_list[0].get_full_csv_header())
         for entry in comp_list:
             writer.writerow(entry.get_csv_fields())
@@ -1,9 +1,9 @@
 import sys
+from collections.abc import Mapping
 from configparser import ConfigParser
-from typing import Dict
 
 from analysis.function.Comparators.comparison_csv_writer import write_compare_csv
-from analysis.function.Comparators.function_comparator import compare_dict
+from analysis.function.Comparators.batch_comparator import compare_tables
 from trace_reader_utils.pickle_utils import gzip_unpickle
 
 if __name__ == "__main__":
@@ -22,8 +22,8 @@ if __name__ == "__main__":
         print('Invalid pickle files!')
         sys.exit(-1)
 
-    if isinstance(trace_1, Dict) and isinstance(trace_2, Dict):
-        result = compare_dict(trace_1, trace_2, filter_dupes)
+    if isinstance(trace_1, Mapping) and isinstance(trace_2, Mapping):
+        result = compare_tables(trace_1, trace_2, filter_dupes)
         write_compare_csv(output_file, result)
     else:
         print('traces not dict?')
\ No newline at end of file
@@ -2,6 +2,7 @@ from functools import singledispatch
 from typing import List, Dict, Union, Optional
 from scipy.stats import wilcoxon, ttest_ind
 
+from analysis.function.Comparators.batch_comparator import compare_tables
 from analysis.function.Comparators.function_result import FunctionResult
 from analysis.function.Comparators.test_result import TestResult
 from analysis.function.function import Function
@@ -48,15 +49,11 @@ def welch_power(x: Function, y: Function, filter_dupes: bool = True) -> Function
 
 
 def compare_dict(x: Dict[int, Function], y: Dict[int, Function], filter_dupes: bool = True) -> List[FunctionResult]:
-    comp_list: List[FunctionResult] = []
-    for x_fun in x.values():
-        try:
-            y_fun = y[x_fun.addr]
-        except KeyError:
-            continue
-        res = welch_power(x_fun, y_fun, filter_dupes)
-        comp_list.append(res)
-    return comp_list
+    """
+    Welch's t-test on the power of every function of x that is also in y, see welch_power.  The tests are done for
+    all the functions at once with compare_tables, use that directly to get the results as a table.
+    """
+    return compare_tables(x, y, filter_dupes).to_function_results(x, y)
 
 
 @singledispatch
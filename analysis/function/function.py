@@ -2,8 +2,10 @@ from __future__ import annotations
 
 import copy
 import math
-from typing import Set, MutableSet, Union, Collection, List
+from functools import lru_cache
+from typing import Set, MutableSet, Union, List, Tuple, Iterable, Callable, Dict
 
+import numpy as np
 from scipy.stats import norm
 
 from trace_representation.app_sample import PowerPeriod, PowerSample
@@ -28,6 +30,19 @@ class ProbInterval(object):
         return 0 <= self.lower <= self.upper
 
 
+# names of the confidence interval attributes of a Function
+INTERVAL_NAMES: Tuple[str, ...] = ('local_prob_interval', 'nonlocal_prob_interval', 'mean_local_power_interval',
+                                   'mean_nonlocal_power_interval', 'local_energy_interval', 'nonlocal_energy_interval')
+
+
+@lru_cache(maxsize=None)
+def get_percentile(alpha: float) -> float:
+    """
+    :return: the two-sided percentile of the standard normal distribution for alpha, only calculated once per alpha
+    """
+    return float(norm.ppf(1 - (alpha / 2)))
+
+
 class Function(object):
     def __init__(self, addr, name):
         self.addr: int = addr  # address of function, used as primary key
@@ -62,7 +77,8 @@ class Function(object):
         self.local_energy_interval: Union[ProbInterval, None] = None
         self.nonlocal_energy_interval: Union[ProbInterval, None] = None
 
-    def post_process(self, total_samples: int, total_runtime_seconds: float, filter_dupes: bool = True):
+    def post_process(self, total_samples: int, total_runtime_seconds: float, filter_dupes: bool = True,
+                     alpha: float = 0.05):
         """
         Processes this function using information only known after running through the samples once.
         Calculates the probabilities and from that, the runtime. DOES NOT use the period for this, it is calculated
@@ -70,6 +86,7 @@ class Function(object):
         :param total_samples: Number of samples taken in total
         :param total_runtime_seconds: Runtime of the program in total.
         :param filter_dupes: Whether to filter duplicate power measurements, where the hardware had not yet updated.
+        :param alpha: desired alpha of the confidence intervals
         """
         self._total_samples = total_samples
         self._total_runtime_seconds = total_runtime_seconds
@@ -78,8 +95,8 @@ class Function(object):
         self._set_prob(total_samples)
         self._set_runtime(total_runtime_seconds)
         self._set_power()
-        self._prob_interval(n=total_samples, alpha=0.05)
-        self._power_interval(alpha=0.05, filter_dupes=filter_dupes)
+        self._prob_interval(n=total_samples, alpha=alpha)
+        self._power_interval(alpha=alpha, filter_dupes=filter_dupes)
         self._energy_interval(total_runtime_seconds)
 
     def _set_prob(self, n):
@@ -118,7 +135,7 @@ class Function(object):
         :param alpha: desired alpha
         :return:
         """
-        percentile = norm.ppf(1 - (alpha / 2))
+        percentile = get_percentile(alpha)
 
         def do_prob(p_bbm: float) -> ProbInterval:
             # sanity check from section C
@@ -139,25 +156,20 @@ class Function(object):
         Calculates confidence interval for power
         :param alpha: desired alpha value
         """
-        percentile = norm.ppf(1 - (alpha / 2))
-
-        def s(pow_hat: float, pow_list: Collection[PowerSample]):
-            n_bbm = len(pow_list)
-            pow_sum = 0.0
-            for p in pow_list:
-                pow_sum += (p.power - pow_hat) ** 2
+        percentile = get_percentile(alpha)
 
+        def s(n_bbm: int, pow_sum: float):
             return math.sqrt(
                 (1 / (n_bbm - 1)) * pow_sum
             )
 
-        def intervals(pow_hat: float, pow_list: Collection[PowerSample]) -> ProbInterval:
-
-            n_bbm = len(pow_list)
+        def intervals(pow_hat: float, deviation: Tuple[int, float]) -> ProbInterval:
+            # deviation is the number of power samples and the sum of their squared deviation from pow_hat
+            n_bbm, pow_sum = deviation
             if n_bbm < 2:
                 return ProbInterval()
             sqrt_n_bbm = math.sqrt(n_bbm)
-            half_interval = percentile * (s(pow_hat, pow_list) / sqrt_n_bbm)
+            half_interval = percentile * (s(n_bbm, pow_sum) / sqrt_n_bbm)
             upper = pow_hat + half_interval
             lower = pow_hat - half_interval
 
@@ -171,10 +183,11 @@ class Function(object):
         #            str(self.num_samples) + ' is not ' + str(
         #                len(self.power.nonlocal_power_set)) + ' did you set the current multiplier correctly?'
 
-        self.mean_local_power_interval = intervals(self.mean_local_power,
-                                                   self.power.get_local_power(filter_dupes=filter_dupes))
-        self.mean_nonlocal_power_interval = intervals(self.mean_nonlocal_power,
-                                                      self.power.get_nonlocal_power(filter_dupes=filter_dupes))
+        self.mean_local_power_interval = intervals(
+            self.mean_local_power, self.power.get_local_deviation(self.mean_local_power, filter_dupes=filter_dupes))
+        self.mean_nonlocal_power_interval = intervals(
+            self.mean_nonlocal_power,
+            self.power.get_nonlocal_deviation(self.mean_nonlocal_power, filter_dupes=filter_dupes))
 
     def _energy_interval(self, total_time_secs: float):
         local_is_valid = self.local_prob_interval.is_valid() and self.mean_local_power_interval.is_valid()
@@ -218,13 +231,13 @@ class Function(object):
         if not isinstance(other, Function):
             raise TypeError('Cannot add non-function to function')
 
-        self.name_set += other.name_set
+        self.name_set |= other.name_set
         self.num_leaf_samples += other.num_leaf_samples
         self.num_samples += other.num_samples
         self.time += other.time
         self.energy += other.energy
         self.power += other.power
-        self.children += other.children
+        self.children |= other.children
 
         self._total_samples += other._total_samples
         self._total_runtime_seconds += other._total_runtime_seconds
@@ -235,4 +248,146 @@ class Function(object):
                   f'equal settings before continuing.')
 
         self.post_process(self._total_samples, self._total_runtime_seconds, self._filter_dupes)
-        return self
\ No newline at end of file
+        return self
+
+
+def _make_intervals(lower: np.ndarray, upper: np.ndarray) -> List[ProbInterval]:
+    # NaN marks an interval that is not valid
+    return [ProbInterval() if low != low else ProbInterval(low, up) for low, up in zip(lower.tolist(), upper.tolist())]
+
+
+# (number of power samples, sum of their squared deviations from the mean) per function, for local and non-local power
+Deviations = Tuple[Tuple[np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray]]
+
+
+def compute_statistics(num_leaf_samples: np.ndarray, num_samples: np.ndarray, local_power: np.ndarray,
+                       nonlocal_power: np.ndarray, get_deviations: Callable[[np.ndarray, np.ndarray], Deviations],
+                       total_samples: int, total_runtime_seconds: float,
+                       alpha: float = 0.05) -> Dict[str, np.ndarray]:
+    """
+    Calculates everything post_process derives, for many functions at once, from their raw counts and power sums.
+    :param num_leaf_samples: leaf sample count of every function
+    :param num_samples: callchain sample count of every function
+    :param local_power: summed up local power of every function
+    :param nonlocal_power: summed up non-local power of every function
+    :param get_deviations: receives the mean local and non-local power of every function, and returns for both the
+        number of power samples and the sum of their squared deviations from the mean
+    :param total_samples: Number of samples taken in total
+    :param total_runtime_seconds: Runtime of the program in total.
+    :param alpha: desired alpha of the confidence intervals
+    :return: arrays named like the Function attributes.  Intervals are split into <name>_lower and <name>_upper,
+        which are NaN if the interval is not valid.
+    """
+    percentile = get_percentile(alpha)
+    n = total_samples
+    num_leaf_samples = np.asarray(num_leaf_samples, dtype=np.float64)
+    num_samples = np.asarray(num_samples, dtype=np.float64)
+
+    # same operations as Function._set_prob, _set_runtime and _set_power, so the results are identical
+    local_prob = num_leaf_samples / n
+    nonlocal_prob = num_samples / n
+    local_runtime = local_prob * total_runtime_seconds
+    nonlocal_runtime = nonlocal_prob * total_runtime_seconds
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_local_power = np.where(num_leaf_samples > 0, (1 / num_leaf_samples) * local_power, 0.0)
+        mean_nonlocal_power = np.where(num_samples > 0, (1 / num_samples) * nonlocal_power, 0.0)
+    statistics = {
+        'local_prob': local_prob,
+        'nonlocal_prob': nonlocal_prob,
+        'local_runtime': local_runtime,
+        'nonlocal_runtime': nonlocal_runtime,
+        'mean_local_power': mean_local_power,
+        'mean_nonlocal_power': mean_nonlocal_power,
+        'local_energy_cost': mean_local_power * local_runtime,
+        'nonlocal_energy_cost': mean_nonlocal_power * nonlocal_runtime,
+    }
+
+    def set_interval(name: str, lower: np.ndarray, upper: np.ndarray, valid: np.ndarray):
+        statistics[f'{name}_lower'] = np.where(valid, lower, np.nan)
+        statistics[f'{name}_upper'] = np.where(valid, upper, np.nan)
+
+    # Wald intervals of the probabilities, see _prob_interval
+    def set_prob_interval(name: str, p_bbm: np.ndarray):
+        valid = (n * p_bbm >= 5) & (n * (1 - p_bbm) >= 5)
+        with np.errstate(invalid='ignore'):
+            half_interval = percentile * np.sqrt((1 / n) * p_bbm * (1 - p_bbm))
+        set_interval(name, p_bbm - half_interval, p_bbm + half_interval, valid)
+
+    # intervals of the mean power, see _power_interval
+    def set_power_interval(name: str, pow_hat: np.ndarray, deviation: Tuple[np.ndarray, np.ndarray]):
+        n_bbm = np.asarray(deviation[0], dtype=np.float64)
+        pow_sum = np.asarray(deviation[1], dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            half_interval = percentile * (np.sqrt((1 / (n_bbm - 1)) * pow_sum) / np.sqrt(n_bbm))
+        set_interval(name, pow_hat - half_interval, pow_hat + half_interval, n_bbm >= 2)
+
+    # energy intervals, see _energy_interval.  Comparisons with NaN are false, so invalid intervals stay invalid.
+    def set_energy_interval(name: str, prob_name: str, power_name: str):
+        prob_lower, prob_upper = statistics[f'{prob_name}_lower'], statistics[f'{prob_name}_upper']
+        power_lower, power_upper = statistics[f'{power_name}_lower'], statistics[f'{power_name}_upper']
+        valid = (0 <= prob_lower) & (prob_lower <= prob_upper) & (0 <= power_lower) & (power_lower <= power_upper)
+        set_interval(name, prob_lower * total_runtime_seconds * power_lower,
+                     prob_upper * total_runtime_seconds * power_upper, valid)
+
+    local_deviation, nonlocal_deviation = get_deviations(mean_local_power, mean_nonlocal_power)
+    set_prob_interval('local_prob_interval', local_prob)
+    set_prob_interval('nonlocal_prob_interval', nonlocal_prob)
+    set_power_interval('mean_local_power_interval', mean_local_power, local_deviation)
+    set_power_interval('mean_nonlocal_power_interval', mean_nonlocal_power, nonlocal_deviation)
+    set_energy_interval('local_energy_interval', 'local_prob_interval', 'mean_local_power_interval')
+    set_energy_interval('nonlocal_energy_interval', 'nonlocal_prob_interval', 'mean_nonlocal_power_interval')
+    return statistics
+
+
+def post_process_functions(functions: Iterable[Function], total_samples: int, total_runtime_seconds: float,
+                           filter_dupes: bool = True, alpha: float = 0.05):
+    """
+    Same as calling post_process on every function, but the statistics are calculated for all the functions at once.
+    :param functions: functions to process
+    :param total_samples: Number of samples taken in total
+    :param total_runtime_seconds: Runtime of the program in total.
+    :param filter_dupes: Whether to filter duplicate power measurements, where the hardware had not yet updated.
+    :param alpha: desired alpha of the confidence intervals
+    """
+    functions = list(functions)
+    if len(functions) == 0:
+        return
+
+    num_leaf_samples = [fun.num_leaf_samples for fun in functions]
+    num_samples = [fun.num_samples for fun in functions]
+    # post_process leaves the mean power at an int 0 for functions without samples
+    mean_local_power_list = []
+    mean_nonlocal_power_list = []
+
+    def get_deviations(mean_local_power: np.ndarray, mean_nonlocal_power: np.ndarray) -> Deviations:
+        mean_local_power_list.extend(mean if count > 0 else 0
+                                     for mean, count in zip(mean_local_power.tolist(), num_leaf_samples))
+        mean_nonlocal_power_list.extend(mean if count > 0 else 0
+                                        for mean, count in zip(mean_nonlocal_power.tolist(), num_samples))
+        local_deviations = [fun.power.get_local_deviation(mean, filter_dupes)
+                            for fun, mean in zip(functions, mean_local_power_list)]
+        nonlocal_deviations = [fun.power.get_nonlocal_deviation(mean, filter_dupes)
+                               for fun, mean in zip(functions, mean_nonlocal_power_list)]
+        return (([deviation[0] for deviation in local_deviations], [deviation[1] for deviation in local_deviations]),
+                ([deviation[0] for deviation in nonlocal_deviations],
+                 [deviation[1] for deviation in nonlocal_deviations]))
+
+    statistics = compute_statistics(
+        num_leaf_samples, num_samples, np.array([fun.power.local_power for fun in functions], dtype=np.float64),
+        np.array([fun.power.nonlocal_power for fun in functions], dtype=np.float64), get_deviations, total_samples,
+        total_runtime_seconds, alpha)
+    intervals = {name: _make_intervals(statistics[f'{name}_lower'], statistics[f'{name}_upper'])
+                 for name in INTERVAL_NAMES}
+
+    for index, (fun, values) in enumerate(zip(functions, zip(
+            statistics['local_prob'].tolist(), statistics['nonlocal_prob'].tolist(),
+            statistics['local_runtime'].tolist(), statistics['nonlocal_runtime'].tolist(),
+            mean_local_power_list, mean_nonlocal_power_list, statistics['local_energy_cost'].tolist(),
+            statistics['nonlocal_energy_cost'].tolist()))):
+        fun._total_samples = total_samples
+        fun._total_runtime_seconds = total_runtime_seconds
+        fun._filter_dupes = filter_dupes
+        (fun.local_prob, fun.nonlocal_prob, fun.local_runtime, fun.nonlocal_runtime, fun.mean_local_power,
+         fun.mean_nonlocal_power, fun.local_energy_cost, fun.nonlocal_energy_cost) = values
+        for name, interval_list in intervals.items():
+            setattr(fun, name, interval_list[index])
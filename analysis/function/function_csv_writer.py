@@ -3,7 +3,7 @@ from typing import List, Any, Union
 
 from analysis.function.function import Function
 from parsers.parser_args import ParserArgs
-from trace_reader_utils.file_utils import get_filename
+from trace_reader_utils.file_utils import get_filename, atomic_output
 
 csv_header = ['function address', 'name set', 'leaf samples', 'tree samples', 'local probability',
               'nonlocal probability', 'local prob interval', 'nonlocal prob interval', 'local runtime',
@@ -24,12 +24,13 @@ def write_function(writer, fun: Function):
     writer.writerow(arr)
 
 
-def write_csv(file_name: Union[str, ParserArgs], functions: List[Function], overwrite: bool = False):
+def write_csv(file_name: Union[str, ParserArgs], functions: List[Function], overwrite: bool = False) -> str:
 
     output_file = get_filename(file_name, ext='.csv', overwrite=overwrite)
 
-    with open(output_file, mode='w', newline='') as csvfile:
+    with atomic_output(output_file) as temp_file, open(temp_file, mode='w', newline='') as csvfile:
         writer = csv.writer(csvfile, delimiter='\t', quotechar='|')
         writer.writerow(csv_header)
         for fun in functions:
             write_function(writer, fun)
+    return output_file
@@ -0,0 +1,446 @@
+from collections.abc import Mapping
+from typing import Callable, Dict, List, Optional, Tuple, Iterator, Set
+
+import numpy as np
+
+from analysis.function.function import Function, ProbInterval, INTERVAL_NAMES, compute_statistics, Deviations
+from trace_representation.app_sample import PowerPeriod, PowerSample
+from trace_representation.simpleperf_python_datatypes import TimePeriod, EnergyPeriod
+from trace_representation.time_unit import TimeUnit
+
+# columns with one entry per function, and their dtype
+_COLUMNS: Dict[str, type] = {
+    'addr': np.uint64,
+    'num_leaf_samples': np.int64,
+    'num_samples': np.int64,
+    'local_time': np.int64,  # nanoseconds
+    'accumulated_time': np.int64,  # nanoseconds
+    'local_energy': np.float64,
+    'accumulated_energy': np.float64,
+    'local_power': np.float64,  # summed up power, like PowerPeriod.local_power
+    'nonlocal_power': np.float64,
+    'local_prob': np.float64,
+    'nonlocal_prob': np.float64,
+    'local_runtime': np.float64,
+    'nonlocal_runtime': np.float64,
+    'local_energy_cost': np.float64,
+    'nonlocal_energy_cost': np.float64,
+    'mean_local_power': np.float64,
+    'mean_nonlocal_power': np.float64,
+    'total_samples': np.int64,
+    'total_runtime_seconds': np.float64,
+}
+
+# confidence intervals, stored as a lower and upper column each.  Missing intervals are stored as NaN.
+_INTERVALS: Tuple[str, ...] = INTERVAL_NAMES
+
+
+def _to_csr(rows: List[Dict[int, int]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    :param rows: one {id: count} dict per function
+    :return: offsets, ids and counts, where the entries of function i are in [offsets[i], offsets[i + 1])
+    """
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum([len(row) for row in rows], out=offsets[1:])
+    ids = np.fromiter((key for row in rows for key in row), dtype=np.int64, count=int(offsets[-1]))
+    counts = np.fromiter((count for row in rows for count in row.values()), dtype=np.int64, count=int(offsets[-1]))
+    return offsets, ids, counts
+
+
+def _interval_bounds(interval: Optional[ProbInterval]) -> Tuple[float, float]:
+    # only missing intervals are NaN, computed ones are kept as they are, also when they fall below 0
+    if interval is None or (interval.lower == -1 and interval.upper == -1):
+        return np.nan, np.nan
+    return interval.lower, interval.upper
+
+
+class FunctionTable(Mapping):
+    """
+    Struct-of-arrays version of a function dict.  Every metric of the functions is stored in a numpy column (see
+    _COLUMNS) with one entry per function id, and the name sets, the children and the PowerSample counts are stored
+    in side tables next to them.
+    Pickling this is a handful of arrays instead of a graph of Function objects.
+
+    The table is a read-only mapping from address to FunctionView, so it can be used in place of the function dict
+    by code that only reads the functions, like write_csv, compare_dict and FunctionEnergySum.
+    """
+
+    # names of the numeric columns, with one entry per function
+    COLUMN_NAMES: Tuple[str, ...] = (*_COLUMNS, *[f'{name}_lower' for name in _INTERVALS],
+                                     *[f'{name}_upper' for name in _INTERVALS])
+
+    __slots__ = (*COLUMN_NAMES, 'name_sets', 'children_offsets', 'children', 'local_power_offsets', 'local_power_ids',
+                 'local_power_counts', 'nonlocal_power_offsets', 'nonlocal_power_ids', 'nonlocal_power_counts',
+                 'power_samples', 'filter_dupes', '_index', '_views')
+
+    def __init__(self, columns: Dict[str, np.ndarray], name_sets: List[Set[str]],
+                 children_offsets: np.ndarray, children: np.ndarray,
+                 local_power: Tuple[np.ndarray, np.ndarray, np.ndarray],
+                 nonlocal_power: Tuple[np.ndarray, np.ndarray, np.ndarray],
+                 power_samples: List[PowerSample], filter_dupes: bool = True):
+        """
+        :param columns: every column of _COLUMNS, plus the lower and upper columns of every interval
+        :param name_sets: names of every function
+        :param children_offsets: the children of function i are children[children_offsets[i]:children_offsets[i + 1]]
+        :param children: function ids of the children
+        :param local_power: offsets, power sample ids and counts of the local PowerSamples, laid out like the children
+        :param nonlocal_power: same as local_power, for the non-local PowerSamples
+        :param power_samples: PowerSamples the power sample ids refer to
+        :param filter_dupes: whether duplicate power measurements were filtered when post processing
+        """
+        for name, column in columns.items():
+            setattr(self, name, column)
+        self.name_sets: List[Set[str]] = name_sets
+        self.children_offsets: np.ndarray = children_offsets
+        self.children: np.ndarray = children
+        self.local_power_offsets, self.local_power_ids, self.local_power_counts = local_power
+        self.nonlocal_power_offsets, self.nonlocal_power_ids, self.nonlocal_power_counts = nonlocal_power
+        self.power_samples: List[PowerSample] = power_samples
+        self.filter_dupes: bool = filter_dupes
+        self._reset_views()
+
+    def _reset_views(self):
+        self._index: Dict[int, int] = {addr: index for index, addr in enumerate(self.addr.tolist())}
+        self._views: List[Optional[FunctionView]] = [None] * len(self._index)
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__ if not name.startswith('_')}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._reset_views()
+
+    def __len__(self):
+        return len(self._views)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._index)
+
+    def __contains__(self, addr) -> bool:
+        return addr in self._index
+
+    def __getitem__(self, addr) -> "FunctionView":
+        return self.get_view(self._index[addr])
+
+    def get_function_id(self, addr: int) -> int:
+        """
+        :return: index in the columns of the function with this address, KeyError if it isn't in the table
+        """
+        return self._index[addr]
+
+    def get_columns(self) -> Dict[str, np.ndarray]:
+        """
+        :return: every numeric column by name, see COLUMN_NAMES
+        """
+        return {name: getattr(self, name) for name in self.COLUMN_NAMES}
+
+    def get_view(self, function_id: int) -> "FunctionView":
+        """
+        :param function_id: index of the function in the columns
+        :return: view of the function.  There is only one view per function, so views can be compared and hashed
+            like Function objects.
+        """
+        view = self._views[function_id]
+        if view is None:
+            view = FunctionView(self, function_id)
+            self._views[function_id] = view
+        return view
+
+    def get_children(self, function_id: int) -> np.ndarray:
+        return self.children[self.children_offsets[function_id]:self.children_offsets[function_id + 1]]
+
+    def get_interval(self, name: str, function_id: int) -> ProbInterval:
+        lower = float(getattr(self, f'{name}_lower')[function_id])
+        upper = float(getattr(self, f'{name}_upper')[function_id])
+        if np.isnan(lower):
+            return ProbInterval()
+        return ProbInterval(lower, upper)
+
+    def get_power_period(self, function_id: int) -> PowerPeriod:
+        return PowerPeriod.from_counts(float(self.local_power[function_id]), float(self.nonlocal_power[function_id]),
+                                       self._get_power_counts(self.local_power_offsets, self.local_power_ids,
+                                                              self.local_power_counts, function_id),
+                                       self._get_power_counts(self.nonlocal_power_offsets, self.nonlocal_power_ids,
+                                                              self.nonlocal_power_counts, function_id))
+
+    def _get_power_counts(self, offsets: np.ndarray, ids: np.ndarray, counts: np.ndarray,
+                          function_id: int) -> Dict[PowerSample, int]:
+        begin, end = offsets[function_id], offsets[function_id + 1]
+        return {self.power_samples[power_id]: count
+                for power_id, count in zip(ids[begin:end].tolist(), counts[begin:end].tolist())}
+
+    def post_process(self, total_samples: int, total_runtime_seconds: float, filter_dupes: bool = True,
+                     alpha: float = 0.05):
+        """
+        Recalculates the statistics of all the functions from the raw counts and sums in the table, like
+        post_process_functions does for Functions.  Only the derived columns are replaced.
+        :param total_samples: Number of samples taken in total
+        :param total_runtime_seconds: Runtime of the program in total.
+        :param filter_dupes: Whether to filter duplicate power measurements, where the hardware had not yet updated.
+        :param alpha: desired alpha of the confidence intervals
+        """
+        num_functions = len(self)
+        # same as post_process_functions, there is nothing to process (and no samples to divide by)
+        if num_functions == 0:
+            return
+        power = np.array([sample.power for sample in self.power_samples], dtype=np.float64)
+
+        def get_deviation(offsets: np.ndarray, ids: np.ndarray, counts: np.ndarray,
+                          mean: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+            # function id of every (function, PowerSample) entry
+            function_ids = np.repeat(np.arange(num_functions), np.diff(offsets))
+            squared_deviation = (power[ids] - mean[function_ids]) ** 2
+            if filter_dupes:
+                return np.diff(offsets), np.bincount(function_ids, weights=squared_deviation, minlength=num_functions)
+            return (np.bincount(function_ids, weights=counts, minlength=num_functions),
+                    np.bincount(function_ids, weights=counts * squared_deviation, minlength=num_functions))
+
+        def get_deviations(mean_local_power: np.ndarray, mean_nonlocal_power: np.ndarray) -> Deviations:
+            return (get_deviation(self.local_power_offsets, self.local_power_ids, self.local_power_counts,
+                                  mean_local_power),
+                    get_deviation(self.nonlocal_power_offsets, self.nonlocal_power_ids, self.nonlocal_power_counts,
+                                  mean_nonlocal_power))
+
+        statistics = compute_statistics(self.num_leaf_samples, self.num_samples, self.local_power, self.nonlocal_power,
+                                        get_deviations, total_samples, total_runtime_seconds, alpha)
+        for name, column in statistics.items():
+            setattr(self, name, column)
+        self.total_samples = np.full(num_functions, total_samples, dtype=np.int64)
+        self.total_runtime_seconds = np.full(num_functions, total_runtime_seconds, dtype=np.float64)
+        self.filter_dupes = filter_dupes
+
+    def to_functions(self) -> Dict[int, Function]:
+        """
+        :return: function dict with a new Function for every function in the table, and the children linked up
+        """
+        function_dict = {addr: self.get_view(index).to_function(link_children=False)
+                         for addr, index in self._index.items()}
+        functions = list(function_dict.values())
+        for index, function in enumerate(functions):
+            function.children = {functions[child] for child in self.get_children(index).tolist()}
+        return function_dict
+
+    @staticmethod
+    def from_functions(function_dict: Dict[int, Function], power_samples: Optional[List[PowerSample]] = None,
+                       filter_dupes: Optional[bool] = None) -> "FunctionTable":
+        """
+        :param function_dict: post processed functions, keyed by address
+        :param power_samples: PowerSamples the functions refer to.  PowerSamples not in this list are appended.
+        :param filter_dupes: setting the functions were post processed with, taken from the functions if not given
+        :return: table containing the same functions
+        """
+        functions = list(function_dict.values())
+        index = {id(function): function_id for function_id, function in enumerate(functions)}
+        power_samples = list(power_samples) if power_samples is not None else []
+        power_ids = {power_sample: power_id for power_id, power_sample in enumerate(power_samples)}
+
+        def get_power_ids(counts: Dict[PowerSample, int]) -> Dict[int, int]:
+            ids = {}
+            for power_sample, count in counts.items():
+                power_id = power_ids.get(power_sample)
+                if power_id is None:
+                    power_id = len(power_samples)
+                    power_samples.append(power_sample)
+                    power_ids[power_sample] = power_id
+                ids[power_id] = count
+            return ids
+
+        columns = {
+            'addr': [function.addr for function in functions],
+            'num_leaf_samples': [function.num_leaf_samples for function in functions],
+            'num_samples': [function.num_samples for function in functions],
+            'local_time': [function.time.local_time.to_nanos() for function in functions],
+            'accumulated_time': [function.time.accumulated_time.to_nanos() for function in functions],
+            'local_energy': [function.energy.local_energy for function in functions],
+            'accumulated_energy': [function.energy.accumulated_energy for function in functions],
+            'local_power': [function.power.local_power for function in functions],
+            'nonlocal_power': [function.power.nonlocal_power for function in functions],
+            'local_prob': [function.local_prob for function in functions],
+            'nonlocal_prob': [function.nonlocal_prob for function in functions],
+            'local_runtime': [function.local_runtime for function in functions],
+            'nonlocal_runtime': [function.nonlocal_runtime for function in functions],
+            'local_energy_cost': [function.local_energy_cost for function in functions],
+            'nonlocal_energy_cost': [function.nonlocal_energy_cost for function in functions],
+            'mean_local_power': [function.mean_local_power for function in functions],
+            'mean_nonlocal_power': [function.mean_nonlocal_power for function in functions],
+            'total_samples': [function._total_samples for function in functions],
+            'total_runtime_seconds': [function._total_runtime_seconds for function in functions],
+        }
+        columns = {name: np.array(values, dtype=_COLUMNS[name]) for name, values in columns.items()}
+        for name in _INTERVALS:
+            bounds = np.array([_interval_bounds(getattr(function, name)) for function in functions],
+                              dtype=np.float64).reshape(len(functions), 2)
+            columns[f'{name}_lower'] = bounds[:, 0].copy()
+            columns[f'{name}_upper'] = bounds[:, 1].copy()
+
+        children_offsets, children, _ = _to_csr([{index[id(child)]: 0 for child in function.children}
+                                                 for function in functions])
+        local_power = _to_csr([get_power_ids(function.power.get_local_counts()) for function in functions])
+        nonlocal_power = _to_csr([get_power_ids(function.power.get_nonlocal_counts()) for function in functions])
+
+        if filter_dupes is None:
+            filter_dupes = functions[0]._filter_dupes if len(functions) > 0 else True
+        return FunctionTable(columns, [set(function.name_set) for function in functions], children_offsets,
+                             children, local_power, nonlocal_power, power_samples, filter_dupes)
+
+
+def _column(name: str) -> property:
+    return property(lambda self: self._table.__getattribute__(name)[self._function_id].item())
+
+
+def _mean_power(name: str, count_name: str) -> property:
+    # post_process leaves the mean power at an int 0 for functions without samples
+    def get(self):
+        if self._table.__getattribute__(count_name)[self._function_id] == 0:
+            return 0
+        return self._table.__getattribute__(name)[self._function_id].item()
+    return property(get)
+
+
+def _interval(name: str) -> property:
+    return property(lambda self: self._table.get_interval(name, self._function_id))
+
+
+class FunctionView(Function):
+    """
+    Read-only Function backed by one row of a FunctionTable.  It has the same attributes and methods as a Function,
+    but they are read from the columns when accessed.  The nested TimePeriod, EnergyPeriod and PowerPeriod are
+    created on every access, and the EnergyPeriod only has the sums, not the per sample lists.
+    Copying a view gives a regular Function that can be modified.
+    """
+
+    __slots__ = ('_table', '_function_id')
+
+    # noinspection PyMissingConstructor
+    def __init__(self, table: FunctionTable, function_id: int):
+        self._table: FunctionTable = table
+        self._function_id: int = function_id
+
+    addr = _column('addr')
+    num_leaf_samples = _column('num_leaf_samples')
+    num_samples = _column('num_samples')
+    local_prob = _column('local_prob')
+    nonlocal_prob = _column('nonlocal_prob')
+    local_runtime = _column('local_runtime')
+    nonlocal_runtime = _column('nonlocal_runtime')
+    local_energy_cost = _column('local_energy_cost')
+    nonlocal_energy_cost = _column('nonlocal_energy_cost')
+    mean_local_power = _mean_power('mean_local_power', 'num_leaf_samples')
+    mean_nonlocal_power = _mean_power('mean_nonlocal_power', 'num_samples')
+    _total_samples = _column('total_samples')
+    _total_runtime_seconds = _column('total_runtime_seconds')
+
+    local_prob_interval = _interval('local_prob_interval')
+    nonlocal_prob_interval = _interval('nonlocal_prob_interval')
+    mean_local_power_interval = _interval('mean_local_power_interval')
+    mean_nonlocal_power_interval = _interval('mean_nonlocal_power_interval')
+    local_energy_interval = _interval('local_energy_interval')
+    nonlocal_energy_interval = _interval('nonlocal_energy_interval')
+
+    @property
+    def function_id(self) -> int:
+        return self._function_id
+
+    @property
+    def name_set(self) -> Set[str]:
+        return set(self._table.name_sets[self._function_id])
+
+    @property
+    def time(self) -> TimePeriod:
+        return TimePeriod(TimeUnit.from_nanos(int(self._table.local_time[self._function_id])),
+                          TimeUnit.from_nanos(int(self._table.accumulated_time[self._function_id])))
+
+    @property
+    def energy(self) -> EnergyPeriod:
+        energy = EnergyPeriod()
+        energy.local_energy = float(self._table.local_energy[self._function_id])
+        energy.accumulated_energy = float(self._table.accumulated_energy[self._function_id])
+        return energy
+
+    @property
+    def power(self) -> PowerPeriod:
+        return self._table.get_power_period(self._function_id)
+
+    @property
+    def children(self) -> Set["FunctionView"]:
+        return {self._table.get_view(child) for child in self._table.get_children(self._function_id).tolist()}
+
+    @property
+    def _filter_dupes(self) -> bool:
+        return self._table.filter_dupes
+
+    def to_function(self, link_children: bool = True) -> Function:
+        """
+        :param link_children: set the children of the new Function to the views of the children.  If not set, the
+            Function has no children.
+        :return: new Function with the values of this view
+        """
+        function = Function(self.addr, None)
+        function.name_set = self.name_set
+        function.num_leaf_samples = self.num_leaf_samples
+        function.num_samples = self.num_samples
+        function.time = self.time
+        function.energy = self.energy
+        function.power = self.power
+        if link_children:
+            function.children = self.children
+        for name in ('local_prob', 'nonlocal_prob', 'local_runtime', 'nonlocal_runtime', 'local_energy_cost',
+                     'nonlocal_energy_cost', 'mean_local_power', 'mean_nonlocal_power', '_total_samples',
+                     '_total_runtime_seconds', '_filter_dupes', *_INTERVALS):
+            setattr(function, name, getattr(self, name))
+        return function
+
+    def __copy__(self) -> Function:
+        return self.to_function()
+
+    def __deepcopy__(self, memo) -> Function:
+        return self.to_function()
+
+    def __reduce__(self):
+        return FunctionTable.get_view, (self._table, self._function_id)
+
+
+class LazyFunctionTable(Mapping):
+    """
+    FunctionTable that is only loaded when its functions are first used.  The number of functions is known up front
+    (e.g. from the header of a result file), so a file can be checked and passed on without decoding its names and
+    PowerSamples.
+    """
+
+    def __init__(self, num_functions: int, load: Callable[[], FunctionTable]):
+        """
+        :param num_functions: number of functions in the table
+        :param load: loads the table, called at most once
+        """
+        self._num_functions: int = num_functions
+        self._load: Optional[Callable[[], FunctionTable]] = load
+        self._table: Optional[FunctionTable] = None
+
+    @property
+    def table(self) -> FunctionTable:
+        if self._table is None:
+            self._table = self._load()
+            self._load = None
+        return self._table
+
+    def __len__(self):
+        return self._num_functions
+
+    def __getitem__(self, addr: int) -> "FunctionView":
+        return self.table[addr]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.table)
+
+
+def to_function_dict(functions: Mapping) -> Dict[int, Function]:
+    """
+    :param functions: function dict, FunctionTable or LazyFunctionTable
+    :return: dict of modifiable Functions, the dict itself if it already is one
+    """
+    if isinstance(functions, LazyFunctionTable):
+        functions = functions.table
+    if isinstance(functions, FunctionTable):
+        return functions.to_functions()
+    return functions
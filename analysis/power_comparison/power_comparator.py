@@ -1,25 +1,43 @@
 import csv
 import os
 from configparser import ConfigParser
-from typing import List, Optional
+from multiprocessing import Pool
+from typing import List, Optional, Iterable, Tuple
 
+import numpy as np
 from scipy.stats import ttest_ind
 
+from analysis.function.Comparators.batch_comparator import welch_test
 from trace_reader_utils.file_utils import get_filename
 from trace_reader_utils.pickle_utils import gzip_unpickle
+from trace_reader_utils.result_file import ResultFile, is_result_file, EXTENSION
 from trace_representation.app_sample import PowerSample
 
 
-def compare_pow_lists(x: List[PowerSample], y: List[PowerSample]) -> float:
-    x_list = list(map(lambda samp: samp.power, x))
-    y_list = list(map(lambda samp: samp.power, y))
+def _to_array(samples: Iterable[PowerSample]) -> np.ndarray:
+    return np.array([sample.power for sample in samples], dtype=np.float64)
 
-    return ttest_ind(a=x_list, b=y_list, equal_var=False).pvalue
+
+def compare_pow_lists(x: Iterable[PowerSample], y: Iterable[PowerSample]) -> float:
+    return ttest_ind(a=_to_array(x), b=_to_array(y), equal_var=False).pvalue
+
+
+def load_power_samples(file: str) -> List[PowerSample]:
+    """
+    :param file: power sample pickle, or a result file (only its power sample columns are read)
+    """
+    if is_result_file(file):
+        return ResultFile(file).get_power_samples()
+    return gzip_unpickle(file)
+
+
+def _get_trace_name(file: str) -> str:
+    return file.removesuffix('_power.pickle.gz').removesuffix(EXTENSION)
 
 
 def single_file_compare(file1: str, file2: str, filter_dupes: bool) -> float:
-    powers1 = gzip_unpickle(file1)
-    powers2 = gzip_unpickle(file2)
+    powers1 = load_power_samples(file1)
+    powers2 = load_power_samples(file2)
     if filter_dupes:
         powers1 = set(powers1)
         powers2 = set(powers2)
@@ -27,8 +45,8 @@ def single_file_compare(file1: str, file2: str, filter_dupes: bool) -> float:
     return res
 
 def single_file_compare_withavg(file1: str, file2: str, filter_dupes: bool):
-    powers1 = gzip_unpickle(file1)
-    powers2 = gzip_unpickle(file2)
+    powers1 = load_power_samples(file1)
+    powers2 = load_power_samples(file2)
     if filter_dupes:
         powers1 = set(powers1)
         powers2 = set(powers2)
@@ -38,21 +56,58 @@ def single_file_compare_withavg(file1: str, file2: str, filter_dupes: bool):
     return res, avg1, avg2
 
 
+def load_power_stats(file: str, filter_dupes: bool) -> Tuple[int, float, float]:
+    """
+    :param file: power sample pickle or result file
+    :param filter_dupes: count every PowerSample once, like single_file_compare
+    :return: number of power samples, their mean and their variance (with one degree of freedom)
+    """
+    powers = load_power_samples(file)
+    if filter_dupes:
+        powers = set(powers)
+    power = _to_array(powers)
+    if len(power) == 0:
+        return 0, np.nan, np.nan
+    return len(power), float(power.mean()), float(power.var(ddof=1)) if len(power) > 1 else np.nan
+
+
+def _load_power_stats(task: Tuple[str, bool]) -> Tuple[int, float, float]:
+    return load_power_stats(*task)
+
+
+def welch_matrix(counts: np.ndarray, means: np.ndarray, variances: np.ndarray) -> np.ndarray:
+    """
+    Welch's t-test between every pair of samples, from their sizes, means and variances only.
+    :return: matrix with the two-sided p-value of samples i and j at [i, j]
+    """
+    return welch_test(counts[:, np.newaxis], means[:, np.newaxis], variances[:, np.newaxis],
+                      counts[np.newaxis, :], means[np.newaxis, :], variances[np.newaxis, :])[1]
+
+
 def directory_compare(directory: str, filter_dupes: bool, output_file: str, decimals: Optional[int] = None):
+    """
+    Writes a lower triangular matrix with the p-values of Welch's t-test between the power samples of every pair of
+    traces in a directory.  Every file is loaded once (in parallel), after which all the tests are done at once
+    from the size, mean and variance of every trace.
+    """
     file_list: List[str] = os.listdir(directory)
-    filtered_files_list = list(filter(lambda file: '_power' in file, file_list))
+    filtered_files_list = list(filter(lambda file: '_power' in file or is_result_file(file), file_list))
     filtered_files_list.sort()
-    num_files = len(filtered_files_list)
 
-    #result_matrix = [[0 for _ in range(num_files)] for _ in range(num_files)]
-    csv_header = [' '] + [name.removesuffix('_power.pickle.gz') for name in filtered_files_list]
+    with Pool() as p:
+        stats = p.map(_load_power_stats, [(directory + file, filter_dupes) for file in filtered_files_list])
+    counts, means, variances = (np.array(column, dtype=np.float64) for column in zip(*stats)) if stats \
+        else (np.zeros(0), np.zeros(0), np.zeros(0))
+    p_values = welch_matrix(counts, means, variances).tolist()
+
+    csv_header = [' '] + [_get_trace_name(name) for name in filtered_files_list]
     csv_lines = [csv_header]
 
     for (index, file) in enumerate(filtered_files_list):
         # row before col
-        results = [file.removesuffix('_power.pickle.gz')]
-        for (compindex, comp) in enumerate(filtered_files_list[:index]):
-            res = single_file_compare(directory+file, directory+comp, filter_dupes)
+        results = [_get_trace_name(file)]
+        for compindex in range(index):
+            res = p_values[index][compindex]
             if decimals is not None:
                 res = f'{res:.{decimals}}'
             results.append(res)
@@ -1,6 +1,6 @@
-from typing import Any, Dict, List, Callable
+from typing import Any, Dict, Callable, Iterable
 
-from analysis.function.function import Function
+from analysis.function.function import Function, post_process_functions
 from analysis.statistical_analysis import StatisticalAnalyzer
 from trace_representation.app_sample import AppState, PowerPeriod
 from trace_representation.simpleperf_python_datatypes import TimePeriod, EnergyPeriod, CallChainEntry, Symbol
@@ -42,7 +42,17 @@ def _analyze_callchain_entry(entry: CallChainEntry, fun_dict: Dict[Any, Function
     :param used_fun_set: Functions we've seen *in this callchain* so far
     :return:
     """
-    function = _get_or_create_function(entry.symbol, fun_dict)
+    return _analyze_callchain_symbol(entry.symbol, fun_dict, child_fun, time, energy, power, used_fun_set)
+
+
+def _analyze_callchain_symbol(symbol: Symbol, fun_dict: Dict[Any, Function], child_fun: Function,
+                              time: TimePeriod, energy: EnergyPeriod, power: PowerPeriod, used_fun_set: set,
+                              count: int = 1) -> Function:
+    """
+    Same as _analyze_callchain_entry, but for the symbol of the entry.
+    :param count: number of samples that the time, energy and power were accumulated over
+    """
+    function = _get_or_create_function(symbol, fun_dict)
     if child_fun not in function.children:
         function.children.add(child_fun)
     # For now we ignore any recursive calls to a function.
@@ -50,7 +60,7 @@ def _analyze_callchain_entry(entry: CallChainEntry, fun_dict: Dict[Any, Function
     # energy, power, and time.  This way we don't double attribute things that make the numbers weird.
     if function not in used_fun_set:
         used_fun_set.add(function)
-        function.num_samples += 1
+        function.num_samples += count
         function.energy += energy
         function.power += power
         function.time += time
@@ -86,7 +96,7 @@ def _analyze_state(app_state: AppState, total_time: int, function_dict: Dict[int
     function.num_leaf_samples += 1
 
     # energy/time to be used for entries in the callchain
-    non_local_time = TimePeriod(local_time=TimeUnit(), accumulated_time=sample_runtime)
+    non_local_time = TimePeriod(local_time=TimeUnit.ZERO, accumulated_time=sample_runtime)
     non_local_energy = EnergyPeriod(local_energy=0, accumulated_energy=sample_energy)
     non_local_power = PowerPeriod(nonlocal_power=sample_power)
 
@@ -107,28 +117,35 @@ class SingleThreadedAnalyzer(StatisticalAnalyzer):
     Class that will analyze a list of AppStates that, together, make up a program trace.
     This class makes a very simplifying assumption that the whole program is one thread,
     that may or may not be actively scheduled.
+    The states may also be given as any other iterable, like the stream from stream_to_abstract. In that case
+    the states are analyzed one at a time as they are parsed, and only the function dict is kept in memory.
     """
 
-    def __init__(self, state_list: List[AppState], begin_time: TimeUnit = None,
-                 end_time: TimeUnit = None, filter_dupes: bool = True):
+    def __init__(self, state_list: Iterable[AppState], begin_time: TimeUnit = None,
+                 end_time: TimeUnit = None, filter_dupes: bool = True, alpha: float = 0.05):
         super().__init__(state_list, begin_time, end_time)
         self.function_dict: Dict[int, Function] = {}
         self.filter_dupes = filter_dupes
+        self.alpha = alpha
 
     def perform_analysis(self):
         total_time = 0
+        total_samples = 0
         # each state corresponds to a single stack sample (in the single threaded analyzer)
         # if there are multiple traces in the state we just ignore them and only take the first one
+        # count the states as we go, the state list may be a stream that can only be consumed once.
         for state in self._state_list:
             total_time = _analyze_state(state, total_time, self.function_dict)
+            total_samples += 1
+        self.total_samples = total_samples
+        self.total_time = total_time
 
         # now we created a full list of functions!  very cool.
         # phat(bbm) = n(bbm) / n === estimated prob of bbm (or function)
         # is equal to number of function samples over total number of samples
 
-        total_samples = len(self._state_list)
-        for fun in self.function_dict.values():
-            fun.post_process(total_samples, total_time / 1e9, self.filter_dupes)
+        post_process_functions(self.function_dict.values(), total_samples, total_time / 1e9, self.filter_dupes,
+                               self.alpha)
 
     def get_sorted_fun_list(self, key: Callable[[Function], Any] = lambda fun: fun.local_energy_cost, reverse=False):
         """
@@ -0,0 +1,79 @@
+from typing import Any, Dict, Callable, Iterable, Union, Optional
+
+from analysis.function.function import Function, post_process_functions
+from analysis.single_threaded_analyzer import _get_or_create_function, _analyze_callchain_symbol
+from analysis.statistical_analysis import StatisticalAnalyzer
+from trace_representation.app_sample import AppState, PowerPeriod
+from trace_representation.simpleperf_python_datatypes import TimePeriod, EnergyPeriod
+from trace_representation.stack_trie import StackTrie, StackNode
+from trace_representation.time_unit import TimeUnit
+from trace_representation.trace_table import TraceTable
+
+
+def _analyze_stack(node: StackNode, function_dict: Dict[int, Function]):
+    """
+    Attributes all the samples of one distinct stack at once, the same way _analyze_state does for one sample.
+    :param node: trie node where the stack ends
+    :param function_dict: Dictionary of functions we've seen so far
+    """
+    stack = node.get_stack()
+    period = TimeUnit.from_nanos(node.period)
+
+    function = _get_or_create_function(stack[0], function_dict)
+    function.time += TimePeriod(local_time=period, accumulated_time=period)
+    function.energy += EnergyPeriod(local_energy=node.energy, accumulated_energy=node.energy)
+    function.power += PowerPeriod.from_counts(node.power, 0.0, dict(node.power_samples), {})
+    function.num_leaf_samples += node.num_samples
+
+    non_local_time = TimePeriod(local_time=TimeUnit.ZERO, accumulated_time=period)
+    non_local_energy = EnergyPeriod(local_energy=0, accumulated_energy=node.energy)
+    non_local_power = PowerPeriod.from_counts(0.0, node.power, {}, dict(node.power_samples))
+
+    child_fun = function
+    used_function_set = set()
+    for symbol in stack[1:]:
+        child_fun = _analyze_callchain_symbol(symbol, function_dict, child_fun, non_local_time, non_local_energy,
+                                              non_local_power, used_function_set, node.num_samples)
+
+
+class StackAnalyzer(StatisticalAnalyzer):
+    """
+    Analyzer that first combines the samples with an identical stack in a StackTrie, and then attributes every
+    distinct stack to its functions once, instead of walking the callchain of every sample.
+    The counts, time, energy and power of the functions are the same as with SingleThreadedAnalyzer (up to float
+    rounding), but the energy lists of the functions have one entry per distinct stack instead of one per sample.
+    The trie is kept in self.trie after the analysis.
+    """
+
+    def __init__(self, state_list: Union[Iterable[AppState], TraceTable], begin_time: TimeUnit = None,
+                 end_time: TimeUnit = None, filter_dupes: bool = True, alpha: float = 0.05):
+        super().__init__(state_list, begin_time, end_time)
+        self.function_dict: Dict[int, Function] = {}
+        self.filter_dupes = filter_dupes
+        self.alpha = alpha
+        self.trie: Optional[StackTrie] = None
+
+    def perform_analysis(self):
+        if isinstance(self._state_list, TraceTable):
+            self.trie = StackTrie.from_table(self._state_list)
+        else:
+            self.trie = StackTrie.from_states(self._state_list)
+
+        for node in self.trie:
+            _analyze_stack(node, self.function_dict)
+
+        self.total_samples = self.trie.num_samples
+        self.total_time = self.trie.total_period
+        post_process_functions(self.function_dict.values(), self.total_samples, self.total_time / 1e9,
+                               self.filter_dupes, self.alpha)
+
+    def get_sorted_fun_list(self, key: Callable[[Function], Any] = lambda fun: fun.local_energy_cost, reverse=False):
+        """
+        Returns a sorted list of all functions in the function dictionary
+        :param key: Key to sort the list by
+        :param reverse: Should the list be reversed
+        :return: Sorted list
+        """
+        fun_list = list(self.function_dict.values())
+        fun_list.sort(key=key, reverse=reverse)
+        return fun_list
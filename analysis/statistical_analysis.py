@@ -1,21 +1,32 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Iterable
 
 from trace_representation.app_sample import AppState
 # Abstract class for a statistical analyzer, that will take a list of program states and *do something* with them.
 from trace_representation.time_unit import TimeUnit
+from trace_representation.trace_table import TraceTable
 
 
 class StatisticalAnalyzer(ABC):
-    def __init__(self, state_list: List[AppState], begin_time: TimeUnit = None, end_time: TimeUnit() = None):
+    def __init__(self, state_list: Iterable[AppState], begin_time: TimeUnit = None, end_time: TimeUnit() = None):
         def keep_state(state: AppState):
             return (begin_time is None or state.timestamp >= begin_time) and (
                         end_time is None or state.timestamp <= end_time)
 
+        # a TraceTable is sliced with its time index, a list of states is filtered up front, and any other
+        # iterable (like a stream from the parser) is filtered lazily so that it is never fully resident.
         if begin_time is None and end_time is None:
             self._state_list = state_list
-        else:
+        elif isinstance(state_list, TraceTable):
+            self._state_list = state_list.between(begin_time, end_time)
+        elif isinstance(state_list, list):
             self._state_list = list(filter(keep_state, state_list))
+        else:
+            self._state_list = filter(keep_state, state_list)
+
+        # filled in by perform_analysis: number of samples analyzed, and their summed period in nanoseconds
+        self.total_samples: int = 0
+        self.total_time: int = 0
 
         super().__init__()
 
@@ -0,0 +1,166 @@
+from typing import Dict, List, Set
+
+from analysis.function.function import Function, post_process_functions
+from trace_representation.app_sample import PowerSample, PowerPeriod
+from trace_representation.simpleperf_python_datatypes import TimePeriod, EnergyPeriod
+from trace_representation.time_unit import TimeUnit
+
+
+def _to_power_ids(counts: Dict[PowerSample, int], power_ids: Dict[PowerSample, int]) -> Dict[int, int]:
+    return {power_ids[power_sample]: count for power_sample, count in counts.items()}
+
+
+def _to_power_samples(counts: Dict[int, int], power_samples: List[PowerSample]) -> Dict[PowerSample, int]:
+    return {power_samples[power_id]: count for power_id, count in counts.items()}
+
+
+class FunctionAggregate(object):
+    """
+    Raw sums of one function, without any of the statistics that post_process derives from them.
+    The PowerSamples are stored as counts per index into the power samples of the TraceAggregate it belongs to.
+    """
+
+    def __init__(self, addr: int):
+        self.addr: int = addr
+        self.name_set: Set[str] = set()
+        self.num_leaf_samples: int = 0
+        self.num_samples: int = 0
+        self.local_time: int = 0  # nanoseconds
+        self.accumulated_time: int = 0  # nanoseconds
+        self.local_energy: float = 0.0
+        self.accumulated_energy: float = 0.0
+        self.local_power: float = 0.0
+        self.nonlocal_power: float = 0.0
+        self.local_power_ids: Dict[int, int] = {}
+        self.nonlocal_power_ids: Dict[int, int] = {}
+        self.children: Set[int] = set()  # addresses of the called functions
+
+    @staticmethod
+    def from_function(function: Function, power_ids: Dict[PowerSample, int]) -> "FunctionAggregate":
+        """
+        :param function: analyzed Function
+        :param power_ids: index of every PowerSample the function refers to
+        """
+        aggregate = FunctionAggregate(function.addr)
+        aggregate.name_set = set(function.name_set)
+        aggregate.num_leaf_samples = function.num_leaf_samples
+        aggregate.num_samples = function.num_samples
+        aggregate.local_time = function.time.local_time.to_nanos()
+        aggregate.accumulated_time = function.time.accumulated_time.to_nanos()
+        aggregate.local_energy = function.energy.local_energy
+        aggregate.accumulated_energy = function.energy.accumulated_energy
+        aggregate.local_power = function.power.local_power
+        aggregate.nonlocal_power = function.power.nonlocal_power
+        aggregate.local_power_ids = _to_power_ids(function.power.get_local_counts(), power_ids)
+        aggregate.nonlocal_power_ids = _to_power_ids(function.power.get_nonlocal_counts(), power_ids)
+        aggregate.children = {child.addr for child in function.children}
+        return aggregate
+
+    def merge(self, other: "FunctionAggregate", power_id_offset: int = 0):
+        """
+        Adds the sums of other to this aggregate.
+        :param other: aggregate of the same function
+        :param power_id_offset: amount to shift the power sample indices of other by
+        """
+        self.name_set |= other.name_set
+        self.num_leaf_samples += other.num_leaf_samples
+        self.num_samples += other.num_samples
+        self.local_time += other.local_time
+        self.accumulated_time += other.accumulated_time
+        self.local_energy += other.local_energy
+        self.accumulated_energy += other.accumulated_energy
+        self.local_power += other.local_power
+        self.nonlocal_power += other.nonlocal_power
+        for power_id, count in other.local_power_ids.items():
+            self.local_power_ids[power_id + power_id_offset] = \
+                self.local_power_ids.get(power_id + power_id_offset, 0) + count
+        for power_id, count in other.nonlocal_power_ids.items():
+            self.nonlocal_power_ids[power_id + power_id_offset] = \
+                self.nonlocal_power_ids.get(power_id + power_id_offset, 0) + count
+        self.children |= other.children
+
+    def to_function(self, power_samples: List[PowerSample]) -> Function:
+        """
+        :return: Function with these sums.  Its children are not set, and it still has to be post processed.
+        """
+        function = Function(self.addr, next(iter(self.name_set)))
+        function.name_set = set(self.name_set)
+        function.num_leaf_samples = self.num_leaf_samples
+        function.num_samples = self.num_samples
+        function.time = TimePeriod(TimeUnit.from_nanos(self.local_time), TimeUnit.from_nanos(self.accumulated_time))
+        # the per sample energy lists are not kept in the aggregate, only the sums
+        function.energy = EnergyPeriod()
+        function.energy.local_energy = self.local_energy
+        function.energy.accumulated_energy = self.accumulated_energy
+        function.power = PowerPeriod.from_counts(self.local_power, self.nonlocal_power,
+                                                 _to_power_samples(self.local_power_ids, power_samples),
+                                                 _to_power_samples(self.nonlocal_power_ids, power_samples))
+        return function
+
+
+class TraceAggregate(object):
+    """
+    Mergeable summary of the analysis of one or more traces: the raw sums per function, the PowerSamples they refer
+    to and the totals of the traces.  Partial aggregates of separate traces can be combined with merge, and turned
+    into post processed Functions once at the end with to_functions.
+    """
+
+    def __init__(self):
+        self.functions: Dict[int, FunctionAggregate] = {}
+        self.power_samples: List[PowerSample] = []
+        self.total_samples: int = 0
+        self.total_time: int = 0  # nanoseconds
+
+    @staticmethod
+    def from_analysis(function_dict: Dict[int, Function], power_samples: List[PowerSample], total_samples: int,
+                      total_time: int) -> "TraceAggregate":
+        """
+        :param function_dict: functions from an analyzer
+        :param power_samples: PowerSamples of the trace, every PowerSample used by the functions must be in here
+        :param total_samples: number of samples that were analyzed
+        :param total_time: summed period of the samples in nanoseconds
+        """
+        aggregate = TraceAggregate()
+        aggregate.power_samples = list(power_samples)
+        power_ids = {power_sample: index for index, power_sample in enumerate(aggregate.power_samples)}
+        aggregate.functions = {addr: FunctionAggregate.from_function(function, power_ids)
+                               for addr, function in function_dict.items()}
+        aggregate.total_samples = total_samples
+        aggregate.total_time = total_time
+        return aggregate
+
+    def merge(self, other: "TraceAggregate"):
+        """
+        Adds the functions and totals of other to this aggregate.  The PowerSamples of other are appended.
+        """
+        offset = len(self.power_samples)
+        self.power_samples += other.power_samples
+        for addr, other_function in other.functions.items():
+            function = self.functions.get(addr)
+            if function is None:
+                function = FunctionAggregate(addr)
+                self.functions[addr] = function
+            function.merge(other_function, offset)
+        self.total_samples += other.total_samples
+        self.total_time += other.total_time
+
+    def __iadd__(self, other: "TraceAggregate"):
+        if not isinstance(other, TraceAggregate):
+            raise TypeError('Object provided is not a TraceAggregate')
+        self.merge(other)
+        return self
+
+    def to_functions(self, filter_dupes: bool = True, alpha: float = 0.05) -> Dict[int, Function]:
+        """
+        Creates the Functions from the sums, and post processes them with the totals of all the merged traces.
+        :param filter_dupes: Whether to filter duplicate power measurements
+        :param alpha: desired alpha of the confidence intervals
+        :return: function dict, like the one an analyzer produces
+        """
+        function_dict = {addr: aggregate.to_function(self.power_samples)
+                         for addr, aggregate in self.functions.items()}
+        for addr, aggregate in self.functions.items():
+            function_dict[addr].children = {function_dict[child] for child in aggregate.children}
+        post_process_functions(function_dict.values(), self.total_samples, self.total_time / 1e9, filter_dupes,
+                               alpha)
+        return function_dict
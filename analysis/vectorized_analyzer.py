@@ -0,0 +1,245 @@
+from typing import Any, Dict, Callable, List, Optional
+
+import numpy as np
+
+from analysis.function.function import Function, post_process_functions
+from analysis.statistical_analysis import StatisticalAnalyzer
+from trace_representation.app_sample import PowerPeriod, PowerSample
+from trace_representation.simpleperf_python_datatypes import TimePeriod, EnergyPeriod
+from trace_representation.time_unit import TimeUnit
+from trace_representation.trace_table import TraceTable
+
+
+def _run_starts(values: np.ndarray) -> np.ndarray:
+    """
+    :return: mask of the entries that differ from the entry before them, the first entry always starts a run
+    """
+    starts = np.ones(len(values), dtype=bool)
+    starts[1:] = values[1:] != values[:-1]
+    return starts
+
+
+def _unique(values: np.ndarray) -> np.ndarray:
+    """
+    Sorted unique values.  Same as np.unique, but sorting is a lot faster than its hash table for large arrays.
+    """
+    values = np.sort(values)
+    return values[_run_starts(values)]
+
+
+def _stable_order(fun_ids: np.ndarray, num_funs: int) -> np.ndarray:
+    """
+    Stable argsort of function ids, narrowed down to the smallest dtype first so numpy can use radix sort.
+    """
+    return np.argsort(fun_ids.astype(np.min_scalar_type(num_funs), copy=False), kind='stable')
+
+
+def _group_by_function(fun_ids: np.ndarray, values: np.ndarray, num_funs: int) -> List[list]:
+    """
+    Splits values into one list per function, keeping the order of the samples within each list.
+    :param fun_ids: function id of each value
+    :param values: values to group
+    :param num_funs: total number of functions
+    :return: list with the values of function i at index i
+    """
+    order = _stable_order(fun_ids, num_funs)
+    ordered = values[order].tolist()
+    bounds = np.cumsum(np.bincount(fun_ids, minlength=num_funs)).tolist()
+    groups = []
+    begin = 0
+    for end in bounds:
+        groups.append(ordered[begin:end])
+        begin = end
+    return groups
+
+
+def _count_power_samples(fun_ids: np.ndarray, power_ids: np.ndarray, num_funs: int,
+                         power_samples: List[PowerSample]) -> List[Dict[PowerSample, int]]:
+    """
+    Counts how often every PowerSample occurs for each function.
+    :param fun_ids: function id of each sample
+    :param power_ids: index of the PowerSample of each sample
+    :param num_funs: total number of functions
+    :param power_samples: the PowerSamples that power_ids refer to
+    :return: list with the PowerSample counts of function i at index i
+    """
+    num_power = max(len(power_samples), 1)
+    pairs = np.sort(fun_ids * num_power + power_ids)
+    first = np.flatnonzero(_run_starts(pairs))
+    counts = np.diff(np.append(first, len(pairs))).tolist()
+    power_counts: List[Dict[PowerSample, int]] = [{} for _ in range(num_funs)]
+    for pair, count in zip(pairs[first].tolist(), counts):
+        power_counts[pair // num_power][power_samples[pair % num_power]] = count
+    return power_counts
+
+
+class CallchainVisits(object):
+    """
+    Every sample of a TraceTable laid out as its leaf followed by its callchain, which is the order the entries are
+    visited in by SingleThreadedAnalyzer, with the symbols mapped to function ids.
+    Functions are keyed on address, so symbols from different dsos can share a function; addrs[i] is the address of
+    function i.  Recursive calls are only counted once per sample, counted marks the visits that are counted.
+    """
+
+    def __init__(self, table: TraceTable):
+        num_states = len(table)
+        fun_index: Dict[int, int] = {}
+        self.sym_to_fun: np.ndarray = np.fromiter(
+            (fun_index.setdefault(symbol.symbol_addr, len(fun_index)) for symbol in table.symbol_table.symbols),
+            dtype=np.int64, count=len(table.symbol_table.symbols))
+        self.addrs: List[int] = list(fun_index)
+        self.num_funs: int = len(self.addrs)
+
+        chain_lengths = np.diff(table.callchain_offsets)
+        self.leaf_pos: np.ndarray = table.callchain_offsets[:-1] + np.arange(num_states)
+        self.is_frame: np.ndarray = np.ones(num_states + len(table.callchain_frames), dtype=bool)
+        self.is_frame[self.leaf_pos] = False
+        self.frame_pos: np.ndarray = np.flatnonzero(self.is_frame)
+        self.visit_sym: np.ndarray = np.empty(len(self.is_frame), dtype=np.int64)
+        self.visit_sym[self.leaf_pos] = table.symbol_id
+        self.visit_sym[self.frame_pos] = table.callchain_frames
+        self.visit_fun: np.ndarray = self.sym_to_fun[self.visit_sym]
+        self.visit_state: np.ndarray = np.repeat(np.arange(num_states), chain_lengths + 1)
+
+        # keep the first time a function shows up in a callchain.
+        # after a stable sort on function, repeats within a sample end up right after the first one.
+        chain_order = _stable_order(self.visit_fun[self.frame_pos], self.num_funs)
+        chain_fun = self.visit_fun[self.frame_pos][chain_order]
+        chain_state = self.visit_state[self.frame_pos][chain_order]
+        repeat = ~(_run_starts(chain_fun) | _run_starts(chain_state))
+        self.counted: np.ndarray = ~self.is_frame
+        self.counted[self.frame_pos[chain_order[~repeat]]] = True
+
+    @property
+    def leaf_fun(self) -> np.ndarray:
+        """
+        :return: function id of the leaf of every sample
+        """
+        return self.visit_fun[self.leaf_pos]
+
+    @property
+    def count_fun(self) -> np.ndarray:
+        """
+        :return: function id of every counted visit, in visit order
+        """
+        return self.visit_fun[self.counted]
+
+    @property
+    def count_state(self) -> np.ndarray:
+        """
+        :return: sample index of every counted visit, in visit order
+        """
+        return self.visit_state[self.counted]
+
+
+class VectorizedAnalyzer(StatisticalAnalyzer):
+    """
+    Columnar version of SingleThreadedAnalyzer.  Instead of walking every sample and every callchain entry, it
+    maps the symbols of a TraceTable to function ids and accumulates the counts, time, energy and power of all the
+    functions at once with bincount.  The resulting function dict is the same as the one SingleThreadedAnalyzer
+    produces for the same samples.
+    """
+
+    def __init__(self, table: TraceTable, begin_time: TimeUnit = None, end_time: TimeUnit = None,
+                 filter_dupes: bool = True, alpha: float = 0.05):
+        super().__init__(table, begin_time, end_time)
+        self.table: TraceTable = self._state_list
+        self.function_dict: Dict[int, Function] = {}
+        self.filter_dupes = filter_dupes
+        self.alpha = alpha
+
+    def perform_analysis(self):
+        table = self.table
+        num_states = len(table)
+        symbols = table.symbol_table.symbols
+        visits = CallchainVisits(table)
+        addrs = visits.addrs
+        num_funs = visits.num_funs
+        sym_to_fun = visits.sym_to_fun
+        visit_sym = visits.visit_sym
+        visit_fun = visits.visit_fun
+        frame_pos = visits.frame_pos
+
+        # each callchain entry is the parent of the entry before it (the leaf for the first entry)
+        edges = _unique(visit_fun[frame_pos] * num_funs + visit_fun[frame_pos - 1]).tolist()
+
+        count_fun = visits.count_fun
+        count_state = visits.count_state
+        count_is_frame = visits.is_frame[visits.counted]
+        frame_fun = count_fun[count_is_frame]
+        frame_state = count_state[count_is_frame]
+        leaf_fun = visits.leaf_fun
+
+        num_leaf_samples = np.bincount(leaf_fun, minlength=num_funs).tolist()
+        num_samples = np.bincount(frame_fun, minlength=num_funs).tolist()
+
+        local_time = np.zeros(num_funs, dtype=np.int64)
+        np.add.at(local_time, leaf_fun, table.period)
+        accumulated_time = np.zeros(num_funs, dtype=np.int64)
+        np.add.at(accumulated_time, count_fun, table.period[count_state])
+
+        local_energy = np.bincount(leaf_fun, weights=table.energy, minlength=num_funs).tolist()
+        accumulated_energy = np.bincount(count_fun, weights=table.energy[count_state], minlength=num_funs).tolist()
+        # EnergyPeriod adds the accumulated energy to both lists, for local and non-local samples alike
+        count_energy = table.energy[count_state]
+        has_energy = count_energy > 0
+        energy_lists = _group_by_function(count_fun[has_energy], count_energy[has_energy], num_funs)
+
+        has_power = table.power_id >= 0
+        local_power = np.bincount(leaf_fun[has_power], weights=table.power[has_power], minlength=num_funs).tolist()
+        frame_has_power = has_power[frame_state]
+        nonlocal_power = np.bincount(frame_fun[frame_has_power], weights=table.power[frame_state[frame_has_power]],
+                                     minlength=num_funs).tolist()
+        local_power_counts = _count_power_samples(leaf_fun[has_power], table.power_id[has_power], num_funs,
+                                                  table.power_samples)
+        nonlocal_power_counts = _count_power_samples(frame_fun[frame_has_power],
+                                                     table.power_id[frame_state[frame_has_power]], num_funs,
+                                                     table.power_samples)
+
+        # create the functions in the order they are first encountered, like SingleThreadedAnalyzer
+        first_visit = np.full(num_funs, len(visit_fun), dtype=np.int64)
+        np.minimum.at(first_visit, visit_fun, np.arange(len(visit_fun)))
+        used_funs = np.flatnonzero(first_visit < len(visit_fun))
+        used_funs = used_funs[np.argsort(first_visit[used_funs])]
+        functions: List[Optional[Function]] = [None] * num_funs
+        for fun_id, sym_id in zip(used_funs.tolist(), visit_sym[first_visit[used_funs]].tolist()):
+            functions[fun_id] = Function(addrs[fun_id], symbols[sym_id].symbol_name)
+            self.function_dict[addrs[fun_id]] = functions[fun_id]
+        for sym_id in np.flatnonzero(np.bincount(visit_sym, minlength=len(symbols))).tolist():
+            functions[sym_to_fun[sym_id]].name_set.add(symbols[sym_id].symbol_name)
+
+        for edge in edges:
+            functions[edge // num_funs].children.add(functions[edge % num_funs])
+
+        local_time = local_time.tolist()
+        accumulated_time = accumulated_time.tolist()
+        for fun_id in used_funs.tolist():
+            function = functions[fun_id]
+            function.num_leaf_samples = num_leaf_samples[fun_id]
+            function.num_samples = num_samples[fun_id]
+            function.time = TimePeriod(TimeUnit.from_nanos(local_time[fun_id]),
+                                       TimeUnit.from_nanos(accumulated_time[fun_id]))
+            energy = EnergyPeriod()
+            energy.local_energy = local_energy[fun_id]
+            energy.accumulated_energy = accumulated_energy[fun_id]
+            energy.local_energy_list = energy_lists[fun_id]
+            energy.accumulated_energy_list = list(energy_lists[fun_id])
+            function.energy = energy
+            function.power = PowerPeriod.from_counts(local_power[fun_id], nonlocal_power[fun_id],
+                                                     local_power_counts[fun_id], nonlocal_power_counts[fun_id])
+
+        self.total_samples = num_states
+        self.total_time = int(table.period.sum())
+        post_process_functions(self.function_dict.values(), self.total_samples, self.total_time / 1e9,
+                               self.filter_dupes, self.alpha)
+
+    def get_sorted_fun_list(self, key: Callable[[Function], Any] = lambda fun: fun.local_energy_cost, reverse=False):
+        """
+        Returns a sorted list of all functions in the function dictionary
+        :param key: Key to sort the list by
+        :param reverse: Should the list be reversed
+        :return: Sorted list
+        """
+        fun_list = list(self.function_dict.values())
+        fun_list.sort(key=key, reverse=reverse)
+        return fun_list
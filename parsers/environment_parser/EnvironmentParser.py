@@ -1,56 +1,25 @@
 from functools import singledispatchmethod
-from typing import List, Union
+from typing import List, Union, Tuple, Optional
 
-from parsers.environment_parser.entry import *
-from operator import attrgetter
+import numpy as np
 
-# standard compare: 0 if good, -1 if x < y, 1 if x > y
-# if timestamp < position, return -1.
-# if timestamp > position, return 1
+from parsers.environment_parser.entry import *
+from parsers.environment_parser.log_columns import load_log_columns
 from trace_representation.time_unit import TimeUnit
 
 
-def check_timestamp_position(timestamp: TimeUnit, position, logs: list[Entry]):
-    power = logs[position]
-    compare = power.compare_timestamp(timestamp)
-
-    # this will never happen but it'd be nice
-    if compare == 0:
-        return 0
-
-    # current position time is greater than target time
-    if compare == -1:
-        # for now, return 0 if we're already at the start of the array.  maybe in future we should discard this
-        # sample?
-        if position <= 0:
-            return 0
-        # return that timestamp is less than current position
-        return -1
-
-    # from here on: current position is less than target time
-
-    # we don't have any more logs, so return good.
-    if position >= len(logs) - 1:
-        return 0
-    # the next log is from the future, so this is the best one.
-    if logs[position + 1].timestamp > timestamp:
-        return 0
-    # the next log must be from before our timestamp, return that target > position
-    return 1
-
-
-# binary search the log list for the timestamp occurring closest to the given timestamp, but not in the future.
-def bin_search(begin, end, timestamp: TimeUnit, logs: list[Power]) -> Power:
-    # base case: we're out of options
-    if begin == end:
-        return logs[begin]
-    middle = begin + (int((end - begin) / 2))
-    comp = check_timestamp_position(timestamp, middle, logs)
-    if comp == 0:
-        return logs[middle]
-    if comp == -1:
-        return bin_search(begin, middle - 1, timestamp, logs)
-    return bin_search(middle + 1, end, timestamp, logs)
+def _check_in_order(timestamps: np.ndarray, message: str):
+    if np.any(timestamps[1:] < timestamps[:-1]):
+        raise AssertionError(message)
+
+
+def _forward_fill_index(mask: np.ndarray) -> np.ndarray:
+    """
+    :return: for every position, the index of the last True in mask at or before it, or -1 if there is none
+    """
+    index = np.where(mask, np.arange(len(mask)), -1)
+    np.maximum.accumulate(index, out=index)
+    return index
 
 
 class EnvironmentLog(object):
@@ -64,38 +33,69 @@ class EnvironmentLog(object):
 
     @__init__.register
     def _init_with_args(self, env_log: str, current_divider: Union[float, int]):
-        logfile = open(env_log)
-        lines = logfile.readlines()
-        logs = map(lambda line: parse_line(line, current_divider), lines)
-        self.raw_logs = list(logs)
-        lastvoltage = None
-        lastcurrent = None
-
-        def lam(log):
-            nonlocal lastvoltage, lastcurrent
-            if isinstance(log, Voltage):
-                if isinstance(lastvoltage, Voltage) and log.timestamp < lastvoltage.timestamp:
-                    raise AssertionError('out of order processing of logs, not good')
-                lastvoltage = log
-                if isinstance(lastcurrent, Current):
-                    return Power(lastvoltage, lastcurrent)
-                else:
-                    return None
-            elif isinstance(log, Current):
-                if isinstance(lastcurrent, Current) and log.timestamp < lastcurrent.timestamp:
-                    raise AssertionError('out of order processing of logs')
-                lastcurrent = log
-                if isinstance(lastvoltage, Voltage):
-                    return Power(lastvoltage, lastcurrent)
-                else:
-                    return None
-            else:
-                return log
-
-        self.logs = list(filter(lambda log: log is not None, map(lam, self.raw_logs)))
-        self.logs.sort(key=attrgetter('timestamp'))
-        self.power_logs: List[Power] = list(filter(lambda log: isinstance(log, Power), self.logs))
+        self.env_log = env_log
+        self.current_divider = current_divider
+        columns = load_log_columns(env_log)
+
+        # every voltage or current log creates a power log from the latest voltage and current seen so far,
+        # find those by forward filling the line indices of each channel
+        timestamps = columns.timestamps
+        is_voltage = columns.is_voltage
+        _check_in_order(timestamps[is_voltage], 'out of order processing of logs, not good')
+        _check_in_order(timestamps[~is_voltage], 'out of order processing of logs')
+        last_voltage = _forward_fill_index(is_voltage)
+        last_current = _forward_fill_index(~is_voltage)
+        has_power = (last_voltage >= 0) & (last_current >= 0)
+        last_voltage = last_voltage[has_power]
+        last_current = last_current[has_power]
+
+        power_values = (columns.values[last_voltage] / 1000.0) * (columns.values[last_current] / current_divider)
+        power_millis = np.maximum(timestamps[last_voltage], timestamps[last_current])
+        power_positions = columns.positions[has_power]
+        # sort by time, keeping the order of the file for equal timestamps
+        order = np.lexsort((power_positions, power_millis))
+
+        self.power_timestamps: np.ndarray = power_millis[order] * 1000000  # nanos
+        self.power_values: np.ndarray = power_values[order]
+        self._power_positions: np.ndarray = power_positions[order]
+        self._other_timestamps: np.ndarray = columns.other_timestamps
+        self._other_positions: np.ndarray = columns.other_positions
+        self._other_lines: List[str] = columns.other_lines
+        self._power_logs: Optional[List[Power]] = None
+        self._cumulative_energy: Optional[np.ndarray] = None
+
+    @property
+    def power_logs(self) -> List[Power]:
+        """
+        Power logs as Entry objects, sorted by time.  These are only created once they are asked for.
+        """
+        if self._power_logs is None:
+            self._power_logs = [Power.from_data(TimeUnit.from_nanos(timestamp), data) for timestamp, data in
+                                zip(self.power_timestamps.tolist(), self.power_values.tolist())]
+        return self._power_logs
 
+    @property
+    def logs(self) -> List[Entry]:
+        """
+        Power logs and the logs of all the other channels as Entry objects, sorted by time.
+        Voltage and current logs are not included, they are combined into the power logs.
+        """
+        power_logs = self.power_logs
+        num_power = len(power_logs)
+        order = np.lexsort((np.concatenate((self._power_positions, self._other_positions)),
+                            np.concatenate((self.power_timestamps // 1000000, self._other_timestamps))))
+        return [power_logs[index] if index < num_power
+                else parse_line(self._other_lines[index - num_power], self.current_divider)
+                for index in order.tolist()]
+
+    @property
+    def raw_logs(self) -> List[Entry]:
+        """
+        Every line of the log file as an Entry (or None for unrecognized lines).
+        This re-reads the log file, so don't use it for large logs.
+        """
+        with open(self.env_log) as logfile:
+            return [parse_line(line, self.current_divider) for line in logfile]
 
     def print_logs(self, logs=None):
         if logs is None:
@@ -103,23 +103,95 @@ class EnvironmentLog(object):
         for log in logs:
             print(str(log))
 
-    # binary search for timestamp
+    def get_power_log(self, index: int) -> Power:
+        if self._power_logs is not None:
+            return self._power_logs[index]
+        return Power.from_data(TimeUnit.from_nanos(int(self.power_timestamps[index])), float(self.power_values[index]))
+
+    def get_power_index_for_time(self, timestamp: Union[TimeUnit, int]) -> int:
+        """
+        Finds the power log that was active at the given time, which is the last one that is not in the future.
+        If the timestamp is before the first power log, the first one is used.
+        :param timestamp: TimeUnit or timestamp in nanoseconds
+        :return: index of the power log in self.power_logs
+        """
+        nanos = timestamp.to_nanos() if isinstance(timestamp, TimeUnit) else timestamp
+        return max(int(np.searchsorted(self.power_timestamps, nanos, side='right')) - 1, 0)
+
     def get_power_for_time(self, timestamp: TimeUnit) -> Power:
-        return bin_search(0, len(self.power_logs) - 1, timestamp, self.power_logs)
+        return self.get_power_log(self.get_power_index_for_time(timestamp))
 
-    def get_power_average(self) -> float:
+    def get_power_ids_for_times(self, timestamps: np.ndarray) -> np.ndarray:
         """
-        Get the average power draw over the whole environment log.
-        :return: average power draw in Watts
+        Batch version of get_power_index_for_time.
+        :param timestamps: array of timestamps (or a single timestamp) in nanoseconds
+        :return: array with the index of the active power log for each timestamp
         """
-        start_time: TimeUnit = self.power_logs[0].timestamp
-        end_time: TimeUnit = self.power_logs[-1].timestamp
-        total_time: TimeUnit = end_time - start_time
+        return np.maximum(np.searchsorted(self.power_timestamps, timestamps, side='right') - 1, 0)
 
-        consumed_joules: float = 0
-        for index, power in enumerate(self.power_logs[0:-1]):
-            period: TimeUnit = self.power_logs[index + 1].timestamp - power.timestamp
-            consumed_joules += power.data * float(period.to_seconds())
+    def get_power_for_times(self, timestamps: np.ndarray, periods: np.ndarray,
+                            integrated: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Joins a batch of samples with the power logs in one go.
+        :param timestamps: array of sample timestamps in nanoseconds
+        :param periods: array of sample periods in nanoseconds
+        :param integrated: if True, the energy is integrated over the power logs during the whole period of the
+            sample, instead of using the power at the start of the sample for the whole period
+        :return: index of the active power log and the energy in joules consumed by each sample
+        """
+        power_ids = self.get_power_ids_for_times(timestamps)
+        if integrated:
+            energies = self.get_energy_for_intervals(timestamps, np.asarray(timestamps) + periods)
+        else:
+            energies = self.power_values[power_ids] * (np.asarray(periods) / 1e9)
+        return power_ids, energies
+
+    @property
+    def cumulative_energy(self) -> np.ndarray:
+        """
+        Prefix sum index over the power logs, cumulative_energy[i] is the energy in joules consumed from the first
+        power log up to power log i.  Built the first time it is needed.
+        """
+        if self._cumulative_energy is None:
+            self._cumulative_energy = np.zeros(len(self.power_values), dtype=np.float64)
+            np.cumsum(self.power_values[:-1] * (np.diff(self.power_timestamps) / 1e9),
+                      out=self._cumulative_energy[1:])
+        return self._cumulative_energy
+
+    def get_energy_until(self, timestamps: Union[np.ndarray, int]) -> Union[np.ndarray, float]:
+        """
+        Energy consumed from the first power log up to the given timestamps, where each power log holds until the
+        next one.  The first power log is extended backwards for timestamps before it (giving a negative energy),
+        and the last one is extended forwards.
+        :param timestamps: timestamp or array of timestamps in nanoseconds
+        :return: energy in joules
+        """
+        power_ids = self.get_power_ids_for_times(timestamps)
+        elapsed = (np.asarray(timestamps) - self.power_timestamps[power_ids]) / 1e9
+        return self.cumulative_energy[power_ids] + self.power_values[power_ids] * elapsed
+
+    def get_energy_for_intervals(self, begin: np.ndarray, end: np.ndarray) -> np.ndarray:
+        """
+        Exact energy consumed over each of the intervals [begin, end], using the prefix sum index.
+        :param begin: array of interval starts in nanoseconds
+        :param end: array of interval ends in nanoseconds
+        :return: energy in joules consumed during each interval
+        """
+        return self.get_energy_until(end) - self.get_energy_until(begin)
+
+    def get_power_average(self, begin: Optional[Union[TimeUnit, int]] = None,
+                          end: Optional[Union[TimeUnit, int]] = None) -> float:
+        """
+        Get the average power draw over the environment log, or over a window of it.
+        :param begin: start of the window, by default the first power log
+        :param end: end of the window, by default the last power log
+        :return: average power draw in Watts
+        """
+        begin = self.power_timestamps[0] if begin is None else begin
+        end = self.power_timestamps[-1] if end is None else end
+        begin = begin.to_nanos() if isinstance(begin, TimeUnit) else int(begin)
+        end = end.to_nanos() if isinstance(end, TimeUnit) else int(end)
 
-        avg_power = consumed_joules / float(total_time.to_seconds())
+        consumed_joules = float(self.get_energy_until(end) - self.get_energy_until(begin))
+        avg_power = consumed_joules / ((end - begin) / 1e9)
         return avg_power
@@ -114,3 +114,16 @@ class Power(Entry):
         self.timestamp = voltage.timestamp if voltage.timestamp > current.timestamp else current.timestamp
         self.data = voltage.get_volts() * current.get_amps()  # gives Watts
         self.logtype = 'Power'
+
+    @classmethod
+    def from_data(cls, timestamp: TimeUnit, data: float) -> "Power":
+        """
+        Creates a Power from an already calculated value, used by the columnar environment log.
+        :param timestamp: time of the power log
+        :param data: power in Watts
+        """
+        power = cls.__new__(cls)
+        power.timestamp = timestamp
+        power.data = data
+        power.logtype = 'Power'
+        return power
@@ -0,0 +1,265 @@
+from typing import List, Tuple, Optional
+
+import numpy as np
+
+from parsers.environment_parser.entry import LogType
+
+# bytes read from the log file per chunk, the tokenizer needs a few arrays of one int64 per line in the chunk
+_CHUNK_SIZE = 1 << 23
+
+_PADDING = 32
+_NEWLINE = ord('\n')
+_CARRIAGE_RETURN = ord('\r')
+_SPACE = ord(' ')
+_MINUS = ord('-')
+_ZERO = ord('0')
+
+# _BYTE_MASKS[n] selects the first n bytes of a little-endian uint64
+_BYTE_MASKS = np.array([(1 << (8 * n)) - 1 for n in range(9)], dtype=np.uint64)
+_ZERO_WORD = np.uint64(0x3030303030303030)
+
+_LOG_TYPES = {log_type.value for log_type in LogType}
+_LOG_TYPE_NAMES = [log_type.value.encode() for log_type in LogType]
+_VOLTAGE_INDEX = list(LogType).index(LogType.VOLTAGE)
+_CURRENT_INDEX = list(LogType).index(LogType.CURRENT)
+
+
+class LogColumns(object):
+    """
+    Columnar contents of an environment log.  Only the voltage and current channels are kept as numeric columns,
+    the lines of every other (rare) channel are kept as-is so their Entries can be created on demand.
+    All positions are line numbers in the log file, which are used to keep the original order for equal timestamps.
+    """
+
+    def __init__(self, timestamps: np.ndarray, is_voltage: np.ndarray, values: np.ndarray, positions: np.ndarray,
+                 other_timestamps: np.ndarray, other_positions: np.ndarray, other_lines: List[str]):
+        self.timestamps: np.ndarray = timestamps  # millis, voltage and current lines only
+        self.is_voltage: np.ndarray = is_voltage  # True for voltage, False for current
+        self.values: np.ndarray = values  # the raw numeric value of the line
+        self.positions: np.ndarray = positions
+        self.other_timestamps: np.ndarray = other_timestamps  # millis
+        self.other_positions: np.ndarray = other_positions
+        self.other_lines: List[str] = other_lines
+
+
+def _gather(buf: np.ndarray, starts: np.ndarray, width: int) -> np.ndarray:
+    """
+    :param buf: buffer that is padded with at least width zeros
+    :return: matrix with row i containing buf[starts[i]:starts[i] + width]
+    """
+    windows = np.lib.stride_tricks.sliding_window_view(buf, width)
+    return windows[np.minimum(starts, len(windows) - 1)]
+
+
+def _with_bytes(words: np.ndarray, num_bytes: np.ndarray, replacement: np.uint64) -> np.ndarray:
+    """
+    Replaces the first num_bytes[i] bytes of words[i] with the same bytes of replacement.
+    """
+    masks = _BYTE_MASKS[num_bytes]
+    return (words & ~masks) | (replacement & masks)
+
+
+def _parse_eight_digits(words: np.ndarray) -> np.ndarray:
+    """
+    Parses 8 ascii digits packed little-endian into a uint64 (first digit in the lowest byte), for a whole array.
+    Combines neighbouring digits, then pairs, then quads with one multiply each.
+    """
+    words = words - np.uint64(0x3030303030303030)
+    words = (words * np.uint64(10) + (words >> np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    words = (words * np.uint64(100) + (words >> np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    words = (words * np.uint64(10000) + (words >> np.uint64(32))) & np.uint64(0x00000000FFFFFFFF)
+    return words
+
+
+def _are_digits(words: np.ndarray) -> np.ndarray:
+    """
+    :return: whether all 8 bytes of each uint64 are ascii digits
+    """
+    high_nibbles = words & np.uint64(0xF0F0F0F0F0F0F0F0)
+    overflow = ((words + np.uint64(0x0606060606060606)) & np.uint64(0xF0F0F0F0F0F0F0F0)) >> np.uint64(4)
+    return (high_nibbles | overflow) == np.uint64(0x3333333333333333)
+
+
+def _parse_ints(buf: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parses the (optionally negative) decimal integers of at most 16 digits in buf[starts[i]:ends[i]]
+    for every i at once.
+    :return: the parsed integers, and a mask of which tokens were valid integers
+    """
+    if len(starts) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+    negative = buf[np.minimum(starts, len(buf) - 1)] == _MINUS
+    lengths = ends - starts - negative
+    valid = (lengths > 0) & (lengths <= 16) & (ends >= 16)
+    # right-align every token in 16 bytes (two words), replacing whatever came before the token with zeros
+    words = _gather(buf, np.maximum(ends - 16, 0), 16).view(np.uint64)
+    padding = 16 - np.clip(lengths, 0, 16)
+    high = _with_bytes(words[:, 0], np.minimum(padding, 8), _ZERO_WORD)
+    low = _with_bytes(words[:, 1], np.maximum(padding - 8, 0), _ZERO_WORD)
+    valid &= _are_digits(high) & _are_digits(low)
+    values = _parse_eight_digits(high) * np.uint64(100000000) + _parse_eight_digits(low)
+    values = values.astype(np.int64)
+    values[negative] = -values[negative]
+    return values, valid
+
+
+def _match_token(buf: np.ndarray, starts: np.ndarray, lengths: np.ndarray, names: List[bytes]) -> np.ndarray:
+    """
+    Case-insensitive comparison of every token buf[starts[i]:starts[i] + lengths[i]] with a list of names.
+    The names must consist of only lowercase letters, and be at most 16 characters long.
+    :return: for every token, the index of the name it is equal to, or -1 if it is none of them
+    """
+    matches = np.full(len(starts), -1, dtype=np.int64)
+    # compare 16 byte tokens as two 64 bit words, with everything after the token set to zero.
+    # setting bit 5 lowercases ascii letters and does not turn anything else into a lowercase letter
+    words = _gather(buf, starts, 16).view(np.uint64) | np.uint64(0x2020202020202020)
+    lengths = np.clip(lengths, 0, 16)
+    high = words[:, 0] & _BYTE_MASKS[np.minimum(lengths, 8)]
+    low = words[:, 1] & _BYTE_MASKS[np.maximum(lengths - 8, 0)]
+    for index, name in enumerate(names):
+        name_words = np.frombuffer(name.ljust(16, b'\0'), dtype=np.uint64)
+        matches[(high == name_words[0]) & (low == name_words[1]) & (lengths == len(name))] = index
+    return matches
+
+
+def _tokenize_line(line: str) -> Optional[Tuple[int, str, str]]:
+    """
+    Slow path for the lines the vectorized tokenizer could not handle, same rules as entry.parse_line.
+    :return: timestamp, lowercase log type and value, or None if the line is not a valid log
+    """
+    split = line.strip().split(sep=' ')
+    if len(split) < 3:
+        return None
+    try:
+        return int(split[0]), split[1].lower(), split[2]
+    except ValueError:
+        return None
+
+
+class _ColumnCollector(object):
+    def __init__(self):
+        self.timestamps: List[np.ndarray] = []
+        self.is_voltage: List[np.ndarray] = []
+        self.values: List[np.ndarray] = []
+        self.positions: List[np.ndarray] = []
+        self.other_timestamps: List[int] = []
+        self.other_positions: List[int] = []
+        self.other_lines: List[str] = []
+
+    def add_slow_line(self, line: str, position: int):
+        tokens = _tokenize_line(line)
+        if tokens is None or tokens[1] not in _LOG_TYPES:
+            print('unexpected line, got ' + line)
+            return
+        timestamp, log_type, value = tokens
+        if log_type == LogType.VOLTAGE.value or log_type == LogType.CURRENT.value:
+            self.timestamps.append(np.array([timestamp], dtype=np.int64))
+            self.is_voltage.append(np.array([log_type == LogType.VOLTAGE.value]))
+            self.values.append(np.array([float(value)], dtype=np.float64))
+            self.positions.append(np.array([position], dtype=np.int64))
+        else:
+            self.other_timestamps.append(timestamp)
+            self.other_positions.append(position)
+            self.other_lines.append(line)
+
+    def add_chunk(self, chunk: bytes, first_position: int) -> int:
+        """
+        Tokenizes a chunk of complete lines.
+        :param chunk: bytes of the log file, ending in a newline
+        :param first_position: line number of the first line in the chunk
+        :return: number of lines in the chunk
+        """
+        # pad the buffer so that fixed width tokens can be read near the end of the chunk
+        buf = np.frombuffer(chunk + bytes(_PADDING), dtype=np.uint8)
+        ends = np.flatnonzero(buf == _NEWLINE)
+        num_lines = len(ends)
+        starts = np.empty_like(ends)
+        starts[0] = 0
+        starts[1:] = ends[:-1] + 1
+        positions = np.arange(first_position, first_position + num_lines, dtype=np.int64)
+        ends = ends - ((ends > starts) & (buf[np.maximum(ends - 1, 0)] == _CARRIAGE_RETURN))
+        non_empty = ends > starts
+        starts, ends, positions = starts[non_empty], ends[non_empty], positions[non_empty]
+
+        # a valid line is "timestamp type value [extra]", separated by single spaces
+        spaces = np.append(np.flatnonzero(buf == _SPACE), [len(chunk)] * 3)
+        first_space_index = np.searchsorted(spaces, starts)
+        first_space = spaces[first_space_index]
+        second_space = spaces[first_space_index + 1]
+        value_end = np.minimum(spaces[first_space_index + 2], ends)
+        well_formed = (first_space > starts) & (second_space < ends) & (value_end > second_space + 1)
+
+        timestamps, valid_timestamps = _parse_ints(buf, starts, first_space)
+        type_starts = first_space + 1
+        log_types = _match_token(buf, type_starts, second_space - type_starts, _LOG_TYPE_NAMES)
+        is_voltage = log_types == _VOLTAGE_INDEX
+        is_current = log_types == _CURRENT_INDEX
+        is_other = (log_types >= 0) & ~is_voltage & ~is_current
+        values, valid_values = _parse_ints(buf, second_space + 1, value_end)
+
+        fast_power = well_formed & valid_timestamps & valid_values & (is_voltage | is_current)
+        self.timestamps.append(timestamps[fast_power])
+        self.is_voltage.append(is_voltage[fast_power])
+        self.values.append(values[fast_power].astype(np.float64))
+        self.positions.append(positions[fast_power])
+
+        fast_other = well_formed & valid_timestamps & is_other
+        for index in np.flatnonzero(fast_other).tolist():
+            self.other_timestamps.append(int(timestamps[index]))
+            self.other_positions.append(int(positions[index]))
+            self.other_lines.append(chunk[starts[index]:ends[index]].decode())
+
+        # anything else (unknown types, non-integer values, odd whitespace) goes through the python tokenizer
+        for index in np.flatnonzero(~(fast_power | fast_other)).tolist():
+            self.add_slow_line(chunk[starts[index]:ends[index]].decode(), int(positions[index]))
+
+        return num_lines
+
+    def build(self) -> LogColumns:
+        def concat(arrays: List[np.ndarray], dtype) -> np.ndarray:
+            return np.concatenate(arrays, dtype=dtype) if len(arrays) > 0 else np.empty(0, dtype=dtype)
+
+        timestamps = concat(self.timestamps, np.int64)
+        is_voltage = concat(self.is_voltage, bool)
+        values = concat(self.values, np.float64)
+        positions = concat(self.positions, np.int64)
+        # slow path lines were added out of order with the rest of their chunk
+        if np.any(positions[1:] < positions[:-1]):
+            order = np.argsort(positions, kind='stable')
+            timestamps, is_voltage, values, positions = \
+                timestamps[order], is_voltage[order], values[order], positions[order]
+        other_timestamps = np.array(self.other_timestamps, dtype=np.int64)
+        other_positions = np.array(self.other_positions, dtype=np.int64)
+        other_lines = self.other_lines
+        if np.any(other_positions[1:] < other_positions[:-1]):
+            order = np.argsort(other_positions, kind='stable')
+            other_timestamps, other_positions = other_timestamps[order], other_positions[order]
+            other_lines = [other_lines[index] for index in order.tolist()]
+        return LogColumns(timestamps, is_voltage, values, positions, other_timestamps, other_positions, other_lines)
+
+
+def load_log_columns(env_log: str, chunk_size: int = _CHUNK_SIZE) -> LogColumns:
+    """
+    Reads an environment log in chunks, tokenizing every chunk with numpy instead of line by line.
+    :param env_log: path to the environment log
+    :param chunk_size: number of bytes to read at a time
+    :return: the columns of the log
+    """
+    collector = _ColumnCollector()
+    position = 0
+    leftover = b''
+    with open(env_log, 'rb') as logfile:
+        while True:
+            data = logfile.read(chunk_size)
+            if not data:
+                break
+            data = leftover + data
+            last_newline = data.rfind(b'\n')
+            if last_newline == -1:
+                leftover = data
+                continue
+            leftover = data[last_newline + 1:]
+            position += collector.add_chunk(data[:last_newline + 1], position)
+    if leftover:
+        collector.add_chunk(leftover + b'\n', position)
+    return collector.build()
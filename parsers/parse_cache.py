@@ -0,0 +1,67 @@
+import hashlib
+import json
+import os
+import pickle
+from typing import Optional
+
+from parsers.parser_args import ParserArgs
+from trace_reader_utils.file_utils import update_hash, atomic_output
+from trace_representation.trace_table import TraceTable
+
+# bump when the contents of a cached TraceTable change, so old entries are no longer used
+CACHE_VERSION = 2
+
+
+class ParseCache(object):
+    """
+    On-disk cache of joined TraceTables, so a trace only has to be parsed and joined with its environment log once.
+    Entries are keyed by a hash of the perf.data file, the environment log and the ParserArgs that influence the
+    parsing, so a changed input file or setting results in a new entry instead of a stale table.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir: str = cache_dir
+
+    @staticmethod
+    def get_key(args: ParserArgs) -> str:
+        """
+        :return: hash of the input files and the parse settings of args
+        """
+        key_hash = hashlib.blake2b(digest_size=20)
+        settings = {
+            'version': CACHE_VERSION,
+            'trace_offcpu_mode': args.trace_offcpu_mode,
+            'current_divider': args.current_divider,
+            # the config file and the command line use different names for the binary cache
+            'binary_cache': getattr(args, 'binary_cache', None) or getattr(args, 'binary_cache_dir', None),
+            'energy_mode': args.energy_mode,
+        }
+        key_hash.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+        update_hash(key_hash, args.get_simpleperf_log_file())
+        update_hash(key_hash, args.get_env_log_file())
+        return key_hash.hexdigest()
+
+    def get_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.pickle')
+
+    def load(self, key: str) -> Optional[TraceTable]:
+        """
+        :return: the cached table, or None if there is no (readable) entry for key
+        """
+        path = self.get_path(key)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, 'rb') as cache_file:
+                table = pickle.load(cache_file)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError) as e:
+            print(f'WARNING: ignoring unreadable parse cache entry {path}: {e}')
+            return None
+        return table if isinstance(table, TraceTable) else None
+
+    def store(self, key: str, table: TraceTable):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.get_path(key)
+        # write to a temporary file first, so other processes never see a partial entry
+        with atomic_output(path) as temp_path, open(temp_path, 'wb') as cache_file:
+            pickle.dump(table, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
@@ -1,40 +1,160 @@
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator
+
+import numpy as np
 
 from parsers.environment_parser.EnvironmentParser import EnvironmentLog
-from parsers.environment_parser.entry import Power
+from parsers.parse_cache import ParseCache
 from parsers.parser_args import ParserArgs
 from parsers.perf_parser.perf_data_parser import PerfDataParser
 from trace_representation.app_sample import AppState, PowerSample
 from trace_representation.time_unit import TimeUnit
+from trace_representation.trace_table import TraceTable
+
+
+def _get_energy_cost_of_sample(environment_log: EnvironmentLog, timestamp: TimeUnit, period: TimeUnit,
+                               integrated: bool = False) -> (float, int):
+    power_id = environment_log.get_power_index_for_time(timestamp)
+    if integrated:
+        begin = timestamp.to_nanos()
+        energy_used = float(environment_log.get_energy_until(begin + period.to_nanos())
+                            - environment_log.get_energy_until(begin))
+    else:
+        energy_used = float(environment_log.power_values[power_id]) * period.to_seconds_float()
+    return energy_used, power_id
+
+
+def _integrate_energy(args: ParserArgs) -> bool:
+    """
+    :return: whether the energy of each sample should be integrated over the power logs during its period,
+        instead of taking the power at the start of the sample.
+    """
+    return args.energy_mode == 'integrated'
+
+
+def _make_power_sample(environment_log: EnvironmentLog, power_id: int) -> PowerSample:
+    return PowerSample(float(environment_log.power_values[power_id]),
+                       TimeUnit.from_nanos(int(environment_log.power_timestamps[power_id])))
+
+
+def _get_power_sample(environment_log: EnvironmentLog, power_id: int,
+                      encountered_power_states: Dict[int, PowerSample]) -> PowerSample:
+    if power_id in encountered_power_states:
+        pow_samp = encountered_power_states[power_id]
+    else:
+        pow_samp = _make_power_sample(environment_log, power_id)
+        encountered_power_states[power_id] = pow_samp
+    return pow_samp
+
+
+def _join_power(states: Iterable[AppState], env_samples: EnvironmentLog,
+                encountered_power_states: Dict[int, PowerSample], integrated: bool = False) -> Iterator[AppState]:
+    """
+    Attaches the power and energy consumption from the environment log to each of the states, one by one.
+    :param states: AppStates to join with the environment log
+    :param env_samples: environment log to take the power from
+    :param encountered_power_states: dict that any new PowerSamples are added to, keyed on power log index
+    :param integrated: whether to integrate the energy over the period of the sample
+    :return: iterator over the same AppStates, now with their power and energy set
+    """
+    for state in states:
+        energy_cost, power_id = _get_energy_cost_of_sample(env_samples, state.timestamp, state.period, integrated)
+        state.energy_consumed = energy_cost
+        state.power = _get_power_sample(env_samples, power_id, encountered_power_states)
+        yield state
+
 
+def _join_power_batch(states: List[AppState], env_samples: EnvironmentLog,
+                      encountered_power_states: Dict[int, PowerSample], integrated: bool = False):
+    """
+    Same as _join_power, but looks up the power for all the states at once.
+    :param states: AppStates to join with the environment log
+    :param env_samples: environment log to take the power from
+    :param encountered_power_states: dict that any new PowerSamples are added to, keyed on power log index
+    :param integrated: whether to integrate the energy over the period of the sample
+    """
+    timestamps = np.fromiter((state.timestamp.to_nanos() for state in states), dtype=np.int64, count=len(states))
+    periods = np.fromiter((state.period.to_nanos() for state in states), dtype=np.int64, count=len(states))
+    power_ids, energies = env_samples.get_power_for_times(timestamps, periods, integrated)
 
-def _get_energy_cost_of_sample(environment_log: EnvironmentLog, timestamp: TimeUnit, period: TimeUnit) -> (
-        float, Power):
-    cur_power = environment_log.get_power_for_time(timestamp)
-    power = environment_log.get_power_for_time(timestamp)
-    energy_used = power.data * float(period.to_seconds())
-    return energy_used, cur_power
+    for state, power_id, energy_cost in zip(states, power_ids.tolist(), energies.tolist()):
+        state.energy_consumed = energy_cost
+        state.power = _get_power_sample(env_samples, power_id, encountered_power_states)
 
 
 def parse_to_abstract(args: ParserArgs) -> (List[AppState], List[PowerSample]):
+    if args.parse_cache_dir:
+        # the cache holds joined TraceTables, the states are materialized from the (possibly cached) table
+        table = parse_to_table(args)
+        return list(table.iter_states()), list(table.power_samples)
     env_samples = EnvironmentLog(args)
     perf_parser = PerfDataParser(args)
     states = perf_parser.parse()
 
-    encountered_power_states: Dict[Power, PowerSample] = {}
+    encountered_power_states: Dict[int, PowerSample] = {}
+    _join_power_batch(states, env_samples, encountered_power_states, _integrate_energy(args))
+    return states, list(encountered_power_states.values())
 
-    def get_power_sample(timestamp: TimeUnit, period: TimeUnit) -> (float, PowerSample):
-        energy_cost, power = _get_energy_cost_of_sample(env_samples, timestamp, period)
-        if power in encountered_power_states:
-            pow_samp = encountered_power_states[power]
-        else:
-            pow_samp = PowerSample(power.data, power.timestamp)
-            encountered_power_states[power] = pow_samp
 
-        return energy_cost, pow_samp
+def _join_power_table(table: TraceTable, env_samples: EnvironmentLog, integrated: bool = False):
+    """
+    Fills in the energy, power and power_id columns of a TraceTable from the environment log.
+    :param table: TraceTable to join with the environment log
+    :param env_samples: environment log to take the power from
+    :param integrated: whether to integrate the energy over the period of the sample
+    """
+    power_ids, energies = env_samples.get_power_for_times(table.timestamp, table.period, integrated)
+    # only keep a PowerSample for the power logs that were actually used, renumbered in order of time
+    used_ids, table.power_id = np.unique(power_ids, return_inverse=True)
+    table.power_samples = [_make_power_sample(env_samples, power_id) for power_id in used_ids.tolist()]
+    table.energy = energies
+    table.power = env_samples.power_values[power_ids]
 
-    for state in states:
-        energy_cost, power = get_power_sample(state.timestamp, state.period)
-        state.energy_consumed = energy_cost
-        state.power = power
-    return states, list(encountered_power_states.values())
+
+def parse_to_table(args: ParserArgs) -> TraceTable:
+    """
+    Columnar version of parse_to_abstract.  If a parse cache directory is set, the table is taken from the cache
+    when the inputs and parse settings are unchanged, and stored in it otherwise.
+    :param args: ParserArgs object
+    :return: TraceTable with the samples joined with the environment log, including its list of PowerSamples
+    """
+    if not args.parse_cache_dir:
+        return _parse_table(args)
+    cache = ParseCache(args.parse_cache_dir)
+    key = cache.get_key(args)
+    table = cache.load(key)
+    if table is None:
+        table = _parse_table(args)
+        cache.store(key, table)
+    return table
+
+
+def _parse_table(args: ParserArgs) -> TraceTable:
+    env_samples = EnvironmentLog(args)
+    perf_parser = PerfDataParser(args)
+    table = perf_parser.parse_table()
+    _join_power_table(table, env_samples, _integrate_energy(args))
+    return table
+
+
+def stream_to_abstract(args: ParserArgs, encountered_power_states: Dict[int, PowerSample]) -> Iterator[AppState]:
+    """
+    Streaming version of parse_to_abstract.  The samples are read from the perf.data file and joined with the
+    environment log one at a time, so only the environment log and the current sample are resident.
+    Nothing is read until the first state is requested.
+    :param args: ParserArgs object
+    :param encountered_power_states: dict that the PowerSamples are added to as the iterator is consumed
+    :return: iterator over the AppStates in the trace
+    """
+    if args.parse_cache_dir:
+        # a cached table is only used, not created, since that would keep all samples in memory
+        table = ParseCache(args.parse_cache_dir).load(ParseCache.get_key(args))
+        if table is not None:
+            for state in table.iter_states():
+                if state.power is not None:
+                    encountered_power_states.setdefault(id(state.power), state.power)
+                yield state
+            return
+    env_samples = EnvironmentLog(args)
+    perf_parser = PerfDataParser(args)
+    yield from _join_power(perf_parser.iter_states(), env_samples, encountered_power_states,
+                           _integrate_energy(args))
@@ -1,6 +1,9 @@
 import argparse
 from configparser import ConfigParser
 from functools import singledispatchmethod
+from typing import Optional
+
+from trace_representation.time_unit import TimeUnit
 
 
 class ParserArgs:
@@ -20,16 +23,33 @@ class ParserArgs:
     def _init_from_argv(self, argv):
         parser = argparse.ArgumentParser()
         parser.add_argument('-n', '--ndk_dir', type=str, required=True)
-        parser.add_argument('-m', '--mode', type=str, default='single', choices=['single', 'directory', 'merge'])
+        parser.add_argument('-m', '--mode', type=str, default='single',
+                            choices=['single', 'directory', 'merge', 'reanalyze', 'recursive', 'watch', 'profile'])
         parser.add_argument('--filter_dupes', action='store_true')
         parser.add_argument('-i', '--input_dir', type=str, default='./')
+        parser.add_argument('--shared_dir', type=str, default=None)
         parser.add_argument('--shared_filename', type=str)
         parser.add_argument('--binary_cache_dir', type=str)
         parser.add_argument('--trace_offcpu_mode', type=str, default='on-cpu')
-        parser.add_argument('--no_output_csv', action='store_false')
-        parser.add_argument('--no_pickle_functions', action='store_false')
+        parser.add_argument('--no_output_csv', dest='output_csv', action='store_false')
+        parser.add_argument('--no_pickle_functions', dest='pickle_functions', action='store_false')
         parser.add_argument('-o','--output_dir', type=str, required=True)
         parser.add_argument('-c', '--current_divider', type=float, default=1e9)
+        parser.add_argument('--streaming', action='store_true')
+        parser.add_argument('--trace_table', action='store_true')
+        parser.add_argument('--pickle_trace', action='store_true')
+        parser.add_argument('--energy_mode', type=str, default='point', choices=['point', 'integrated'])
+        parser.add_argument('--analyzer', type=str, default='object', choices=['object', 'vectorized', 'stack'])
+        parser.add_argument('--function_table', action='store_true')
+        parser.add_argument('--result_format', type=str, default='pickle', choices=['pickle', 'trr'])
+        parser.add_argument('--catalog_file', type=str, default=None)
+        parser.add_argument('--parse_cache_dir', type=str, default=None)
+        parser.add_argument('--alpha', type=float, default=0.05)
+        parser.add_argument('--begin_time', type=int, default=None)
+        parser.add_argument('--end_time', type=int, default=None)
+        parser.add_argument('--profile_window', type=int, default=1000)
+        parser.add_argument('--watch_interval', type=float, default=2.0)
+        parser.add_argument('--watch_settle_time', type=float, default=5.0)
 
         parser.parse_args(args=argv, namespace=self)
         self.source_dirs = []
@@ -56,6 +76,48 @@ class ParserArgs:
         self.pickle_functions = config.getboolean('pickle_functions')
         self.output_dir = config.get('output_dir')
         self.shared_dir = config.get('shared_dir')
+        # streaming mode analyzes the samples as they are parsed, instead of building the full list of states first
+        self.streaming = config.getboolean('streaming', False)
+        # parse into a columnar TraceTable instead of a list of AppStates
+        self.trace_table = config.getboolean('trace_table', False)
+        # also pickle the joined samples (as a TraceTable) next to the function dict
+        self.pickle_trace = config.getboolean('pickle_trace', False)
+        # point: energy of a sample is the power at its start times its period.
+        # integrated: energy is integrated over every power log during the period of the sample.
+        self.energy_mode = config.get('energy_mode', 'point')
+        # object: walk the AppStates one by one with SingleThreadedAnalyzer.
+        # vectorized: analyze the samples as a TraceTable with VectorizedAnalyzer.
+        # stack: combine identical stacks in a StackTrie first, then analyze each distinct stack with StackAnalyzer.
+        self.analyzer = config.get('analyzer', 'object')
+        # store the analysis results as a column-wise FunctionTable instead of a dict of Function objects
+        self.function_table = config.getboolean('function_table', False)
+        # pickle: gzipped pickles of the functions and the power samples.
+        # trr: one binary result file with the functions and power samples as columns, see result_file.py
+        self.result_format = config.get('result_format', 'pickle')
+        # if set, every analyzed trace and its functions are also added to this SQLite catalog
+        self.catalog_file = config.get('catalog_file', None)
+        # if set, joined sample tables are cached in this directory, keyed by the input files and parse settings
+        self.parse_cache_dir = config.get('parse_cache_dir', None)
+        # alpha of the confidence intervals
+        self.alpha = config.getfloat('alpha', 0.05)
+        # only analyze the samples in this time window, in milliseconds like the environment log timestamps
+        self.begin_time = config.getint('begin_time', None)
+        self.end_time = config.getint('end_time', None)
+        # profile mode: length of the windows the energy of the stored sample tables is profiled in, in milliseconds
+        self.profile_window = config.getint('profile_window', 1000)
+        # watch mode: seconds between polls of the input directory, and seconds the input files of a trace have to
+        # stay unchanged before it is considered complete
+        self.watch_interval = config.getfloat('watch_interval', 2.0)
+        self.watch_settle_time = config.getfloat('watch_settle_time', 5.0)
+
+    def get_begin_time(self) -> Optional[TimeUnit]:
+        return TimeUnit(millis=self.begin_time) if self.begin_time is not None else None
+
+    def get_end_time(self) -> Optional[TimeUnit]:
+        return TimeUnit(millis=self.end_time) if self.end_time is not None else None
+
+    def get_profile_window(self) -> TimeUnit:
+        return TimeUnit(millis=self.profile_window)
 
     def get_env_log_file(self):
         return f'{self.env_dir()}{self.shared_filename}.txt'
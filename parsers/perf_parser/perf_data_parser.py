@@ -1,11 +1,12 @@
-from typing import List
+from typing import List, Iterator
 
-from simpleperf_report_lib import ReportLib
+from simpleperf_report_lib import ReportLib, SampleStruct
 
 from parsers.parser_args import ParserArgs
 from trace_representation.app_sample import AppState, AppSample, EnvironmentState, ThreadSample
-from trace_representation.simpleperf_python_datatypes import CallChain, Symbol
+from trace_representation.simpleperf_python_datatypes import CallChain, SymbolTable
 from trace_representation.time_unit import TimeUnit
+from trace_representation.trace_table import TraceTable, TraceTableBuilder
 
 
 class PerfDataParser(object):
@@ -19,29 +20,58 @@ class PerfDataParser(object):
         """
         self.args = args
         self.states: List[AppState] = []
+        self.symbol_table: SymbolTable = SymbolTable()
 
     def parse(self) -> List[AppState]:
         self.states = self._convert_to_states()
         return self.states
 
-    def _create_report_lib(self) -> ReportLib:
-        sp_report = ReportLib()
-        sp_report.SetRecordFile(self.args.get_simpleperf_log_file())
-        if self.args.trace_offcpu_mode in sp_report.GetSupportedTraceOffCpuModes():
-            sp_report.SetTraceOffCpuMode(self.args.trace_offcpu_mode)
-        sp_report.SetSymfs(self.args.binary_cache)
-        return sp_report
+    def iter_states(self) -> Iterator[AppState]:
+        """
+        Generator version of parse, yields the AppStates one by one as they are read from the reportLib.
+        The states are not kept by the parser, so memory use does not grow with the length of the trace.
+        :return: iterator over the AppStates in the trace
+        """
+        lib = self._create_report_lib()
+        # symbols are interned per parse, every sample and callchain entry refers to the table's Symbol objects
+        self.symbol_table = SymbolTable()
+        symbol_table = self.symbol_table
+        for samp in self._iter_samples(lib):
+            period = TimeUnit.from_nanos(samp.period)
+            timestamp = TimeUnit.from_nanos(samp.time)  # simpleperf reports in nanoseconds, my tool in milliseconds
 
-    def _convert_to_states(self) -> List[AppState]:
+            thread_sample = ThreadSample(symbol_table.get_symbol(lib.GetSymbolOfCurrentSample()),
+                                         CallChain(lib.GetCallChainOfCurrentSample(), symbol_table))
+
+            app_sample = AppSample([thread_sample])
+            yield AppState(timestamp, period, 0, app_sample, EnvironmentState(), None)
+
+    def parse_table(self) -> TraceTable:
         """
-        Steps through the reportLib and creates a list of AppState objects.
-        Currently only capable of using on-cpu samples, will break with off-cpu samples
-        :return:
+        Parses the trace straight into a columnar TraceTable, without creating any per-sample objects.
+        The power and energy columns are left empty.
+        :return: TraceTable containing every supported sample
         """
-        states: List[AppState] = []
         lib = self._create_report_lib()
+        self.symbol_table = SymbolTable()
+        symbol_table = self.symbol_table
+        builder = TraceTableBuilder(symbol_table)
+        for samp in self._iter_samples(lib):
+            chain = lib.GetCallChainOfCurrentSample()
+            entries = [chain.entries[i] for i in range(0, chain.nr)]
+            builder.add_sample(samp.time, samp.period, symbol_table.get_id(lib.GetSymbolOfCurrentSample()),
+                               [symbol_table.get_id(entry.symbol) for entry in entries],
+                               [entry.ip for entry in entries],
+                               vaddrs=[entry.symbol.vaddr_in_file for entry in entries])
+        return builder.build()
+
+    @staticmethod
+    def _iter_samples(lib: ReportLib) -> Iterator[SampleStruct]:
+        """
+        Steps through the reportLib, yielding every sample of a supported event.
+        The reportLib is left on the yielded sample, so its symbol and callchain can be retrieved.
+        """
         count = 0
-        # loop steps through the samples one by one, converting them to AppStates
         # currently, only on-cpu samples are supported!
         while lib.GetNextSample() is not None:
             count += 1
@@ -50,18 +80,22 @@ class PerfDataParser(object):
             if 'task-clock' not in ev.name and 'cpu-clock' not in ev.name:
                 print(f'Unsupported event {ev.name}, skipping')
                 continue
+            yield samp
 
-            period = TimeUnit(nanos=samp.period)
-            timestamp = TimeUnit(nanos=samp.time)  # simpleperf reports in nanoseconds, my tool in milliseconds
-            # energy_cost, power = _get_energy_cost_of_sample(self.environment_log, timestamp, period)
-
-            thread_sample = ThreadSample(Symbol(lib.GetSymbolOfCurrentSample()),
-                                         CallChain(lib.GetCallChainOfCurrentSample()))
-
-            app_sample = AppSample([thread_sample])
-            new_state = AppState(timestamp, period, 0, app_sample, EnvironmentState(), None)
+        print(count)
 
-            states.append(new_state)
+    def _create_report_lib(self) -> ReportLib:
+        sp_report = ReportLib()
+        sp_report.SetRecordFile(self.args.get_simpleperf_log_file())
+        if self.args.trace_offcpu_mode in sp_report.GetSupportedTraceOffCpuModes():
+            sp_report.SetTraceOffCpuMode(self.args.trace_offcpu_mode)
+        sp_report.SetSymfs(self.args.binary_cache)
+        return sp_report
 
-        print(count)
-        return states
+    def _convert_to_states(self) -> List[AppState]:
+        """
+        Steps through the reportLib and creates a list of AppState objects.
+        Currently only capable of using on-cpu samples, will break with off-cpu samples
+        :return:
+        """
+        return list(self.iter_states())
@@ -0,0 +1,109 @@
+"""
+Synthetic traces for the tests, built without a perf.data file: random callchains over a small set of symbols,
+with recursive calls, symbols of different dsos that share an address (and so a function), samples without a
+callchain or without power, and PowerSamples that are shared between samples.
+"""
+import math
+from typing import Mapping, Optional
+
+import numpy as np
+
+from analysis.function.function import Function, INTERVAL_NAMES
+from trace_representation.app_sample import PowerSample
+from trace_representation.simpleperf_python_datatypes import Symbol, SymbolTable
+from trace_representation.time_unit import TimeUnit
+from trace_representation.trace_table import TraceTable, TraceTableBuilder
+
+# address of symbol 0, above 2 ** 63 so it only fits an unsigned 64 bit integer
+HIGH_ADDR = (1 << 63) + 0x40
+
+
+def make_symbol(dso_name: str, symbol_name: str, symbol_addr: int, vaddr: int = 0) -> Symbol:
+    symbol = Symbol.__new__(Symbol)
+    symbol.dso_name = dso_name
+    symbol.vaddr = vaddr
+    symbol.symbol_name = symbol_name
+    symbol.symbol_addr = symbol_addr
+    symbol.len = 0x80
+    return symbol
+
+
+def make_symbol_table(num_symbols: int = 12) -> SymbolTable:
+    symbol_table = SymbolTable()
+    for i in range(num_symbols):
+        # every third symbol is in another dso at the address of the symbol before it
+        addr = HIGH_ADDR if i == 0 else 0x1000 + 0x100 * (i - 1 if i % 3 == 2 else i)
+        symbol_table.add_symbol(make_symbol(f'lib{i % 3}.so', f'fun{i}', addr, addr + 4))
+    return symbol_table
+
+
+def make_power_samples(num_power_samples: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    return [PowerSample(float(power), TimeUnit.from_nanos(i * 1000000))
+            for i, power in enumerate(rng.uniform(1.0, 3.0, num_power_samples))]
+
+
+def make_table(seed: int = 0, num_samples: int = 300, num_symbols: int = 12, max_depth: int = 6,
+               num_power_samples: int = 40) -> TraceTable:
+    """
+    :return: TraceTable with random samples in time order, every sample one millisecond apart on average
+    """
+    rng = np.random.default_rng(seed)
+    power_samples = make_power_samples(num_power_samples, seed)
+    builder = TraceTableBuilder(make_symbol_table(num_symbols), power_samples)
+    timestamp = 1679000000000000000
+    for _ in range(num_samples):
+        period = int(rng.integers(900000, 1100000))
+        timestamp += period
+        frames = rng.integers(0, num_symbols, int(rng.integers(0, max_depth + 1))).tolist()
+        ips = [0x1000 + 0x100 * frame + int(rng.integers(0, 0x80)) for frame in frames]
+        energy = float(rng.uniform(0, 1e-3)) if rng.random() < 0.9 else 0.0
+        power_id = int(rng.integers(0, num_power_samples)) if rng.random() < 0.9 else -1
+        power = power_samples[power_id].power if power_id >= 0 else 0.0
+        builder.add_sample(timestamp, period, int(rng.integers(0, num_symbols)), frames, ips, energy, power,
+                           power_id)
+    return builder.build()
+
+
+def _close(a: Optional[float], b: Optional[float], rel: float) -> bool:
+    if a is None or b is None:
+        return a is b
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+        return True
+    return math.isclose(a, b, rel_tol=rel, abs_tol=1e-12)
+
+
+def _by_value(counts: Mapping[PowerSample, int]) -> dict:
+    return {(power_sample.power, power_sample.timestamp.to_nanos()): count for power_sample, count in counts.items()}
+
+
+def assert_same_functions(expected: Mapping[int, Function], actual: Mapping[int, Function], ordered: bool = True,
+                          rel: float = 1e-9, same_power_samples: bool = True):
+    """
+    Asserts that two function dicts (or FunctionTables) hold the same functions, with the floats compared up to
+    rounding.
+    :param ordered: also require the functions to be in the same order
+    :param same_power_samples: require the functions to refer to the same PowerSample objects, instead of to
+        PowerSamples with the same values (e.g. after reading them from a file)
+    """
+    get_counts = (lambda counts: counts) if same_power_samples else _by_value
+    assert (list(expected) == list(actual)) if ordered else (set(expected) == set(actual))
+    for addr, x in expected.items():
+        y = actual[addr]
+        assert x.addr == y.addr == addr
+        assert x.name_set == y.name_set, addr
+        assert (x.num_leaf_samples, x.num_samples) == (y.num_leaf_samples, y.num_samples), addr
+        assert x.time.local_time == y.time.local_time and x.time.accumulated_time == y.time.accumulated_time, addr
+        assert _close(x.energy.local_energy, y.energy.local_energy, rel), addr
+        assert _close(x.energy.accumulated_energy, y.energy.accumulated_energy, rel), addr
+        assert _close(x.power.local_power, y.power.local_power, rel), addr
+        assert _close(x.power.nonlocal_power, y.power.nonlocal_power, rel), addr
+        assert get_counts(x.power.get_local_counts()) == get_counts(y.power.get_local_counts()), addr
+        assert get_counts(x.power.get_nonlocal_counts()) == get_counts(y.power.get_nonlocal_counts()), addr
+        assert {child.addr for child in x.children} == {child.addr for child in y.children}, addr
+        for name in ['local_prob', 'nonlocal_prob', 'local_runtime', 'nonlocal_runtime', 'local_energy_cost',
+                     'nonlocal_energy_cost', 'mean_local_power', 'mean_nonlocal_power']:
+            assert _close(getattr(x, name), getattr(y, name), rel), (addr, name)
+        for name in INTERVAL_NAMES:
+            a, b = getattr(x, name), getattr(y, name)
+            assert _close(a.lower, b.lower, rel) and _close(a.upper, b.upper, rel), (addr, name)
@@ -0,0 +1,128 @@
+import warnings
+
+import numpy as np
+import pytest
+
+pytest.importorskip('simpleperf_report_lib')
+
+from scipy.stats import mannwhitneyu, ttest_ind
+
+from analysis.function.Comparators.batch_comparator import compare_tables, PowerGroups, POWER_KINDS, WELCH, \
+    MANN_WHITNEY_U
+from analysis.function.Comparators.function_comparator import welch_power, compare_dict
+from analysis.function.function_table import FunctionTable
+from analysis.single_threaded_analyzer import SingleThreadedAnalyzer
+from tests.synthetic import make_table
+
+
+def _analyze(seed: int, **kwargs):
+    table = make_table(seed, **kwargs)
+    analyzer = SingleThreadedAnalyzer(list(table))
+    analyzer.perform_analysis()
+    return analyzer.function_dict
+
+
+def _get_power_lists(function, filter_dupes: bool) -> dict:
+    return {'local': function.get_local_power_list(filter_dupes),
+            'nonlocal': function.get_nonlocal_power_list(filter_dupes),
+            'combined': function.get_combined_power_list(filter_dupes)}
+
+
+def _welch(a: list, b: list):
+    return ttest_ind(a, b, equal_var=False)
+
+
+def _reference_pvalue(test, a: list, b: list) -> float:
+    if len(a) == 0 or len(b) == 0:
+        return np.nan
+    with warnings.catch_warnings():
+        # scipy warns about samples of one value, and lists that are too small to test
+        warnings.simplefilter('ignore')
+        return test(a, b).pvalue
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('filter_dupes', [True, False])
+def test_welch_same_as_welch_power(seed: int, filter_dupes: bool):
+    x = _analyze(seed)
+    y = _analyze(seed + 10, num_samples=200)
+    result = compare_tables(x, y, filter_dupes, WELCH)
+    assert result['addr'].tolist() == [addr for addr in x if addr in y]
+    compared = 0
+    for row, addr in enumerate(result['addr'].tolist()):
+        x_lists = _get_power_lists(x[addr], filter_dupes)
+        y_lists = _get_power_lists(y[addr], filter_dupes)
+        assert result['local_mean1'][row] == x[addr].mean_local_power
+        assert result['nonlocal_mean2'][row] == y[addr].mean_nonlocal_power
+        if not (x_lists['combined'] and y_lists['combined']):
+            # welch_power can't average an empty combined list
+            for kind in POWER_KINDS:
+                assert np.isnan(result[f'{kind}_pvalue'][row])
+            continue
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            expected = welch_power(x[addr], y[addr], filter_dupes).results
+        for test_result, kind in zip(expected, POWER_KINDS):
+            assert result[f'{kind}_mean1'][row] == pytest.approx(test_result.val1, rel=1e-12)
+            assert result[f'{kind}_mean2'][row] == pytest.approx(test_result.val2, rel=1e-12)
+            assert result[f'{kind}_statistic'][row] == pytest.approx(test_result.result.statistic, rel=1e-9,
+                                                                      nan_ok=True), (addr, kind)
+            assert result[f'{kind}_pvalue'][row] == pytest.approx(test_result.result.pvalue, rel=1e-9,
+                                                                   nan_ok=True), (addr, kind)
+        compared += 1
+    assert compared > len(result) // 2
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('filter_dupes', [True, False])
+def test_mann_whitney_u_same_as_scipy(seed: int, filter_dupes: bool):
+    x = _analyze(seed)
+    y = _analyze(seed + 10, num_samples=200)
+    result = compare_tables(x, y, filter_dupes, MANN_WHITNEY_U)
+    for row, addr in enumerate(result['addr'].tolist()):
+        x_lists = _get_power_lists(x[addr], filter_dupes)
+        y_lists = _get_power_lists(y[addr], filter_dupes)
+        for kind in POWER_KINDS:
+            a, b = x_lists[kind], y_lists[kind]
+            expected = _reference_pvalue(lambda a, b: mannwhitneyu(a, b, method='asymptotic'), a, b)
+            assert result[f'{kind}_pvalue'][row] == pytest.approx(expected, rel=1e-9, nan_ok=True), (addr, kind)
+            if a and b:
+                statistic = mannwhitneyu(a, b, method='asymptotic').statistic
+                assert result[f'{kind}_statistic'][row] == pytest.approx(statistic, rel=1e-12)
+
+
+def test_compare_dict_same_as_welch_power():
+    x = _analyze(3)
+    y = _analyze(4)
+    results = compare_dict(x, y)
+    assert [result.func1 for result in results] == [x[addr] for addr in x if addr in y]
+    for result in results:
+        x_lists = _get_power_lists(result.func1, True)
+        y_lists = _get_power_lists(result.func2, True)
+        assert [test_result.identifier for test_result in result.results] == list(POWER_KINDS.values())
+        for test_result, kind in zip(result.results, POWER_KINDS):
+            expected = _reference_pvalue(_welch, x_lists[kind], y_lists[kind])
+            assert test_result.result.pvalue == pytest.approx(expected, rel=1e-9, nan_ok=True)
+
+
+@pytest.mark.parametrize('kind', list(POWER_KINDS))
+@pytest.mark.parametrize('filter_dupes', [True, False])
+def test_power_groups_same_as_power_lists(kind: str, filter_dupes: bool):
+    functions = _analyze(5)
+    table = FunctionTable.from_functions(functions)
+    function_ids = np.arange(len(table), dtype=np.int64)[::-1].copy()
+    groups = PowerGroups.from_table(table, function_ids, kind, filter_dupes)
+    expanded_groups, values = groups.expand()
+    n, mean, _ = groups.get_stats()
+    for group, function_id in enumerate(function_ids.tolist()):
+        expected = _get_power_lists(functions[table.addr[function_id].item()], filter_dupes)[kind]
+        assert sorted(values[expanded_groups == group].tolist()) == sorted(expected)
+        assert n[group] == len(expected)
+        if expected:
+            assert mean[group] == pytest.approx(np.mean(expected), rel=1e-12)
+
+
+def test_unknown_test():
+    functions = _analyze(6)
+    with pytest.raises(ValueError):
+        compare_tables(functions, functions, test='wilcoxon')
@@ -0,0 +1,110 @@
+import math
+import os
+
+import pytest
+
+pytest.importorskip('simpleperf_report_lib')
+
+from analysis.energy_testing.compare_by_method import get_fes_from_dir
+from analysis.energy_testing.compare_full_trace import get_sums_from_dir, sum_full_trace
+from analysis.function.function_table import FunctionTable
+from analysis.single_threaded_analyzer import SingleThreadedAnalyzer
+from trace_reader_utils.catalog import Catalog
+from trace_reader_utils.pickle_utils import gzip_pickle
+from tests.synthetic import make_table, HIGH_ADDR
+
+
+def _analyze(seed: int):
+    table = make_table(seed)
+    analyzer = SingleThreadedAnalyzer(list(table), alpha=0.05)
+    analyzer.perform_analysis()
+    return analyzer.function_dict, table.power_samples
+
+
+def test_functions_same_as_analysis(tmp_path):
+    functions, power_samples = _analyze(0)
+    with Catalog(f'{tmp_path}/catalog.db') as catalog:
+        trace_id = catalog.add_trace('trace0', str(tmp_path), None, functions, power_samples)
+        rows = catalog.find_functions(trace_id=trace_id)
+        assert [row['addr'] for row in rows] == list(functions)
+        for row in rows:
+            function = functions[row['addr']]
+            assert row['names'] == ' .. '.join(function.name_set)
+            assert (row['num_leaf_samples'], row['num_samples']) == \
+                (function.num_leaf_samples, function.num_samples)
+            for column in ['local_prob', 'nonlocal_prob', 'local_energy_cost', 'nonlocal_energy_cost',
+                           'mean_local_power', 'mean_nonlocal_power']:
+                assert math.isclose(row[column], getattr(function, column), rel_tol=1e-12), column
+            interval = function.local_energy_interval
+            assert math.isclose(row['local_energy_lower'], interval.lower, rel_tol=1e-12)
+            assert math.isclose(row['local_energy_upper'], interval.upper, rel_tol=1e-12)
+        trace, = catalog.get_traces(str(tmp_path))
+        assert trace['num_functions'] == len(functions)
+        assert math.isclose(trace['local_energy'], sum_full_trace(functions), rel_tol=1e-12)
+
+
+def test_unsigned_addrs(tmp_path):
+    functions, power_samples = _analyze(1)
+    assert HIGH_ADDR in functions
+    with Catalog(f'{tmp_path}/catalog.db') as catalog:
+        catalog.add_trace('trace1', str(tmp_path), None, FunctionTable.from_functions(functions, power_samples))
+        row, = catalog.find_functions(addr=HIGH_ADDR)
+        assert row['addr'] == HIGH_ADDR
+        assert row['names'] == ' .. '.join(functions[HIGH_ADDR].name_set)
+        assert catalog.find_functions(addr=HIGH_ADDR - (1 << 64)) == [row]
+        assert all(row['addr'] >= 0 for row in catalog.find_functions())
+
+
+def test_add_replaces_same_trace(tmp_path):
+    functions, power_samples = _analyze(2)
+    other_functions, other_power_samples = _analyze(3)
+    catalog_file = f'{tmp_path}/catalog.db'
+    with Catalog(catalog_file) as catalog:
+        first_id = catalog.add_trace('trace', f'{tmp_path}/a', None, functions, power_samples)
+        catalog.add_trace('trace', f'{tmp_path}/b', None, functions, power_samples)
+    # reopening keeps the traces, and a relative directory is the same directory
+    with Catalog(catalog_file) as catalog:
+        second_id = catalog.add_trace('trace', f'{tmp_path}/a/../a', f'{tmp_path}/a/trace-1.trr', other_functions,
+                                      other_power_samples)
+        assert second_id != first_id
+        trace, = catalog.get_traces(f'{tmp_path}/a')
+        assert (trace['id'], trace['result_file']) == (second_id, f'{tmp_path}/a/trace-1.trr')
+        assert len(catalog.get_traces()) == 2
+        # the functions of the replaced trace are removed with it
+        assert catalog.find_functions(trace_id=first_id) == []
+        assert len(catalog.find_functions(directory=f'{tmp_path}/a')) == len(other_functions)
+
+
+def test_find_filters(tmp_path):
+    functions, power_samples = _analyze(4)
+    with Catalog(f'{tmp_path}/catalog.db') as catalog:
+        catalog.add_trace('trace', str(tmp_path), None, functions, power_samples)
+        name = next(iter(functions[HIGH_ADDR].name_set))
+        assert {row['addr'] for row in catalog.find_functions(name=name)} == \
+            {addr for addr, function in functions.items() if any(name in other for other in function.name_set)}
+        threshold = sorted(function.local_energy_cost for function in functions.values())[len(functions) // 2]
+        assert {row['addr'] for row in catalog.find_functions(min_local_energy_cost=threshold)} == \
+            {addr for addr, function in functions.items() if function.local_energy_cost >= threshold}
+        assert catalog.find_functions(directory=f'{tmp_path}/other') == []
+        assert catalog.find_functions(name=name, addr=0x1) == []
+
+
+def test_sums_same_as_files(tmp_path):
+    directory = f'{tmp_path}/results/'
+    os.mkdir(directory)
+    catalog_file = f'{tmp_path}/catalog.db'
+    with Catalog(catalog_file) as catalog:
+        for seed in range(3):
+            functions, power_samples = _analyze(seed)
+            pickle_file = gzip_pickle(functions, f'{directory}trace{seed}')
+            catalog.add_trace(f'trace{seed}', directory, pickle_file, functions, power_samples)
+    from_files = get_sums_from_dir(directory)
+    from_catalog = get_sums_from_dir(directory, catalog_file=catalog_file)
+    assert sorted(from_catalog) == pytest.approx(sorted(from_files), rel=1e-12)
+
+    fes_files = get_fes_from_dir(directory)
+    fes_catalog = get_fes_from_dir(directory, catalog_file=catalog_file)
+    assert set(fes_catalog) == set(fes_files)
+    for addr, energy_sum in fes_files.items():
+        assert sorted(fes_catalog[addr].local_energies) == pytest.approx(sorted(energy_sum.local_energies))
+        assert sorted(fes_catalog[addr].non_local_energies) == pytest.approx(sorted(energy_sum.non_local_energies))
@@ -0,0 +1,71 @@
+import math
+
+import numpy as np
+import pytest
+
+pytest.importorskip('simpleperf_report_lib')
+
+from analysis.energy_profile import EnergyProfile
+from analysis.single_threaded_analyzer import SingleThreadedAnalyzer
+from trace_representation.time_unit import TimeUnit
+from trace_representation.trace_table import TraceTable
+from tests.synthetic import make_table
+
+
+def _analyzed_energy(table: TraceTable, keep: np.ndarray) -> dict:
+    analyzer = SingleThreadedAnalyzer(list(table.select(keep)))
+    analyzer.perform_analysis()
+    return {addr: (fun.energy.local_energy, fun.energy.accumulated_energy)
+            for addr, fun in analyzer.function_dict.items()}
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_energy_matches_analyzer(seed: int):
+    table = make_table(seed)
+    profile = EnergyProfile(table.take(np.random.default_rng(seed).permutation(len(table))))
+    begin, end = int(table.timestamp[50]), int(table.timestamp[200])
+    for begin_time, end_time, keep in [(None, None, np.ones(len(table), dtype=bool)),
+                                       (TimeUnit.from_nanos(begin), TimeUnit.from_nanos(end),
+                                        (table.timestamp >= begin) & (table.timestamp <= end))]:
+        expected = _analyzed_energy(table, keep)
+        local = profile.get_energy(begin_time, end_time)
+        accumulated = profile.get_energy(begin_time, end_time, accumulated=True)
+        for fun_id, addr in enumerate(profile.addrs):
+            expected_local, expected_accumulated = expected.get(addr, (0.0, 0.0))
+            assert math.isclose(local[fun_id], expected_local, rel_tol=1e-9, abs_tol=1e-12)
+            assert math.isclose(accumulated[fun_id], expected_accumulated, rel_tol=1e-9, abs_tol=1e-12)
+        assert math.isclose(profile.get_total_energy(begin_time, end_time), float(table.energy[keep].sum()))
+
+
+@pytest.mark.parametrize('accumulated', [False, True])
+def test_profile_matches_analyzer_per_window(accumulated: bool):
+    table = make_table(3)
+    profile = EnergyProfile(table)
+    window_size = TimeUnit(millis=40)
+    starts, windows, funs, energy = profile.get_profile(window_size, accumulated=accumulated)
+    assert len(starts) == (int(table.timestamp[-1]) - int(table.timestamp[0])) // window_size.to_nanos() + 1
+    keys = (windows * len(profile) + funs).tolist()
+    assert keys == sorted(set(keys))
+    found = {(int(window), int(fun_id)): float(value) for window, fun_id, value in zip(windows, funs, energy)}
+    for window, start in enumerate(starts.tolist()):
+        keep = (table.timestamp >= start) & (table.timestamp < start + window_size.to_nanos())
+        expected = _analyzed_energy(table, keep)
+        assert {profile.addrs[fun_id] for w, fun_id in found if w == window} <= set(expected)
+        for addr, (local, accumulated_energy) in expected.items():
+            # functions that are only in callchains in this window have no local energy in the profile
+            value = found.get((window, profile.addrs.index(addr)), 0.0)
+            assert math.isclose(value, accumulated_energy if accumulated else local, rel_tol=1e-9, abs_tol=1e-12)
+
+
+def test_profile_of_empty_window():
+    table = make_table(1, num_samples=50)
+    profile = EnergyProfile(table)
+    after_end = TimeUnit.from_nanos(int(table.timestamp[-1]) + 1)
+    starts, windows, funs, energy = profile.get_profile(TimeUnit(millis=10), after_end,
+                                                        after_end + TimeUnit(millis=25))
+    assert len(starts) == 3
+    assert len(windows) == len(funs) == len(energy) == 0
+    assert profile.get_top_functions(after_end) == []
+
+    starts, windows, _, _ = EnergyProfile(TraceTable.from_states([], [])).get_profile(TimeUnit(millis=10))
+    assert len(starts) == len(windows) == 0
@@ -0,0 +1,127 @@
+import copy
+import pickle
+
+import pytest
+
+pytest.importorskip('simpleperf_report_lib')
+
+from analysis.function.function import Function
+from analysis.function.function_csv_writer import write_csv
+from analysis.function.function_table import FunctionTable, FunctionView, LazyFunctionTable, to_function_dict
+from analysis.single_threaded_analyzer import SingleThreadedAnalyzer
+from tests.synthetic import make_table, assert_same_functions
+
+
+def _analyze(seed: int, filter_dupes: bool = True, **kwargs):
+    table = make_table(seed, **kwargs)
+    analyzer = SingleThreadedAnalyzer(list(table), filter_dupes=filter_dupes)
+    analyzer.perform_analysis()
+    return analyzer, table.power_samples
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('filter_dupes', [True, False])
+def test_views_same_as_functions(seed: int, filter_dupes: bool):
+    analyzer, power_samples = _analyze(seed, filter_dupes)
+    functions = analyzer.function_dict
+    table = FunctionTable.from_functions(functions, power_samples)
+    assert table.filter_dupes == filter_dupes
+    assert len(table) == len(functions) and list(table) == list(functions)
+    assert all(isinstance(view, FunctionView) for view in table.values())
+    assert_same_functions(functions, table, rel=0)
+    for addr, function in functions.items():
+        view = table[addr]
+        assert view is table[addr] and table.get_view(table.get_function_id(addr)) is view
+        assert {child.addr for child in view.children} == {child.addr for child in function.children}
+        assert all(child is table[child.addr] for child in view.children)
+        assert view.mean_local_power == function.mean_local_power
+        assert type(view.mean_local_power) is type(function.mean_local_power)
+
+
+def test_power_samples_not_in_list_are_appended():
+    analyzer, power_samples = _analyze(1)
+    table = FunctionTable.from_functions(analyzer.function_dict)
+    used = {sample for function in analyzer.function_dict.values()
+            for sample in (*function.power.get_local_counts(), *function.power.get_nonlocal_counts())}
+    assert set(table.power_samples) == used
+    assert_same_functions(analyzer.function_dict, table, rel=0)
+
+
+@pytest.mark.parametrize('filter_dupes', [True, False])
+def test_post_process_same_as_functions(filter_dupes: bool):
+    analyzer, power_samples = _analyze(2)
+    table = FunctionTable.from_functions(analyzer.function_dict, power_samples)
+    # the copies refer to the same PowerSamples
+    expected = copy.deepcopy(analyzer.function_dict, {id(sample): sample for sample in power_samples})
+    total_samples, total_runtime = analyzer.total_samples * 2, analyzer.total_time / 1e9 * 3
+    for function in expected.values():
+        function.post_process(total_samples, total_runtime, filter_dupes, alpha=0.01)
+    table.post_process(total_samples, total_runtime, filter_dupes, alpha=0.01)
+    assert table.filter_dupes == filter_dupes
+    assert_same_functions(expected, table)
+
+
+def test_to_functions_and_copies():
+    analyzer, power_samples = _analyze(3)
+    table = FunctionTable.from_functions(analyzer.function_dict, power_samples)
+    functions = table.to_functions()
+    assert all(type(function) is Function for function in functions.values())
+    assert_same_functions(analyzer.function_dict, functions, rel=0)
+    for function in functions.values():
+        assert all(child is functions[child.addr] for child in function.children)
+    view = next(iter(table.values()))
+    for copied in [copy.copy(view), copy.deepcopy(view)]:
+        assert type(copied) is Function
+        copied.num_samples += 1
+        assert copied.num_samples == view.num_samples + 1
+    assert to_function_dict(analyzer.function_dict) is analyzer.function_dict
+    assert_same_functions(analyzer.function_dict, to_function_dict(table), rel=0)
+
+
+def test_pickle_round_trip():
+    analyzer, power_samples = _analyze(4)
+    table = FunctionTable.from_functions(analyzer.function_dict, power_samples)
+    # pickled together with the functions, so the PowerSamples they refer to are loaded only once
+    functions, loaded = pickle.loads(pickle.dumps((analyzer.function_dict, table)))
+    assert type(loaded) is FunctionTable
+    assert_same_functions(functions, loaded, rel=0)
+    # views are pickled as a reference to their row
+    loaded, views = pickle.loads(pickle.dumps((table, list(table.values()))))
+    assert all(view is loaded[view.addr] for view in views)
+
+
+def test_csv_same_as_functions(tmp_path):
+    analyzer, power_samples = _analyze(5)
+    table = FunctionTable.from_functions(analyzer.function_dict, power_samples)
+
+    def write(name: str, functions) -> str:
+        output_file = write_csv(f'{tmp_path}/{name}', sorted(functions.values(), key=lambda f: f.local_energy_cost))
+        with open(output_file) as csv_file:
+            return csv_file.read()
+
+    assert write('table', table) == write('dict', analyzer.function_dict)
+
+
+def test_lazy_table_loads_once_on_use():
+    analyzer, power_samples = _analyze(6)
+    table = FunctionTable.from_functions(analyzer.function_dict, power_samples)
+    loads = []
+
+    def load() -> FunctionTable:
+        loads.append(1)
+        return table
+
+    lazy = LazyFunctionTable(len(table), load)
+    assert len(lazy) == len(table)
+    assert loads == []
+    assert list(lazy) == list(table)
+    assert all(lazy[addr] is table[addr] for addr in table)
+    assert_same_functions(table, to_function_dict(lazy), rel=0)
+    assert len(loads) == 1
+
+
+def test_empty_table():
+    table = FunctionTable.from_functions({})
+    assert len(table) == 0 and list(table) == [] and table.to_functions() == {}
+    table.post_process(0, 0.0)
+    assert len(pickle.loads(pickle.dumps(table))) == 0
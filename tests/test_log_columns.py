@@ -0,0 +1,167 @@
+import functools
+import random
+import re
+from operator import attrgetter
+
+import numpy as np
+import pytest
+
+from parsers.environment_parser import EnvironmentParser
+from parsers.environment_parser.EnvironmentParser import EnvironmentLog
+from parsers.environment_parser.entry import parse_line, Voltage, Current, Power
+from parsers.environment_parser.log_columns import load_log_columns, _parse_ints, _match_token, _tokenize_line, \
+    _LOG_TYPE_NAMES, _PADDING
+
+_INT_PATTERN = re.compile(r'-?[0-9]{1,16}')
+
+
+def _reference_logs(env_log: str, current_divider: float):
+    """
+    The per-line parser the columnar EnvironmentLog replaced: every line becomes an Entry, and every voltage or
+    current log a Power log with the last voltage and current before it.
+    :return: logs sorted by time, and the power logs
+    """
+    with open(env_log) as logfile:
+        raw_logs = [parse_line(line, current_divider) for line in logfile]
+    last_voltage = None
+    last_current = None
+    logs = []
+    for log in raw_logs:
+        if isinstance(log, Voltage):
+            if last_voltage is not None and log.timestamp < last_voltage.timestamp:
+                raise AssertionError('out of order processing of logs, not good')
+            last_voltage = log
+            if last_current is not None:
+                logs.append(Power(last_voltage, last_current))
+        elif isinstance(log, Current):
+            if last_current is not None and log.timestamp < last_current.timestamp:
+                raise AssertionError('out of order processing of logs')
+            last_current = log
+            if last_voltage is not None:
+                logs.append(Power(last_voltage, last_current))
+        elif log is not None:
+            logs.append(log)
+    logs.sort(key=attrgetter('timestamp'))
+    return logs, [log for log in logs if isinstance(log, Power)]
+
+
+def _make_lines(seed: int, num_lines: int = 3000) -> list:
+    rng = random.Random(seed)
+    lines = ['1000 INIT FILE']
+    timestamp = 1000
+    for _ in range(num_lines):
+        timestamp += rng.randint(0, 3)
+        kind = rng.random()
+        if kind < 0.4:
+            lines.append(f'{timestamp} {rng.choice(["voltage", "Voltage", "VOLTAGE"])} {rng.randint(3000, 4000)}')
+        elif kind < 0.8:
+            value = rng.choice([str(rng.randint(-5000, 90000)), '%.2f' % rng.uniform(0, 100)])
+            lines.append(f'{timestamp} current {value}')
+        elif kind < 0.84:
+            lines.append(f'{timestamp} displaystate 0 {rng.choice(["ON", "OFF"])}')
+        elif kind < 0.88:
+            lines.append(f'{timestamp} dispbrightness {rng.randint(0, 255)}')
+        elif kind < 0.91:
+            lines.append(f'{timestamp} wifi -{rng.randint(30, 90)} extra')
+        elif kind < 0.93:
+            lines.append(f'{timestamp} wifiroam 1')
+        elif kind < 0.95:
+            lines.append(f'{timestamp} bogus 12')
+        elif kind < 0.97:
+            # extra whitespace around the line takes the slow path
+            lines.append(f' {timestamp} voltage {rng.randint(3000, 4000)} ')
+        else:
+            lines.append(f'{timestamp} cellular {rng.randint(0, 4)}')
+    return lines
+
+
+def _write_log(path, lines: list, newline: str = '\n', trailing_newline: bool = True) -> str:
+    with open(path, 'w', newline='') as logfile:
+        logfile.write(newline.join(lines) + (newline if trailing_newline else ''))
+    return str(path)
+
+
+def _describe(logs: list) -> list:
+    return [(log.timestamp.to_nanos(), type(log).__name__, log.logtype, log.data) for log in logs]
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('chunk_size', [None, 97, 4096])
+@pytest.mark.parametrize('newline, trailing_newline', [('\n', True), ('\r\n', False)])
+def test_same_as_per_line_parser(tmp_path, monkeypatch, seed: int, chunk_size, newline: str,
+                                 trailing_newline: bool):
+    env_log = _write_log(tmp_path / 'env.txt', _make_lines(seed), newline, trailing_newline)
+    if chunk_size is not None:
+        monkeypatch.setattr(EnvironmentParser, 'load_log_columns',
+                            functools.partial(load_log_columns, chunk_size=chunk_size))
+    expected_logs, expected_power = _reference_logs(env_log, 1e6)
+    log = EnvironmentLog(env_log, 1e6)
+    assert _describe(log.power_logs) == _describe(expected_power)
+    assert _describe(log.logs) == _describe(expected_logs)
+    assert np.array_equal(log.power_timestamps, [power.timestamp.to_nanos() for power in expected_power])
+    assert log.power_values.tolist() == [power.data for power in expected_power]
+
+
+@pytest.mark.parametrize('chunk_size', [16, 61, 1000])
+def test_chunk_size_does_not_matter(tmp_path, chunk_size: int):
+    env_log = _write_log(tmp_path / 'env.txt', _make_lines(7, 500))
+    expected = load_log_columns(env_log)
+    columns = load_log_columns(env_log, chunk_size)
+    for name in ['timestamps', 'is_voltage', 'values', 'positions', 'other_timestamps', 'other_positions']:
+        assert np.array_equal(getattr(columns, name), getattr(expected, name)), name
+    assert columns.other_lines == expected.other_lines
+
+
+def test_out_of_order_logs(tmp_path):
+    env_log = _write_log(tmp_path / 'env.txt', ['10 voltage 3500', '12 current 100', '11 current 200'])
+    with pytest.raises(AssertionError):
+        _reference_logs(env_log, 1e6)
+    with pytest.raises(AssertionError):
+        EnvironmentLog(env_log, 1e6)
+
+
+def _token_buffer(tokens: list):
+    # the tokens are not at the very start of the buffer, like the value tokens of a log line
+    data = b' ' * 16
+    starts, ends = [], []
+    for token in tokens:
+        starts.append(len(data))
+        data += token.encode() + b' '
+        ends.append(len(data) - 1)
+    buf = np.frombuffer(data + bytes(_PADDING), dtype=np.uint8)
+    return buf, np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64)
+
+
+def test_parse_ints():
+    rng = random.Random(3)
+    tokens = ['0', '-0', '7', '-7', '1679000000000', '9999999999999999', '-9999999999999999', '12345678',
+              '10000000000000000', '', '-', '1.5', '12a', 'a12', '+5', '--5', '3500']
+    tokens += [str(rng.randint(-10 ** rng.randint(1, 16), 10 ** rng.randint(1, 16))) for _ in range(200)]
+    tokens += [''.join(rng.choice('0123456789-.:/a') for _ in range(rng.randint(1, 18))) for _ in range(200)]
+    buf, starts, ends = _token_buffer(tokens)
+    values, valid = _parse_ints(buf, starts, ends)
+    for token, value, is_valid in zip(tokens, values.tolist(), valid.tolist()):
+        assert is_valid == bool(_INT_PATTERN.fullmatch(token)), token
+        if is_valid:
+            assert value == int(token), token
+
+
+def test_match_token():
+    names = [name.decode() for name in _LOG_TYPE_NAMES]
+    tokens = names + [name.upper() for name in names] + [name.capitalize() for name in names] + \
+        ['volt', 'voltages', 'wifi_', 'bogus', '', 'dispbrightnessxx', 'VOLTAGE ']
+    buf, starts, ends = _token_buffer(tokens)
+    matches = _match_token(buf, starts, ends - starts, _LOG_TYPE_NAMES)
+    for token, match in zip(tokens, matches.tolist()):
+        assert match == (names.index(token.lower()) if token.lower() in names else -1), token
+
+
+@pytest.mark.parametrize('line', ['1000 voltage 3500', ' 1000 Current 12.5 ', '1000 displaystate 0 ON',
+                                  '1000 INIT FILE', '1000 voltage', 'abc voltage 3500', '', '1000  voltage 3500'])
+def test_tokenize_line(line: str):
+    tokens = _tokenize_line(line)
+    split = line.strip().split(sep=' ')
+    if tokens is None:
+        assert len(split) < 3 or not split[0].lstrip('-').isdigit()
+    else:
+        assert tokens == (int(split[0]), split[1].lower(), split[2])
@@ -0,0 +1,107 @@
+import json
+import os
+
+import pytest
+
+from parsers.parser_args import ParserArgs
+from trace_reader_utils.manifest import Manifest, describe_inputs, create_entry, MANIFEST_FILE, MANIFEST_VERSION
+
+
+def _make_args(tmp_path, *extra) -> ParserArgs:
+    shared_dir = tmp_path / 'traces'
+    shared_dir.mkdir(exist_ok=True)
+    for file_name, contents in [('trace.data', b'perf data'), ('trace.txt', b'1000 voltage 3500\n')]:
+        if not (shared_dir / file_name).exists():
+            (shared_dir / file_name).write_bytes(contents)
+    output_dir = tmp_path / 'out'
+    output_dir.mkdir(exist_ok=True)
+    return ParserArgs(argv=['-n', 'ndk', '-o', f'{output_dir}/', '--shared_dir', f'{shared_dir}/',
+                            '--shared_filename', 'trace', *extra])
+
+
+def _record(args: ParserArgs, output_names=('trace.pickle.gz', 'trace.csv')) -> Manifest:
+    inputs = describe_inputs(args)
+    outputs = []
+    for output_name in output_names:
+        output = os.path.join(args.output_dir, output_name)
+        with open(output, 'w') as output_file:
+            output_file.write('output')
+        outputs.append(output)
+    manifest = Manifest(args.output_dir)
+    manifest.add_entry(args.shared_filename, create_entry(args, inputs, outputs))
+    return manifest
+
+
+def test_up_to_date_after_reload(tmp_path):
+    args = _make_args(tmp_path)
+    assert not Manifest(args.output_dir).is_up_to_date(args)
+    manifest = _record(args)
+    assert manifest.is_up_to_date(args)
+    loaded = Manifest(args.output_dir)
+    assert loaded.is_up_to_date(args)
+    assert loaded.get_entry('trace')['outputs'] == ['trace.pickle.gz', 'trace.csv']
+    other = _make_args(tmp_path)
+    other.shared_filename = 'other'
+    assert not loaded.is_up_to_date(other)
+
+
+@pytest.mark.parametrize('extra', [['--energy_mode', 'integrated'], ['--analyzer', 'stack'], ['--filter_dupes'],
+                                   ['--alpha', '0.01'], ['--begin_time', '5'], ['--result_format', 'trr'],
+                                   ['--no_output_csv'], ['--no_pickle_functions'], ['-c', '1e6']])
+def test_changed_settings(tmp_path, extra):
+    manifest = _record(_make_args(tmp_path))
+    assert not manifest.is_up_to_date(_make_args(tmp_path, *extra))
+
+
+def test_settings_that_do_not_change_outputs(tmp_path):
+    manifest = _record(_make_args(tmp_path))
+    assert manifest.is_up_to_date(_make_args(tmp_path, '--catalog_file', f'{tmp_path}/catalog.db',
+                                             '--parse_cache_dir', f'{tmp_path}/cache', '--streaming'))
+
+
+def test_changed_inputs(tmp_path):
+    args = _make_args(tmp_path)
+    env_log = tmp_path / 'traces' / 'trace.txt'
+    manifest = _record(args)
+    # touched but unchanged contents are still up to date
+    os.utime(env_log, ns=(0, 12345))
+    assert manifest.is_up_to_date(args)
+    # same size as recorded but other contents, found by the hash
+    env_log.write_bytes(b'1000 voltage 3600\n')
+    os.utime(env_log, ns=(0, 67890))
+    assert not manifest.is_up_to_date(args)
+    manifest = _record(args)
+    assert manifest.is_up_to_date(args)
+    env_log.write_bytes(b'1000 voltage 3600\n1001 current 12\n')
+    assert not manifest.is_up_to_date(args)
+    manifest = _record(args)
+    os.remove(tmp_path / 'traces' / 'trace.data')
+    assert not manifest.is_up_to_date(args)
+
+
+def test_missing_outputs(tmp_path):
+    args = _make_args(tmp_path)
+    manifest = _record(args)
+    os.remove(os.path.join(args.output_dir, 'trace.csv'))
+    assert not manifest.is_up_to_date(args)
+    # outputs that are not written again are removed with the old entry
+    manifest = _record(args, ['trace-1.pickle.gz'])
+    assert manifest.is_up_to_date(args)
+    assert not os.path.exists(os.path.join(args.output_dir, 'trace.pickle.gz'))
+    assert os.path.exists(os.path.join(args.output_dir, 'trace-1.pickle.gz'))
+
+
+def test_unreadable_or_old_manifest(tmp_path, capsys):
+    args = _make_args(tmp_path)
+    _record(args)
+    path = os.path.join(args.output_dir, MANIFEST_FILE)
+    with open(path) as manifest_file:
+        contents = json.load(manifest_file)
+    contents['version'] = MANIFEST_VERSION + 1
+    with open(path, 'w') as manifest_file:
+        json.dump(contents, manifest_file)
+    assert not Manifest(args.output_dir).is_up_to_date(args)
+    with open(path, 'w') as manifest_file:
+        manifest_file.write('{"version": 1, "tra')
+    assert Manifest(args.output_dir).entries == {}
+    assert 'WARNING' in capsys.readouterr().out
@@ -0,0 +1,97 @@
+import pickle
+
+import numpy as np
+import pytest
+
+pytest.importorskip('simpleperf_report_lib')
+
+from parsers import parse_cache, parse_to_abstract
+from parsers.parse_cache import ParseCache
+from parsers.parse_to_abstract import parse_to_table
+from parsers.parser_args import ParserArgs
+from tests.synthetic import make_table
+
+
+def _make_args(tmp_path, *extra) -> ParserArgs:
+    shared_dir = tmp_path / 'traces'
+    shared_dir.mkdir(exist_ok=True)
+    for file_name, contents in [('trace.data', b'perf data'), ('trace.txt', b'1000 voltage 3500\n')]:
+        if not (shared_dir / file_name).exists():
+            (shared_dir / file_name).write_bytes(contents)
+    return ParserArgs(argv=['-n', 'ndk', '-o', f'{tmp_path}/out/', '--shared_dir', f'{shared_dir}/',
+                            '--shared_filename', 'trace', '--parse_cache_dir', f'{tmp_path}/cache', *extra])
+
+
+def test_key_changes_with_inputs_and_settings(tmp_path, monkeypatch):
+    args = _make_args(tmp_path)
+    key = ParseCache.get_key(args)
+    assert ParseCache.get_key(_make_args(tmp_path)) == key
+    # settings that do not change the parsed table do not change the key
+    assert ParseCache.get_key(_make_args(tmp_path, '--analyzer', 'stack', '--alpha', '0.01')) == key
+    keys = {key}
+    for extra in [['--energy_mode', 'integrated'], ['-c', '1e6'], ['--trace_offcpu_mode', 'mixed-on-off-cpu'],
+                  ['--binary_cache_dir', 'binaries']]:
+        keys.add(ParseCache.get_key(_make_args(tmp_path, *extra)))
+    assert len(keys) == 5
+    monkeypatch.setattr(parse_cache, 'CACHE_VERSION', parse_cache.CACHE_VERSION + 1)
+    assert ParseCache.get_key(args) not in keys
+    monkeypatch.undo()
+
+    (tmp_path / 'traces' / 'trace.txt').write_bytes(b'1000 voltage 3501\n')
+    assert ParseCache.get_key(args) not in keys
+    keys.add(ParseCache.get_key(args))
+    (tmp_path / 'traces' / 'trace.data').write_bytes(b'other perf data')
+    assert ParseCache.get_key(args) not in keys
+
+
+def test_store_and_load(tmp_path):
+    cache = ParseCache(f'{tmp_path}/cache')
+    assert cache.load('missing') is None
+    table = make_table(0)
+    cache.store('a', table)
+    loaded = cache.load('a')
+    assert len(loaded) == len(table)
+    assert np.array_equal(loaded.timestamp, table.timestamp)
+    assert np.array_equal(loaded.callchain_vaddrs, table.callchain_vaddrs)
+    assert [(sample.power, sample.timestamp) for sample in loaded.power_samples] == \
+        [(sample.power, sample.timestamp) for sample in table.power_samples]
+    # storing again replaces the entry
+    cache.store('a', make_table(1, num_samples=10))
+    assert len(cache.load('a')) == 10
+
+
+def test_unreadable_entries_are_ignored(tmp_path, capsys):
+    cache = ParseCache(f'{tmp_path}/cache')
+    cache.store('a', make_table(0, num_samples=10))
+    with open(cache.get_path('a'), 'r+b') as cache_file:
+        cache_file.truncate(20)
+    assert cache.load('a') is None
+    assert 'WARNING' in capsys.readouterr().out
+    with open(cache.get_path('b'), 'wb') as cache_file:
+        pickle.dump({'not': 'a table'}, cache_file)
+    assert cache.load('b') is None
+
+
+def test_parse_to_table_uses_cache(tmp_path, monkeypatch):
+    parsed = []
+
+    def parse_table(args: ParserArgs):
+        parsed.append(args)
+        return make_table(len(parsed), num_samples=20)
+
+    monkeypatch.setattr(parse_to_abstract, '_parse_table', parse_table)
+    args = _make_args(tmp_path)
+    first = parse_to_table(args)
+    assert np.array_equal(parse_to_table(_make_args(tmp_path)).timestamp, first.timestamp)
+    assert len(parsed) == 1
+    # a changed input file is parsed again
+    (tmp_path / 'traces' / 'trace.txt').write_bytes(b'1000 voltage 3600\n')
+    parse_to_table(args)
+    assert len(parsed) == 2
+    parse_to_table(_make_args(tmp_path, '--energy_mode', 'integrated'))
+    assert len(parsed) == 3
+    # without a cache directory, nothing is cached
+    args.parse_cache_dir = None
+    parse_to_table(args)
+    parse_to_table(args)
+    assert len(parsed) == 5
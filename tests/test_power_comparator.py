@@ -0,0 +1,94 @@
+import csv
+
+import numpy as np
+import pytest
+
+pytest.importorskip('simpleperf_report_lib')
+
+from scipy.stats import ttest_ind
+
+from analysis.power_comparison.power_comparator import welch_matrix, load_power_stats, directory_compare, \
+    single_file_compare
+from trace_reader_utils.pickle_utils import gzip_pickle
+from trace_reader_utils.result_file import write_result_file
+from trace_representation.app_sample import PowerSample
+from trace_representation.time_unit import TimeUnit
+from tests.synthetic import make_power_samples
+
+
+def _stats(samples: list):
+    values = np.array(samples, dtype=np.float64)
+    return len(values), values.mean(), values.var(ddof=1) if len(values) > 1 else np.nan
+
+
+def _assert_same_as_ttest(samples: list):
+    counts, means, variances = (np.array(column, dtype=np.float64) for column in zip(*map(_stats, samples)))
+    p_values = welch_matrix(counts, means, variances)
+    assert p_values.shape == (len(samples), len(samples))
+    for i, a in enumerate(samples):
+        for j, b in enumerate(samples):
+            expected = ttest_ind(a, b, equal_var=False).pvalue
+            assert p_values[i, j] == pytest.approx(expected, rel=1e-9, nan_ok=True), (i, j)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_same_as_ttest_ind(seed: int):
+    rng = np.random.default_rng(seed)
+    samples = [rng.normal(rng.uniform(1, 2), rng.uniform(0.1, 1), int(rng.integers(2, 200))).tolist()
+               for _ in range(8)]
+    _assert_same_as_ttest(samples)
+
+
+# scipy warns about the constant samples
+@pytest.mark.filterwarnings('ignore:Precision loss occurred')
+def test_same_as_ttest_ind_edge_cases():
+    # equal and constant samples, a constant sample against a varying one, and samples of two values
+    _assert_same_as_ttest([[1.0, 1.0, 1.0], [1.0, 1.0], [2.0, 2.0, 2.0, 2.0], [1.0, 2.0, 3.0], [5.0, 5.5],
+                           [1.0, 2.0, 3.0]])
+
+
+def _write_traces(directory: str, num_traces: int) -> list:
+    power_samples = []
+    for seed in range(num_traces):
+        samples = make_power_samples(30 + 10 * seed, seed)
+        # the same PowerSample several times, which filter_dupes counts once
+        samples += samples[:5]
+        if seed % 2 == 0:
+            gzip_pickle(samples, f'{directory}trace{seed}_power')
+        else:
+            write_result_file(f'{directory}trace{seed}', {}, samples)
+        power_samples.append(samples)
+    return power_samples
+
+
+@pytest.mark.parametrize('filter_dupes', [True, False])
+def test_load_power_stats(tmp_path, filter_dupes: bool):
+    directory = f'{tmp_path}/'
+    samples, _ = _write_traces(directory, 2)
+    if filter_dupes:
+        samples = samples[:-5]
+    count, mean, variance = load_power_stats(f'{directory}trace0_power.pickle.gz', filter_dupes)
+    assert (count, mean, variance) == pytest.approx(_stats([sample.power for sample in samples]), rel=1e-12)
+    gzip_pickle([PowerSample(1.5, TimeUnit.from_nanos(0))], f'{directory}single_power')
+    assert load_power_stats(f'{directory}single_power.pickle.gz', filter_dupes)[:2] == (1, 1.5)
+    gzip_pickle([], f'{directory}empty_power')
+    assert load_power_stats(f'{directory}empty_power.pickle.gz', filter_dupes)[0] == 0
+
+
+@pytest.mark.parametrize('filter_dupes', [True, False])
+def test_directory_same_as_single_files(tmp_path, filter_dupes: bool):
+    directory = f'{tmp_path}/traces/'
+    (tmp_path / 'traces').mkdir()
+    _write_traces(directory, 4)
+    directory_compare(directory, filter_dupes, f'{tmp_path}/matrix')
+    with open(f'{tmp_path}/matrix.csv', newline='') as csv_file:
+        rows = list(csv.reader(csv_file, delimiter='\t', quotechar='|'))
+    files = ['trace0_power.pickle.gz', 'trace1.trr', 'trace2_power.pickle.gz', 'trace3.trr']
+    names = ['trace0', 'trace1', 'trace2', 'trace3']
+    assert rows[0] == [' '] + names
+    for i, row in enumerate(rows[1:]):
+        assert row[0] == names[i]
+        assert row[i + 1:] == [''] * (len(names) - i)
+        for j in range(i):
+            expected = single_file_compare(directory + files[i], directory + files[j], filter_dupes)
+            assert float(row[j + 1]) == pytest.approx(expected, rel=1e-9)
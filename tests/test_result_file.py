@@ -0,0 +1,133 @@
+import os
+import struct
+
+import numpy as np
+import pytest
+
+pytest.importorskip('simpleperf_report_lib')
+
+from analysis.energy_testing.compare_by_method import validate_pickle
+from analysis.energy_testing.compare_full_trace import sum_full_trace, get_sums_from_dir
+from analysis.function.function_table import FunctionTable
+from analysis.single_threaded_analyzer import SingleThreadedAnalyzer
+from trace_reader_utils.pickle_utils import gzip_pickle, gzip_unpickle
+from trace_reader_utils.result_file import write_result_file, write_summary_file, read_summary, get_summary_file, \
+    read_result_file, ResultFile, ALIGNMENT, MAGIC, VERSION
+from tests.synthetic import make_table, assert_same_functions, HIGH_ADDR
+
+
+def _analyze(seed: int):
+    table = make_table(seed)
+    analyzer = SingleThreadedAnalyzer(list(table))
+    analyzer.perform_analysis()
+    return analyzer.function_dict, table.power_samples
+
+
+def _write_pickle(directory: str, name: str, functions, power_samples) -> str:
+    pickle_file = gzip_pickle(functions, f'{directory}/{name}')
+    write_summary_file(pickle_file, functions, power_samples)
+    return pickle_file
+
+
+def test_pickle_summary_matches_result_file(tmp_path):
+    functions, power_samples = _analyze(0)
+    result_file = write_result_file(f'{tmp_path}/a', functions, power_samples)
+    pickle_file = _write_pickle(str(tmp_path), 'b', functions, power_samples)
+    assert get_summary_file(pickle_file) == f'{tmp_path}/b.summary.json'
+    summary = read_summary(pickle_file)
+    assert summary == read_summary(result_file)
+    assert summary['num_functions'] == len(functions)
+    assert summary['local_energy'] == sum_full_trace(functions)
+    assert sum_full_trace(pickle_file) == sum_full_trace(result_file) == sum_full_trace(functions)
+
+
+def test_stale_or_missing_pickle_summary(tmp_path):
+    functions, power_samples = _analyze(1)
+    pickle_file = _write_pickle(str(tmp_path), 'b', functions, power_samples)
+    assert read_summary(f'{tmp_path}/b_power.pickle.gz') is None
+    os.utime(pickle_file, ns=(0, 12345))
+    assert read_summary(pickle_file) is None
+    # without a summary, the functions are summed from the pickle
+    assert sum_full_trace(pickle_file) == sum_full_trace(functions)
+    os.remove(get_summary_file(pickle_file))
+    assert read_summary(pickle_file) is None
+    assert sum_full_trace(pickle_file) == sum_full_trace(functions)
+
+
+def test_empty_pickle_is_skipped(tmp_path):
+    functions, power_samples = _analyze(2)
+    _write_pickle(str(tmp_path), 'full', functions, power_samples)
+    empty_file = _write_pickle(str(tmp_path), 'empty', {}, power_samples)
+    assert read_summary(empty_file)['num_functions'] == 0
+    assert validate_pickle(empty_file) is None
+    with pytest.raises(TypeError):
+        sum_full_trace(empty_file)
+    assert get_sums_from_dir(f'{tmp_path}/') == [sum_full_trace(functions)]
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('filter_dupes', [True, False])
+def test_round_trip(tmp_path, seed: int, filter_dupes: bool):
+    table = make_table(seed)
+    analyzer = SingleThreadedAnalyzer(list(table), filter_dupes=filter_dupes)
+    analyzer.perform_analysis()
+    functions = analyzer.function_dict
+    # names that are not ascii, and several names for one function
+    next(iter(functions.values())).name_set |= {'naïve_∑', ''}
+    result_file = write_result_file(f'{tmp_path}/a', functions, table.power_samples)
+    assert result_file == f'{tmp_path}/a.trr'
+    loaded = read_result_file(result_file)
+    assert type(loaded) is FunctionTable and loaded.filter_dupes == filter_dupes
+    assert HIGH_ADDR in loaded
+    assert_same_functions(functions, loaded, rel=0, same_power_samples=False)
+    assert [(sample.power, sample.timestamp) for sample in loaded.power_samples] == \
+        [(sample.power, sample.timestamp) for sample in table.power_samples]
+    assert_same_functions(loaded, gzip_unpickle(result_file), rel=0, same_power_samples=False)
+    # a table is written as it is
+    assert_same_functions(loaded, read_result_file(write_result_file(f'{tmp_path}/b', loaded)), rel=0,
+                          same_power_samples=False)
+
+
+def test_columns_are_aligned_and_mapped(tmp_path):
+    functions, power_samples = _analyze(3)
+    result = ResultFile(write_result_file(f'{tmp_path}/a', functions, power_samples))
+    assert len(result) == len(functions)
+    assert result.header['version'] == result.version == VERSION
+    for name in result.get_column_names():
+        info = result.header['columns'][name]
+        assert info['offset'] % ALIGNMENT == 0, name
+    table = result.to_table()
+    for name in FunctionTable.COLUMN_NAMES:
+        column = getattr(table, name)
+        assert not column.flags.writeable, name
+        assert column.dtype.byteorder in '<=|', name
+    assert table.addr.dtype == np.uint64
+
+
+def test_empty_and_numbered_files(tmp_path):
+    empty_file = write_result_file(f'{tmp_path}/a', {}, [])
+    assert len(read_result_file(empty_file)) == 0
+    assert read_summary(empty_file)['num_functions'] == 0
+    functions, power_samples = _analyze(4)
+    assert write_result_file(f'{tmp_path}/a', functions, power_samples) == f'{tmp_path}/a-1.trr'
+    assert write_result_file(f'{tmp_path}/a', functions, power_samples, overwrite=True) == empty_file
+    assert len(read_result_file(empty_file)) == len(functions)
+
+
+def test_invalid_files(tmp_path):
+    functions, power_samples = _analyze(5)
+    result_file = write_result_file(f'{tmp_path}/a', functions, power_samples)
+    with open(result_file, 'rb') as input_file:
+        contents = input_file.read()
+    cases = {
+        'truncated': contents[:10],
+        'magic': b'NOTARESU' + contents[8:],
+        'version': MAGIC + struct.pack('<I', VERSION + 1) + contents[12:],
+    }
+    for name, data in cases.items():
+        path = f'{tmp_path}/{name}.trr'
+        with open(path, 'wb') as output_file:
+            output_file.write(data)
+        with pytest.raises(ValueError):
+            ResultFile(path)
+        assert read_summary(path) is None
@@ -0,0 +1,100 @@
+import pickle
+
+import numpy as np
+import pytest
+
+pytest.importorskip('simpleperf_report_lib')
+
+from trace_representation.simpleperf_python_datatypes import CallChain, SymbolTable
+from trace_representation.trace_table import TraceTable, TraceTableBuilder
+from tests.synthetic import make_table, make_symbol_table
+
+
+class _RawSymbol(object):
+    """
+    Stand-in for simpleperf's SymbolStruct, that counts how often its names are decoded
+    """
+    decodes = 0
+
+    def __init__(self, dso_name: bytes, vaddr: int, symbol_name: bytes, symbol_addr: int):
+        self._dso_name = dso_name
+        self.vaddr_in_file = vaddr
+        self._symbol_name = symbol_name
+        self.symbol_addr = symbol_addr
+        self.symbol_len = 0x80
+
+    @property
+    def dso_name(self) -> str:
+        _RawSymbol.decodes += 1
+        return self._dso_name.decode()
+
+    @property
+    def symbol_name(self) -> str:
+        return self._symbol_name.decode()
+
+
+class _RawEntry(object):
+    def __init__(self, ip: int, symbol: _RawSymbol):
+        self.ip = ip
+        self.symbol = symbol
+
+
+class _RawChain(object):
+    def __init__(self, entries):
+        self.nr = len(entries)
+        self.entries = entries
+
+
+def _make_chain(symbol_table: SymbolTable) -> CallChain:
+    # the same symbol at two different vaddrs, and another symbol
+    return CallChain(_RawChain([_RawEntry(0x1010, _RawSymbol(b'libfoo.so', 0x10, b'foo', 0x1000)),
+                                _RawEntry(0x1020, _RawSymbol(b'libfoo.so', 0x20, b'foo', 0x1000)),
+                                _RawEntry(0x2010, _RawSymbol(b'libbar.so', 0x30, b'bar', 0x2000))]), symbol_table)
+
+
+def test_symbols_are_decoded_once():
+    symbol_table = SymbolTable()
+    _RawSymbol.decodes = 0
+    chain = _make_chain(symbol_table)
+    assert len(symbol_table) == 2
+    assert _RawSymbol.decodes == 2
+    assert chain.entries[0].symbol is chain.entries[1].symbol
+    _make_chain(symbol_table)
+    assert len(symbol_table) == 2
+    assert _RawSymbol.decodes == 2
+
+
+def test_entries_keep_their_own_vaddr():
+    chain = _make_chain(SymbolTable())
+    first, second, _ = chain.entries
+    assert (first.vaddr, second.vaddr) == (0x10, 0x20)
+    assert first.symbol.vaddr == 0x10
+    assert 'foo' in second and 'libfoo' in second and 0x1020 in second
+
+
+def test_table_keeps_vaddrs():
+    builder = TraceTableBuilder(make_symbol_table())
+    builder.add_sample(1000, 10, 1, [1, 1, 2], [0x1100, 0x1104, 0x1200], vaddrs=[0x11, 0x12, 0x13])
+    builder.add_sample(2000, 10, 2, [2], [0x1200])
+    builder.add_sample(3000, 10, 3, [3, 1], [0x1300, 0x1108], vaddrs=[0x31, 0x32])
+    table = builder.build()
+    assert table.callchain_vaddrs.tolist() == [0x11, 0x12, 0x13, 0, 0x31, 0x32]
+    vaddrs = [[entry.vaddr for entry in state.sample.samples[0].trace.entries] for state in table]
+    assert vaddrs == [[0x11, 0x12, 0x13], [0], [0x31, 0x32]]
+
+    for other in [table.take(np.arange(3)), table.select(np.ones(3, dtype=bool)), table.slice(0, 3),
+                  pickle.loads(pickle.dumps(table)), TraceTable.from_states(list(table))]:
+        assert other.callchain_vaddrs.tolist() == table.callchain_vaddrs.tolist()
+    assert table.take(np.array([2, 0])).callchain_vaddrs.tolist() == [0x31, 0x32, 0x11, 0x12, 0x13]
+    assert table.select(np.array([False, True, True])).callchain_vaddrs.tolist() == [0, 0x31, 0x32]
+    assert table.slice(2, 3).callchain_vaddrs.tolist() == [0x31, 0x32]
+
+
+def test_old_pickles_get_vaddrs():
+    table = make_table(0, num_samples=20)
+    state = dict(table.__dict__)
+    del state['callchain_vaddrs']
+    old = TraceTable.__new__(TraceTable)
+    old.__setstate__(state)
+    assert old.callchain_vaddrs.tolist() == [0] * len(table.callchain_frames)
+    assert len(list(old)) == 20
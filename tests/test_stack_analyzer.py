@@ -0,0 +1,108 @@
+import math
+from collections import Counter
+
+import pytest
+
+pytest.importorskip('simpleperf_report_lib')
+
+from analysis.single_threaded_analyzer import SingleThreadedAnalyzer
+from analysis.stack_analyzer import StackAnalyzer
+from trace_representation.stack_trie import StackTrie, StackNode
+from trace_representation.time_unit import TimeUnit
+from trace_representation.trace_table import TraceTable, TraceTableBuilder
+from tests.synthetic import make_table, make_symbol_table, assert_same_functions
+
+
+def _analyze(analyzer_type, states, **kwargs):
+    analyzer = analyzer_type(states, **kwargs)
+    analyzer.perform_analysis()
+    return analyzer
+
+
+def _get_stack(state) -> tuple:
+    sample = state.sample.get_first_sample()
+    return (sample.symbol, *[entry.symbol for entry in sample.trace.entries])
+
+
+def _describe_trie(trie: StackTrie) -> dict:
+    return {tuple(node.get_stack()): (node.num_samples, node.period, node.energy, node.power,
+                                      {id(power): count for power, count in node.power_samples.items()})
+            for node in trie}
+
+
+def _count_nodes(node: StackNode) -> int:
+    return 1 + sum(_count_nodes(child) for child in node.children.values())
+
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('filter_dupes', [True, False])
+@pytest.mark.parametrize('from_table', [True, False])
+def test_same_as_single_threaded(seed: int, filter_dupes: bool, from_table: bool):
+    # a small symbol table and short stacks, so many samples share a stack
+    table = make_table(seed, num_symbols=5, max_depth=3)
+    expected = _analyze(SingleThreadedAnalyzer, list(table), filter_dupes=filter_dupes)
+    actual = _analyze(StackAnalyzer, table if from_table else list(table), filter_dupes=filter_dupes)
+    assert len(actual.trie) < len(table)
+    assert_same_functions(expected.function_dict, actual.function_dict, ordered=False)
+    assert (actual.total_samples, actual.total_time) == (expected.total_samples, expected.total_time)
+
+
+@pytest.mark.parametrize('from_table', [True, False])
+def test_same_as_single_threaded_in_window(from_table: bool):
+    table = make_table(7, num_samples=500)
+    begin = TimeUnit.from_nanos(int(table.timestamp[100]))
+    end = TimeUnit.from_nanos(int(table.timestamp[350]))
+    expected = _analyze(SingleThreadedAnalyzer, list(table), begin_time=begin, end_time=end, alpha=0.01)
+    actual = _analyze(StackAnalyzer, table if from_table else list(table), begin_time=begin, end_time=end,
+                      alpha=0.01)
+    assert actual.total_samples == 251
+    assert_same_functions(expected.function_dict, actual.function_dict, ordered=False)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_trie_from_table_same_as_from_states(seed: int):
+    table = make_table(seed, num_symbols=6, max_depth=4)
+    states = list(table)
+    from_states = StackTrie.from_states(states)
+    from_table = StackTrie.from_table(table)
+    expected = _describe_trie(from_states)
+    actual = _describe_trie(from_table)
+    assert list(actual) == list(expected)
+    for stack, (num_samples, period, energy, power, power_samples) in expected.items():
+        assert actual[stack][:2] == (num_samples, period)
+        assert math.isclose(actual[stack][2], energy, rel_tol=1e-9, abs_tol=1e-12)
+        assert math.isclose(actual[stack][3], power, rel_tol=1e-9, abs_tol=1e-12)
+        assert actual[stack][4] == power_samples
+    assert _count_nodes(from_table.root) == _count_nodes(from_states.root)
+    assert (from_table.num_samples, from_table.total_period) == (from_states.num_samples, from_states.total_period)
+
+
+def test_trie_combines_identical_stacks():
+    table = make_table(2, num_symbols=4, max_depth=2)
+    states = list(table)
+    trie = StackTrie.from_table(table)
+    stack_counts = Counter(_get_stack(state) for state in states)
+    assert len(trie) == len(stack_counts)
+    assert {tuple(node.get_stack()): node.num_samples for node in trie} == dict(stack_counts)
+    assert trie.root.get_inclusive_samples() == len(states) == trie.num_samples
+    for node in trie:
+        stack = tuple(node.get_stack())
+        # every sample whose stack ends in this node or below has this stack as its outermost callers
+        assert node.get_inclusive_samples() == sum(count for other, count in stack_counts.items()
+                                                   if other[len(other) - len(stack):] == stack)
+
+
+def test_empty_and_no_callchain():
+    assert len(StackTrie.from_table(TraceTable.from_states([], []))) == 0
+    analyzer = _analyze(StackAnalyzer, TraceTable.from_states([], []))
+    assert analyzer.function_dict == {}
+    assert (analyzer.total_samples, analyzer.total_time) == (0, 0)
+
+    builder = TraceTableBuilder(make_symbol_table())
+    builder.add_sample(1000, 10, 3, [], [], 0.5)
+    builder.add_sample(2000, 10, 3, [], [], 0.25)
+    table = builder.build()
+    trie = StackTrie.from_table(table)
+    assert len(trie) == 1 and trie.stacks[0].num_samples == 2 and trie.stacks[0].power_samples == {}
+    assert_same_functions(_analyze(SingleThreadedAnalyzer, list(table)).function_dict,
+                          _analyze(StackAnalyzer, table).function_dict)
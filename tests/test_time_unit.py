@@ -0,0 +1,140 @@
+import copy
+import pickle
+import random
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from trace_representation.time_unit import TimeUnit
+
+_NANOS_PER_UNIT = {'seconds': 1000000000, 'millis': 1000000, 'micros': 1000, 'nanos': 1}
+
+_random = random.Random(20261018)
+# small, negative, around the int64 limit and epoch timestamps in nanoseconds
+_NANOS = [0, 1, -1, 999, 1000, 1000000, 1000000000, (1 << 63) - 1, -(1 << 63), 1679000000000000000] + \
+         [_random.randint(-(1 << 62), 1 << 62) for _ in range(40)]
+_PAIRS = [(_random.choice(_NANOS), _random.choice(_NANOS)) for _ in range(60)] + [(5, 5), (-3, 3), (0, 0)]
+
+
+@pytest.mark.parametrize('unit', list(_NANOS_PER_UNIT))
+@pytest.mark.parametrize('value', [0, 1, -1, 7, 123456789, 1679000000000] +
+                         [_random.randint(-10 ** 12, 10 ** 12) for _ in range(10)])
+def test_int_units(unit: str, value: int):
+    assert TimeUnit(**{unit: value}).to_nanos() == value * _NANOS_PER_UNIT[unit]
+
+
+@pytest.mark.parametrize('unit', list(_NANOS_PER_UNIT))
+def test_numpy_int_units(unit: str):
+    for value in [np.int64(42), np.int32(-7), np.uint64(1679000000000)]:
+        assert TimeUnit(**{unit: value}).to_nanos() == int(value) * _NANOS_PER_UNIT[unit]
+
+
+@pytest.mark.parametrize('unit, value, nanos', [
+    ('seconds', 0.3, 300000000),
+    ('seconds', 1.5, 1500000000),
+    ('seconds', -2.25, -2250000000),
+    ('millis', 0.1, 100000),
+    ('millis', 2.5, 2500000),
+    ('micros', 0.5, 500),
+    ('micros', 1.001, 1001),
+    ('nanos', 3.0, 3),
+    ('seconds', Decimal('1.000000001'), 1000000001),
+    ('millis', Decimal('0.000001'), 1),
+])
+def test_fractional_units(unit: str, value, nanos: int):
+    assert TimeUnit(**{unit: value}).to_nanos() == nanos
+
+
+def test_one_second_is_1e9_nanos():
+    assert TimeUnit(seconds=1).to_nanos() == 10 ** 9
+    assert TimeUnit(seconds=1.0).to_nanos() == 10 ** 9
+    assert TimeUnit(seconds=1) == TimeUnit(millis=1000) == TimeUnit(micros=10 ** 6) == TimeUnit(nanos=10 ** 9)
+
+
+@pytest.mark.parametrize('seconds, millis, micros, nanos',
+                         [tuple(_random.randint(-10 ** 6, 10 ** 6) for _ in range(4)) for _ in range(20)])
+def test_units_are_summed(seconds: int, millis: int, micros: int, nanos: int):
+    expected = seconds * 10 ** 9 + millis * 10 ** 6 + micros * 10 ** 3 + nanos
+    assert TimeUnit(seconds, millis, micros, nanos).to_nanos() == expected
+    # the int fast path and the Decimal path agree
+    assert TimeUnit(Decimal(seconds), millis, micros, nanos).to_nanos() == expected
+
+
+@pytest.mark.parametrize('nanos', _NANOS)
+def test_nanos_round_trip(nanos: int):
+    time = TimeUnit.from_nanos(nanos)
+    assert time.to_nanos() == nanos
+    assert time.nanos == nanos
+    assert TimeUnit(nanos=nanos).to_nanos() == nanos
+    assert TimeUnit.from_nanos(time.to_nanos()) == time
+    assert time.to_seconds() * 10 ** 9 == nanos
+    assert time.to_millis() * 10 ** 6 == nanos
+    assert time.to_micros() * 10 ** 3 == nanos
+    assert str(time) == str(nanos)
+
+
+@pytest.mark.parametrize('a, b', _PAIRS)
+def test_arithmetic_matches_ints(a: int, b: int):
+    x, y = TimeUnit.from_nanos(a), TimeUnit.from_nanos(b)
+    assert (x + y).to_nanos() == a + b
+    assert (x - y).to_nanos() == a - b
+    assert abs(x - y).to_nanos() == abs(a - b)
+    assert (x + TimeUnit.ZERO) == x
+    # arithmetic returns new values, the operands are unchanged
+    assert x.to_nanos() == a and y.to_nanos() == b
+
+
+@pytest.mark.parametrize('a, b', _PAIRS)
+def test_comparison_matches_ints(a: int, b: int):
+    x, y = TimeUnit.from_nanos(a), TimeUnit.from_nanos(b)
+    assert (x == y) == (a == b)
+    assert (x < y) == (a < b)
+    assert (x <= y) == (a <= b)
+    assert (x > y) == (a > b)
+    assert (x >= y) == (a >= b)
+    assert sorted([x, y]) == [TimeUnit.from_nanos(nanos) for nanos in sorted([a, b])]
+
+
+@pytest.mark.parametrize('a, b', _PAIRS)
+def test_hash_is_consistent_with_equality(a: int, b: int):
+    x, y = TimeUnit.from_nanos(a), TimeUnit(nanos=b)
+    if x == y:
+        assert hash(x) == hash(y)
+    assert len({x, y, TimeUnit.from_nanos(a)}) == len({a, b})
+
+
+@pytest.mark.parametrize('nanos', _NANOS)
+def test_pickle_round_trip(nanos: int):
+    time = TimeUnit.from_nanos(nanos)
+    for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+        loaded = pickle.loads(pickle.dumps(time, protocol))
+        assert type(loaded) is TimeUnit
+        assert loaded == time and loaded.to_nanos() == nanos
+    assert copy.copy(time) == time
+    assert copy.deepcopy(time) == time
+
+
+def test_legacy_dict_state():
+    # pickles from before TimeUnit was slotted store the nanoseconds in a dict
+    time = TimeUnit.__new__(TimeUnit)
+    time.__setstate__({'nanos': 1234})
+    assert time.to_nanos() == 1234
+
+
+def test_immutable():
+    time = TimeUnit(millis=5)
+    with pytest.raises(AttributeError):
+        time.nanos = 3
+    with pytest.raises(AttributeError):
+        del time._nanos
+    assert time.to_nanos() == 5000000
+
+
+@pytest.mark.parametrize('other', [5, 5.0, None])
+def test_other_types_are_rejected(other):
+    time = TimeUnit.from_nanos(5)
+    for operation in [lambda: time + other, lambda: time - other, lambda: time == other, lambda: time < other,
+                      lambda: time <= other, lambda: time > other, lambda: time >= other]:
+        with pytest.raises(TypeError):
+            operation()
@@ -0,0 +1,70 @@
+import pytest
+
+pytest.importorskip('simpleperf_report_lib')
+
+from analysis.single_threaded_analyzer import SingleThreadedAnalyzer
+from analysis.trace_aggregate import TraceAggregate
+from trace_representation.time_unit import TimeUnit
+from tests.synthetic import make_table, assert_same_functions
+
+
+def _analyze(states, **kwargs) -> SingleThreadedAnalyzer:
+    analyzer = SingleThreadedAnalyzer(states, **kwargs)
+    analyzer.perform_analysis()
+    return analyzer
+
+
+def _aggregate(table, **kwargs) -> TraceAggregate:
+    analyzer = _analyze(list(table), **kwargs)
+    return TraceAggregate.from_analysis(analyzer.function_dict, table.power_samples, analyzer.total_samples,
+                                        analyzer.total_time)
+
+
+@pytest.mark.parametrize('filter_dupes', [True, False])
+def test_merge_same_as_analyzing_all_states(filter_dupes: bool):
+    # traces with different lengths and symbols, and separate PowerSamples
+    tables = [make_table(seed, num_samples=100 + 50 * seed, num_symbols=8 + 2 * seed) for seed in range(3)]
+    expected = _analyze([state for table in tables for state in table], filter_dupes=filter_dupes, alpha=0.01)
+    merged = TraceAggregate()
+    for table in tables:
+        merged.merge(_aggregate(table, filter_dupes=filter_dupes))
+    assert (merged.total_samples, merged.total_time) == (expected.total_samples, expected.total_time)
+    assert merged.power_samples == [sample for table in tables for sample in table.power_samples]
+    assert_same_functions(expected.function_dict, merged.to_functions(filter_dupes, alpha=0.01))
+
+
+def test_single_trace_round_trip():
+    table = make_table(4)
+    expected = _analyze(list(table), alpha=0.1)
+    assert_same_functions(expected.function_dict, _aggregate(table).to_functions(alpha=0.1))
+
+
+def test_merge_order_and_grouping():
+    tables = [make_table(seed, num_samples=80) for seed in range(3)]
+    aggregates = [_aggregate(table) for table in tables]
+    left = TraceAggregate()
+    for aggregate in aggregates:
+        left += aggregate
+    right = TraceAggregate()
+    right += aggregates[1]
+    right += aggregates[2]
+    grouped = TraceAggregate()
+    grouped += aggregates[0]
+    grouped += right
+    assert_same_functions(left.to_functions(), grouped.to_functions())
+    # merging does not change the merged aggregates
+    assert_same_functions(_aggregate(tables[1]).to_functions(), aggregates[1].to_functions())
+
+
+def test_merge_with_empty_and_windowed():
+    table = make_table(5)
+    begin = TimeUnit.from_nanos(int(table.timestamp[250]))
+    windowed = _aggregate(table, begin_time=begin)
+    merged = TraceAggregate()
+    merged += TraceAggregate.from_analysis({}, [], 0, 0)
+    merged += windowed
+    expected = _analyze(list(table), begin_time=begin)
+    assert merged.total_samples == expected.total_samples == 50
+    assert_same_functions(expected.function_dict, merged.to_functions())
+    with pytest.raises(TypeError):
+        merged += expected.function_dict
@@ -0,0 +1,110 @@
+import pickle
+
+import numpy as np
+import pytest
+
+pytest.importorskip('simpleperf_report_lib')
+
+from trace_representation.app_sample import AppState
+from trace_representation.time_unit import TimeUnit
+from trace_representation.trace_table import TraceTable
+from tests.synthetic import make_table
+
+
+def _describe(state: AppState) -> tuple:
+    thread_sample = state.sample.get_first_sample()
+    return (state.timestamp.to_nanos(), state.period.to_nanos(), state.energy_consumed, id(state.power),
+            id(thread_sample.symbol),
+            [(entry.ip, entry.vaddr, id(entry.symbol)) for entry in thread_sample.trace.entries])
+
+
+def _describe_all(states) -> list:
+    return [_describe(state) for state in states]
+
+
+def _shuffled(table: TraceTable, seed: int) -> TraceTable:
+    return table.take(np.random.default_rng(seed).permutation(len(table)))
+
+
+def _in_window(states: list, begin: int, end: int) -> list:
+    return [state for state in states if begin <= state.timestamp.to_nanos() <= end]
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_select(seed: int):
+    table = make_table(seed)
+    states = list(table)
+    keep = np.random.default_rng(seed).random(len(table)) < 0.4
+    selected = table.select(keep)
+    assert _describe_all(selected) == _describe_all(state for state, kept in zip(states, keep) if kept)
+    assert selected.callchain_offsets[-1] == len(selected.callchain_frames) == len(selected.callchain_ips)
+    assert len(table.select(np.zeros(len(table), dtype=bool))) == 0
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_take(seed: int):
+    table = make_table(seed)
+    states = list(table)
+    # out of order, with repeats
+    indices = np.random.default_rng(seed).integers(0, len(table), 2 * len(table))
+    assert _describe_all(table.take(indices)) == _describe_all(states[i] for i in indices.tolist())
+    assert len(table.take(np.zeros(0, dtype=np.int64))) == 0
+
+
+def test_slice_shares_columns():
+    table = make_table(4)
+    part = table.slice(40, 90)
+    assert _describe_all(part) == _describe_all(list(table)[40:90])
+    assert np.shares_memory(part.timestamp, table.timestamp)
+    assert np.shares_memory(part.callchain_frames, table.callchain_frames)
+    assert len(table.slice(10, 10)) == 0
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_between(seed: int):
+    table = make_table(seed)
+    states = list(table)
+    shuffled = _shuffled(table, seed)
+    assert table.is_time_sorted() and not shuffled.is_time_sorted()
+    timestamps = table.timestamp.tolist()
+    windows = [(timestamps[30], timestamps[200]), (timestamps[0], timestamps[-1]), (timestamps[5], timestamps[5]),
+               (timestamps[10] + 1, timestamps[11] - 1), (timestamps[-1] + 1, timestamps[-1] + 5),
+               (timestamps[0] - 5, timestamps[0] - 1), (timestamps[100], timestamps[50])]
+    for begin, end in windows:
+        expected = _describe_all(_in_window(states, begin, end))
+        begin_time, end_time = TimeUnit.from_nanos(begin), TimeUnit.from_nanos(end)
+        assert _describe_all(table.between(begin_time, end_time)) == expected
+        # the unsorted table has the same samples in the window, in its own order
+        assert sorted(_describe_all(shuffled.between(begin_time, end_time))) == sorted(expected)
+    assert table.between() is table
+    begin_time = TimeUnit.from_nanos(timestamps[250])
+    assert _describe_all(table.between(begin_time)) == _describe_all(states[250:])
+    assert _describe_all(table.between(end_time=begin_time)) == _describe_all(states[:251])
+
+
+def test_sort_by_time():
+    table = make_table(5)
+    shuffled = _shuffled(table, 5)
+    assert table.sort_by_time() is table
+    assert _describe_all(shuffled.sort_by_time()) == _describe_all(table)
+
+
+def test_from_states_round_trip():
+    table = make_table(6)
+    states = list(table)
+    rebuilt = TraceTable.from_states(states, table.power_samples)
+    for name in ['timestamp', 'period', 'energy', 'power', 'power_id', 'callchain_offsets', 'callchain_ips',
+                 'callchain_vaddrs']:
+        assert np.array_equal(getattr(rebuilt, name), getattr(table, name)), name
+    names = [state.sample.get_first_sample().symbol.symbol_name for state in states]
+    assert [state.sample.get_first_sample().symbol.symbol_name for state in rebuilt] == names
+    assert rebuilt.power_samples == table.power_samples
+
+
+def test_pickle_round_trip():
+    table = make_table(7)
+    loaded = pickle.loads(pickle.dumps(table.slice(0, 100)))
+    # the pickled slice only has its own samples, not the whole columns it was a view on
+    assert len(loaded.timestamp) == 100
+    assert [_describe(state)[:3] for state in loaded] == [_describe(state)[:3] for state in list(table)[:100]]
+    assert loaded.is_time_sorted()
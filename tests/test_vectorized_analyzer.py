@@ -0,0 +1,63 @@
+import pytest
+
+pytest.importorskip('simpleperf_report_lib')
+
+from analysis.single_threaded_analyzer import SingleThreadedAnalyzer
+from analysis.vectorized_analyzer import VectorizedAnalyzer
+from trace_representation.time_unit import TimeUnit
+from trace_representation.trace_table import TraceTable, TraceTableBuilder
+from tests.synthetic import make_table, make_symbol_table, assert_same_functions
+
+
+def _analyze(analyzer_type, states, **kwargs):
+    analyzer = analyzer_type(states, **kwargs)
+    analyzer.perform_analysis()
+    return analyzer
+
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('filter_dupes', [True, False])
+def test_same_as_single_threaded(seed: int, filter_dupes: bool):
+    table = make_table(seed)
+    expected = _analyze(SingleThreadedAnalyzer, list(table), filter_dupes=filter_dupes)
+    actual = _analyze(VectorizedAnalyzer, table, filter_dupes=filter_dupes)
+    assert_same_functions(expected.function_dict, actual.function_dict)
+    assert (actual.total_samples, actual.total_time) == (expected.total_samples, expected.total_time)
+    for addr, function in expected.function_dict.items():
+        assert actual.function_dict[addr].energy.local_energy_list == function.energy.local_energy_list
+        assert actual.function_dict[addr].energy.accumulated_energy_list == function.energy.accumulated_energy_list
+
+
+def test_same_as_single_threaded_in_window():
+    table = make_table(7, num_samples=500)
+    begin = TimeUnit.from_nanos(int(table.timestamp[100]))
+    end = TimeUnit.from_nanos(int(table.timestamp[350]))
+    expected = _analyze(SingleThreadedAnalyzer, list(table), begin_time=begin, end_time=end, alpha=0.01)
+    actual = _analyze(VectorizedAnalyzer, table, begin_time=begin, end_time=end, alpha=0.01)
+    assert actual.total_samples == 251
+    assert_same_functions(expected.function_dict, actual.function_dict)
+
+
+def test_empty_table():
+    for analyzer_type in [SingleThreadedAnalyzer, VectorizedAnalyzer]:
+        analyzer = _analyze(analyzer_type, TraceTable.from_states([], []))
+        assert analyzer.function_dict == {}
+        assert (analyzer.total_samples, analyzer.total_time) == (0, 0)
+
+
+def test_window_without_samples():
+    table = make_table(1)
+    after_end = TimeUnit.from_nanos(int(table.timestamp[-1]) + 1)
+    assert _analyze(VectorizedAnalyzer, table, begin_time=after_end).function_dict == {}
+    assert _analyze(SingleThreadedAnalyzer, list(table), begin_time=after_end).function_dict == {}
+
+
+def test_samples_without_callchain_or_power():
+    builder = TraceTableBuilder(make_symbol_table())
+    builder.add_sample(1000, 10, 3, [], [], 0.5)
+    builder.add_sample(2000, 10, 3, [], [], 0.25)
+    table = builder.build()
+    expected = _analyze(SingleThreadedAnalyzer, list(table))
+    actual = _analyze(VectorizedAnalyzer, table)
+    assert len(actual.function_dict) == 1
+    assert_same_functions(expected.function_dict, actual.function_dict)
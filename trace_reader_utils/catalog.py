@@ -0,0 +1,208 @@
+import os
+import sqlite3
+import time
+from typing import List, Optional, Mapping, Any
+
+from analysis.function.function import Function
+from analysis.function.function_table import FunctionTable
+from trace_reader_utils.result_file import get_summary
+from trace_representation.app_sample import PowerSample
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS traces (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    directory TEXT NOT NULL,
+    result_file TEXT,
+    created REAL NOT NULL,
+    filter_dupes INTEGER NOT NULL,
+    num_functions INTEGER NOT NULL,
+    total_samples INTEGER NOT NULL,
+    total_runtime_seconds REAL NOT NULL,
+    local_energy REAL NOT NULL,
+    local_energy_cost REAL NOT NULL,
+    power_count INTEGER NOT NULL,
+    power_mean REAL NOT NULL,
+    power_m2 REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS traces_directory ON traces (directory);
+-- a trace is identified by its directory and name, catalogs from before this key keep only the latest duplicate
+DELETE FROM traces WHERE id NOT IN (SELECT MAX(id) FROM traces GROUP BY directory, name);
+CREATE UNIQUE INDEX IF NOT EXISTS traces_directory_name ON traces (directory, name);
+
+CREATE TABLE IF NOT EXISTS functions (
+    trace_id INTEGER NOT NULL REFERENCES traces (id) ON DELETE CASCADE,
+    addr INTEGER NOT NULL,
+    names TEXT NOT NULL,
+    num_leaf_samples INTEGER NOT NULL,
+    num_samples INTEGER NOT NULL,
+    local_prob REAL NOT NULL,
+    nonlocal_prob REAL NOT NULL,
+    local_energy_cost REAL NOT NULL,
+    nonlocal_energy_cost REAL NOT NULL,
+    mean_local_power REAL NOT NULL,
+    mean_nonlocal_power REAL NOT NULL,
+    local_prob_lower REAL, local_prob_upper REAL,
+    nonlocal_prob_lower REAL, nonlocal_prob_upper REAL,
+    local_energy_lower REAL, local_energy_upper REAL,
+    nonlocal_energy_lower REAL, nonlocal_energy_upper REAL,
+    mean_local_power_lower REAL, mean_local_power_upper REAL,
+    mean_nonlocal_power_lower REAL, mean_nonlocal_power_upper REAL,
+    PRIMARY KEY (trace_id, addr)
+);
+CREATE INDEX IF NOT EXISTS functions_addr ON functions (addr);
+CREATE INDEX IF NOT EXISTS functions_local_energy_cost ON functions (local_energy_cost);
+"""
+
+# interval columns of the functions table, with the FunctionTable column they come from
+_INTERVAL_COLUMNS = {
+    'local_prob': 'local_prob_interval',
+    'nonlocal_prob': 'nonlocal_prob_interval',
+    'local_energy': 'local_energy_interval',
+    'nonlocal_energy': 'nonlocal_energy_interval',
+    'mean_local_power': 'mean_local_power_interval',
+    'mean_nonlocal_power': 'mean_nonlocal_power_interval',
+}
+
+
+def _to_db_addr(addr: int) -> int:
+    # sqlite integers are signed 64 bit, addresses are unsigned
+    return addr - (1 << 64) if addr >= (1 << 63) else addr
+
+
+def _from_db_addr(addr: int) -> int:
+    return addr + (1 << 64) if addr < 0 else addr
+
+
+def _normalize_dir(directory: str) -> str:
+    return os.path.abspath(directory)
+
+
+class Catalog(object):
+    """
+    SQLite catalog of analyzed traces.  Every trace gets a row with its totals in the traces table, and every
+    function of the trace a row with its counts, energy costs and intervals in the functions table, so results can be
+    found and filtered without opening the result files.
+    Names of a function are stored joined with ' .. ', like in the csv output.
+    """
+
+    def __init__(self, catalog_file: str):
+        # the workers of parse_directory all write to the same catalog, so wait for the lock instead of failing
+        self.connection = sqlite3.connect(catalog_file, timeout=60)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def add_trace(self, name: str, directory: str, result_file: Optional[str], functions: Mapping[int, Function],
+                  power_samples: Optional[List[PowerSample]] = None) -> int:
+        """
+        Adds a trace and its functions.  A trace that was added before with the same name and directory is replaced,
+        also when its results were written to a new (numbered) file or not saved at all.
+        :param name: name of the trace, usually the shared filename
+        :param directory: directory the results were written to
+        :param result_file: file the functions were saved to, if they were saved
+        :param functions: function dict or FunctionTable
+        :param power_samples: PowerSamples of the trace
+        :return: id of the trace in the catalog
+        """
+        table = functions if isinstance(functions, FunctionTable) else \
+            FunctionTable.from_functions(functions, power_samples)
+        summary = get_summary(table)
+        interval_bounds = {}
+        for column, interval in _INTERVAL_COLUMNS.items():
+            # NaN marks a missing interval in the table, it is stored as NULL
+            interval_bounds[f'{column}_lower'] = [None if bound != bound else bound
+                                                  for bound in getattr(table, f'{interval}_lower').tolist()]
+            interval_bounds[f'{column}_upper'] = [None if bound != bound else bound
+                                                  for bound in getattr(table, f'{interval}_upper').tolist()]
+        rows = zip([_to_db_addr(addr) for addr in table.addr.tolist()],
+                   [' .. '.join(name_set) for name_set in table.name_sets],
+                   table.num_leaf_samples.tolist(), table.num_samples.tolist(), table.local_prob.tolist(),
+                   table.nonlocal_prob.tolist(), table.local_energy_cost.tolist(),
+                   table.nonlocal_energy_cost.tolist(), table.mean_local_power.tolist(),
+                   table.mean_nonlocal_power.tolist(), *interval_bounds.values())
+        function_columns = ['addr', 'names', 'num_leaf_samples', 'num_samples', 'local_prob', 'nonlocal_prob',
+                            'local_energy_cost', 'nonlocal_energy_cost', 'mean_local_power', 'mean_nonlocal_power',
+                            *interval_bounds]
+
+        with self.connection:
+            self.connection.execute('DELETE FROM traces WHERE directory = ? AND name = ?',
+                                    (_normalize_dir(directory), name))
+            cursor = self.connection.execute(
+                'INSERT INTO traces (name, directory, result_file, created, filter_dupes, num_functions, '
+                'total_samples, total_runtime_seconds, local_energy, local_energy_cost, power_count, power_mean, '
+                'power_m2) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (name, _normalize_dir(directory), result_file, time.time(), table.filter_dupes,
+                 summary['num_functions'], summary['total_samples'], summary['total_runtime_seconds'],
+                 summary['local_energy'], summary['local_energy_cost'], summary['power']['count'],
+                 summary['power']['mean'], summary['power']['m2']))
+            trace_id = cursor.lastrowid
+            self.connection.executemany(
+                f'INSERT INTO functions (trace_id, {", ".join(function_columns)}) '
+                f'VALUES (?, {", ".join("?" * len(function_columns))})',
+                ((trace_id, *row) for row in rows))
+        return trace_id
+
+    def get_traces(self, directory: Optional[str] = None) -> List[sqlite3.Row]:
+        """
+        :param directory: only return the traces whose results were written to this directory
+        :return: rows of the traces table, in the order they were added
+        """
+        if directory is None:
+            return self.connection.execute('SELECT * FROM traces ORDER BY id').fetchall()
+        return self.connection.execute('SELECT * FROM traces WHERE directory = ? ORDER BY id',
+                                       (_normalize_dir(directory),)).fetchall()
+
+    def get_local_energy_sums(self, directory: str) -> List[float]:
+        """
+        :return: total local energy of every trace in the directory, like get_sums_from_dir
+        """
+        return [row['local_energy'] for row in self.get_traces(directory)]
+
+    def find_functions(self, name: Optional[str] = None, addr: Optional[int] = None,
+                       min_local_energy_cost: Optional[float] = None, directory: Optional[str] = None,
+                       trace_id: Optional[int] = None) -> List[dict]:
+        """
+        Finds functions over all the catalogued traces.  Every argument that is given is used as a filter.
+        :param name: part of one of the names of the function
+        :param addr: address of the function
+        :param min_local_energy_cost: minimum local energy cost
+        :param directory: only search the traces in this directory
+        :param trace_id: only search this trace
+        :return: function rows as dicts, with the name, directory and result file of their trace added
+        """
+        conditions = []
+        parameters: List[Any] = []
+        if name is not None:
+            conditions.append('functions.names LIKE ?')
+            parameters.append(f'%{name}%')
+        if addr is not None:
+            conditions.append('functions.addr = ?')
+            parameters.append(_to_db_addr(addr))
+        if min_local_energy_cost is not None:
+            conditions.append('functions.local_energy_cost >= ?')
+            parameters.append(min_local_energy_cost)
+        if directory is not None:
+            conditions.append('traces.directory = ?')
+            parameters.append(_normalize_dir(directory))
+        if trace_id is not None:
+            conditions.append('functions.trace_id = ?')
+            parameters.append(trace_id)
+        where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+        rows = self.connection.execute(
+            'SELECT functions.*, traces.name AS trace_name, traces.directory, traces.result_file '
+            f'FROM functions JOIN traces ON functions.trace_id = traces.id {where} '
+            'ORDER BY functions.trace_id, functions.rowid', parameters).fetchall()
+        functions = [dict(row) for row in rows]
+        for function in functions:
+            function['addr'] = _from_db_addr(function['addr'])
+        return functions
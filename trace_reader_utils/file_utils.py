@@ -1,5 +1,7 @@
 import os
+from contextlib import contextmanager
 from functools import singledispatch
+from typing import Iterator
 
 from parsers.parser_args import ParserArgs
 
@@ -33,4 +35,32 @@ def _get_unique(root: str, ext: str):
         i += 1
 
     output_file = f'{root}-{i}{ext}'
-    return output_file
\ No newline at end of file
+    return output_file
+
+
+_HASH_BLOCK_SIZE = 1 << 20
+
+
+def update_hash(file_hash, file_name: str):
+    """
+    Feeds the contents of a file to a hashlib hash, one block at a time.
+    """
+    with open(file_name, 'rb') as input_file:
+        while block := input_file.read(_HASH_BLOCK_SIZE):
+            file_hash.update(block)
+
+
+@contextmanager
+def atomic_output(output_file: str) -> Iterator[str]:
+    """
+    Gives a temporary path to write output_file to, which is renamed to output_file once the block completes.
+    If the block fails, or the process dies while writing, output_file is never left half written.
+    :param output_file: final path of the output
+    """
+    temp_file = f'{output_file}.{os.getpid()}.tmp'
+    try:
+        yield temp_file
+        os.replace(temp_file, output_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, Any, Optional
+
+from parsers.parser_args import ParserArgs
+from trace_reader_utils.file_utils import update_hash, atomic_output
+
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# ParserArgs that change the outputs of a trace.  A trace parsed with different values is parsed again.
+_SETTINGS = ['trace_offcpu_mode', 'current_divider', 'energy_mode', 'analyzer', 'filter_dupes', 'alpha',
+             'begin_time', 'end_time', 'function_table', 'result_format', 'output_csv', 'pickle_functions',
+             'pickle_trace']
+
+
+def get_settings(args: ParserArgs) -> Dict[str, Any]:
+    """
+    :return: the settings of args that change the outputs of a trace, as JSON compatible values
+    """
+    return {name: getattr(args, name, None) for name in _SETTINGS}
+
+
+def _hash_input(file_name: str) -> str:
+    file_hash = hashlib.blake2b(digest_size=20)
+    update_hash(file_hash, file_name)
+    return file_hash.hexdigest()
+
+
+def describe_inputs(args: ParserArgs) -> Dict[str, Dict[str, Any]]:
+    """
+    :return: size, modification time and hash of the perf.data file and the environment log of the trace in args
+    """
+    inputs = {}
+    for input_file in [args.get_simpleperf_log_file(), args.get_env_log_file()]:
+        stat = os.stat(input_file)
+        inputs[os.path.abspath(input_file)] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                               'hash': _hash_input(input_file)}
+    return inputs
+
+
+def create_entry(args: ParserArgs, inputs: Dict[str, Dict[str, Any]], outputs: List[str]) -> Dict[str, Any]:
+    """
+    :param args: ParserArgs the trace was parsed with
+    :param inputs: inputs of the trace, from describe_inputs before it was parsed
+    :param outputs: files written for the trace
+    :return: manifest entry of the trace
+    """
+    return {
+        'inputs': inputs,
+        'settings': get_settings(args),
+        'outputs': [os.path.relpath(output, args.output_dir) for output in outputs],
+        'completed': time.time(),
+    }
+
+
+class Manifest(object):
+    """
+    Record of the traces that were parsed into an output directory, stored as manifest.json in that directory.
+    For every trace it holds the size, modification time and hash of its input files, the settings it was parsed
+    with and the outputs that were written, so a rerun of a batch only has to parse the traces that are new or
+    changed, or whose outputs have gone missing.
+    """
+
+    def __init__(self, output_dir: str):
+        self.output_dir: str = output_dir
+        self.path: str = os.path.join(output_dir, MANIFEST_FILE)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path) as manifest_file:
+                    manifest = json.load(manifest_file)
+            except (OSError, ValueError) as e:
+                print(f'WARNING: ignoring unreadable manifest {self.path}: {e}')
+                manifest = {}
+            if manifest.get('version') == MANIFEST_VERSION:
+                self.entries = manifest.get('traces', {})
+
+    def is_up_to_date(self, args: ParserArgs) -> bool:
+        """
+        :param args: ParserArgs of the trace, with its shared_filename
+        :return: whether the trace was parsed with the same inputs and settings, and all of its outputs still exist
+        """
+        entry = self.entries.get(args.shared_filename)
+        if entry is None or entry['settings'] != get_settings(args):
+            return False
+        if not all(os.path.isfile(os.path.join(self.output_dir, output)) for output in entry['outputs']):
+            return False
+        for input_file in [args.get_simpleperf_log_file(), args.get_env_log_file()]:
+            recorded = entry['inputs'].get(os.path.abspath(input_file))
+            if recorded is None or not os.path.isfile(input_file):
+                return False
+            stat = os.stat(input_file)
+            if stat.st_size != recorded['size']:
+                return False
+            # only hash files that were touched, an unchanged modification time means unchanged contents
+            if stat.st_mtime_ns != recorded['mtime_ns'] and _hash_input(input_file) != recorded['hash']:
+                return False
+        return True
+
+    def get_entry(self, name: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(name)
+
+    def add_entry(self, name: str, entry: Dict[str, Any]):
+        """
+        Records a parsed trace and saves the manifest, so the progress of a batch survives a crash.
+        Outputs of an earlier entry of the trace that were not written again are removed, so they can't be mistaken
+        for results of the current inputs and settings.
+        """
+        old_entry = self.entries.get(name)
+        if old_entry is not None:
+            for output in set(old_entry['outputs']) - set(entry['outputs']):
+                if os.path.isfile(os.path.join(self.output_dir, output)):
+                    os.remove(os.path.join(self.output_dir, output))
+        self.entries[name] = entry
+        self.save()
+
+    def save(self):
+        with atomic_output(self.path) as temp_file, open(temp_file, 'w') as manifest_file:
+            json.dump({'version': MANIFEST_VERSION, 'traces': self.entries}, manifest_file, indent=1, sort_keys=True)
@@ -1,22 +1,27 @@
 import gzip
 import pickle
+from collections.abc import Mapping
 from typing import Dict, Union, Type, Optional
 
 from parsers.parser_args import ParserArgs
-from trace_reader_utils.file_utils import get_filename
+from trace_reader_utils.file_utils import get_filename, atomic_output
+from trace_reader_utils.result_file import is_result_file, read_result_file
 
 
 def gzip_pickle(obj, file_name: Union[str, ParserArgs], overwrite: bool = False):
     if file_name is None:
         raise ValueError(f'need a file path')
     output_file = get_filename(file_name, 'pickle.gz', overwrite)
-    with gzip.open(output_file, 'wb') as pickle_file:
+    with atomic_output(output_file) as temp_file, gzip.open(temp_file, 'wb') as pickle_file:
         pickle.dump(obj, pickle_file, protocol=pickle.HIGHEST_PROTOCOL)
+    return output_file
 
 
-# will use the file extension to determine whether to use gzip or regular pickle
+# will use the file extension to determine whether to use gzip, regular pickle or a binary result file
 def gzip_unpickle(input_file: str):
-    if input_file.endswith('.gz'):
+    if is_result_file(input_file):
+        return read_result_file(input_file)
+    elif input_file.endswith('.gz'):
         with gzip.open(input_file, 'rb') as pickle_file:
             return pickle.load(pickle_file)
     elif input_file.endswith('.pickle'):
@@ -26,11 +31,12 @@ def gzip_unpickle(input_file: str):
         return None
 
 
-def get_dict_from_pickle(input_file: str) -> Dict:
+def get_dict_from_pickle(input_file: str) -> Mapping:
     obj = gzip_unpickle(input_file)
     if obj is None:
         raise ValueError(f'File not found or invalid file')
-    if not isinstance(obj, Dict):
+    # function results can also be pickled as a FunctionTable, which is a Mapping but not a dict
+    if not isinstance(obj, Mapping):
         raise TypeError(f'Pickle does not contain a dict')
     return obj
 
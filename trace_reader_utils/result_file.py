@@ -0,0 +1,279 @@
+"""
+Binary result file (.trr), an alternative to pickling the function dict.
+
+layout:
+    magic (8 bytes), format version (uint32), reserved (uint32), header length (uint64)
+    JSON header, utf-8
+    column blocks, each starting at a multiple of ALIGNMENT bytes
+
+All integers are little-endian.  The header holds the number of functions and power samples, the filter_dupes
+setting, a summary of the whole trace (since version 2, see get_summary), and for every column its dtype, offset
+and number of entries.  The offsets are relative to the start of the column data, which is the end of the header
+rounded up to ALIGNMENT.
+The columns are the numeric columns of a FunctionTable, its side tables, the power samples, and the names as one
+utf-8 blob with offsets.  Because the blocks are aligned raw arrays, a file can be memory mapped and every column
+used as a numpy array directly, without reading the columns that are not used.
+
+Pickled results have no header, so their summary is written to a small JSON file next to the pickle
+(<name>.summary.json, see write_summary_file), together with the size and modification time of the pickle it was
+written for.
+"""
+import json
+import os
+import struct
+from typing import Dict, List, Optional, Union, Mapping, Any
+
+import numpy as np
+
+from analysis.function.function import Function
+from analysis.function.function_table import FunctionTable
+from parsers.parser_args import ParserArgs
+from trace_reader_utils.file_utils import get_filename, atomic_output
+from trace_representation.app_sample import PowerSample
+from trace_representation.time_unit import TimeUnit
+
+
+MAGIC = b'TRRESULT'
+VERSION = 2
+SUMMARY_VERSION = 1
+ALIGNMENT = 64
+EXTENSION = '.trr'
+SUMMARY_EXTENSION = '.summary.json'
+_PICKLE_EXTENSION = '.pickle.gz'
+
+_PREAMBLE = struct.Struct('<8sIIQ')
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _get_name_columns(name_sets: List[Any]) -> Dict[str, np.ndarray]:
+    names = [name.encode('utf-8') for name_set in name_sets for name in name_set]
+    name_offsets = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum([len(name) for name in names], out=name_offsets[1:])
+    name_set_offsets = np.zeros(len(name_sets) + 1, dtype=np.int64)
+    np.cumsum([len(name_set) for name_set in name_sets], out=name_set_offsets[1:])
+    return {
+        'names': np.frombuffer(b''.join(names), dtype=np.uint8),
+        'name_offsets': name_offsets,
+        'name_set_offsets': name_set_offsets,
+    }
+
+
+def _get_table_columns(table: FunctionTable) -> Dict[str, np.ndarray]:
+    columns = table.get_columns()
+    columns.update({
+        'children_offsets': table.children_offsets,
+        'children': table.children,
+        'local_power_offsets': table.local_power_offsets,
+        'local_power_ids': table.local_power_ids,
+        'local_power_counts': table.local_power_counts,
+        'nonlocal_power_offsets': table.nonlocal_power_offsets,
+        'nonlocal_power_ids': table.nonlocal_power_ids,
+        'nonlocal_power_counts': table.nonlocal_power_counts,
+        'power_sample_power': np.array([sample.power for sample in table.power_samples], dtype=np.float64),
+        'power_sample_timestamp': np.array([sample.timestamp.to_nanos() for sample in table.power_samples],
+                                           dtype=np.int64),
+    })
+    columns.update(_get_name_columns(table.name_sets))
+    return columns
+
+
+def get_summary(table: FunctionTable) -> Dict[str, Any]:
+    """
+    Totals of the trace that are needed often enough to keep them in the header, so they can be read without the
+    columns.
+    """
+    power = np.array([sample.power for sample in table.power_samples], dtype=np.float64)
+    mean_power = float(power.mean()) if len(power) > 0 else 0.0
+    return {
+        'version': SUMMARY_VERSION,
+        'num_functions': len(table),
+        'total_samples': int(table.total_samples.max()) if len(table) > 0 else 0,
+        'total_runtime_seconds': float(table.total_runtime_seconds.max()) if len(table) > 0 else 0.0,
+        # summed in the same order as sum_full_trace, so the result is identical
+        'local_energy': sum(table.local_energy.tolist()),
+        'local_energy_cost': sum(table.local_energy_cost.tolist()),
+        'power': {
+            'count': len(power),
+            'mean': mean_power,
+            'm2': float(((power - mean_power) ** 2).sum()),
+            'min': float(power.min()) if len(power) > 0 else 0.0,
+            'max': float(power.max()) if len(power) > 0 else 0.0,
+        },
+    }
+
+
+def write_result_file(file_name: Union[str, ParserArgs], functions: Mapping[int, Function],
+                      power_samples: Optional[List[PowerSample]] = None, overwrite: bool = False) -> str:
+    """
+    Writes analysis results to a .trr file.
+    :param file_name: output file, the extension is added if it is missing
+    :param functions: function dict or FunctionTable
+    :param power_samples: PowerSamples of the trace, only used if functions is not a FunctionTable yet
+    :param overwrite: overwrite an existing file, instead of picking a new numbered file name
+    :return: path of the written file
+    """
+    table = functions if isinstance(functions, FunctionTable) else \
+        FunctionTable.from_functions(functions, power_samples)
+    columns = {name: np.ascontiguousarray(column, dtype=np.dtype(column.dtype).newbyteorder('<'))
+               for name, column in _get_table_columns(table).items()}
+
+    header = {
+        'version': VERSION,
+        'num_functions': len(table),
+        'num_power_samples': len(table.power_samples),
+        'filter_dupes': table.filter_dupes,
+        'summary': get_summary(table),
+        'columns': {},
+    }
+    offset = 0
+    for name, column in columns.items():
+        header['columns'][name] = {'dtype': column.dtype.str, 'offset': offset, 'length': len(column)}
+        offset = _align(offset + column.nbytes)
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = _align(_PREAMBLE.size + len(header_bytes))
+
+    output_file = get_filename(file_name, EXTENSION, overwrite)
+    with atomic_output(output_file) as temp_file, open(temp_file, 'wb') as result_file:
+        result_file.write(_PREAMBLE.pack(MAGIC, VERSION, 0, len(header_bytes)))
+        result_file.write(header_bytes)
+        position = _PREAMBLE.size + len(header_bytes)
+        for name, column in columns.items():
+            offset = data_start + header['columns'][name]['offset']
+            result_file.write(b'\0' * (offset - position))
+            result_file.write(column.tobytes())
+            position = offset + column.nbytes
+    return output_file
+
+
+class ResultFile(object):
+    """
+    Read access to a .trr file.  Only the header is read when opening the file, the columns are memory mapped
+    when they are first used.
+    """
+
+    def __init__(self, file_name: str):
+        with open(file_name, 'rb') as result_file:
+            preamble = result_file.read(_PREAMBLE.size)
+            if len(preamble) < _PREAMBLE.size:
+                raise ValueError(f'{file_name} is not a result file')
+            magic, version, _, header_length = _PREAMBLE.unpack(preamble)
+            if magic != MAGIC:
+                raise ValueError(f'{file_name} is not a result file')
+            if version > VERSION:
+                raise ValueError(f'{file_name} has result format version {version}, only up to {VERSION} '
+                                 f'is supported')
+            self.header: Dict[str, Any] = json.loads(result_file.read(header_length).decode('utf-8'))
+        self.file_name: str = file_name
+        self.version: int = version
+        self._data_start: int = _align(_PREAMBLE.size + header_length)
+        self._data: Optional[np.memmap] = None
+
+    def __len__(self):
+        return self.header['num_functions']
+
+    def get_summary(self) -> Optional[Dict[str, Any]]:
+        """
+        :return: summary of the trace from the header, None for files from before the summary was added
+        """
+        return self.header.get('summary')
+
+    def get_column_names(self) -> List[str]:
+        return list(self.header['columns'])
+
+    def get_column(self, name: str) -> np.ndarray:
+        """
+        :param name: name of the column, see get_column_names
+        :return: read-only array backed by the memory mapped file
+        """
+        info = self.header['columns'][name]
+        dtype = np.dtype(info['dtype'])
+        if info['length'] == 0:
+            return np.zeros(0, dtype=dtype)
+        if self._data is None:
+            self._data = np.memmap(self.file_name, dtype=np.uint8, mode='r')
+        begin = self._data_start + info['offset']
+        return self._data[begin:begin + info['length'] * dtype.itemsize].view(dtype)
+
+    def get_name_sets(self) -> List[set]:
+        names = self.get_column('names').tobytes()
+        name_offsets = self.get_column('name_offsets').tolist()
+        name_set_offsets = self.get_column('name_set_offsets').tolist()
+        decoded = [names[name_offsets[i]:name_offsets[i + 1]].decode('utf-8') for i in range(len(name_offsets) - 1)]
+        return [set(decoded[name_set_offsets[i]:name_set_offsets[i + 1]]) for i in range(len(name_set_offsets) - 1)]
+
+    def get_power_samples(self) -> List[PowerSample]:
+        return [PowerSample(power, TimeUnit.from_nanos(timestamp))
+                for power, timestamp in zip(self.get_column('power_sample_power').tolist(),
+                                            self.get_column('power_sample_timestamp').tolist())]
+
+    def to_table(self) -> FunctionTable:
+        """
+        :return: FunctionTable with the contents of the file.  The numeric columns stay memory mapped.
+        """
+        columns = {name: self.get_column(name) for name in FunctionTable.COLUMN_NAMES}
+        return FunctionTable(columns, self.get_name_sets(), self.get_column('children_offsets'),
+                             self.get_column('children'),
+                             (self.get_column('local_power_offsets'), self.get_column('local_power_ids'),
+                              self.get_column('local_power_counts')),
+                             (self.get_column('nonlocal_power_offsets'), self.get_column('nonlocal_power_ids'),
+                              self.get_column('nonlocal_power_counts')),
+                             self.get_power_samples(), self.header['filter_dupes'])
+
+
+def read_result_file(file_name: str) -> FunctionTable:
+    return ResultFile(file_name).to_table()
+
+
+def read_summary(file_name: str) -> Optional[Dict[str, Any]]:
+    """
+    Reads only the summary of a result file from its header, or of a pickled result from its summary file.
+    :return: summary, or None if the file has no summary, or the summary file is older than the pickle
+    """
+    try:
+        if is_result_file(file_name):
+            return ResultFile(file_name).get_summary()
+        if file_name.endswith(_PICKLE_EXTENSION):
+            return _read_summary_file(file_name)
+    except (OSError, ValueError):
+        return None
+    return None
+
+
+def get_summary_file(pickle_file: str) -> str:
+    return pickle_file.removesuffix(_PICKLE_EXTENSION) + SUMMARY_EXTENSION
+
+
+def write_summary_file(pickle_file: str, functions: Mapping[int, Function],
+                       power_samples: Optional[List[PowerSample]] = None) -> str:
+    """
+    Writes the summary of pickled results next to the pickle, see get_summary.
+    :param pickle_file: the pickled function dict or FunctionTable, which has to be written already
+    :param functions: the pickled functions
+    :param power_samples: PowerSamples of the trace, only used if functions is not a FunctionTable yet
+    :return: path of the written summary file
+    """
+    table = functions if isinstance(functions, FunctionTable) else \
+        FunctionTable.from_functions(functions, power_samples)
+    stat = os.stat(pickle_file)
+    contents = {'file_size': stat.st_size, 'file_mtime_ns': stat.st_mtime_ns, 'summary': get_summary(table)}
+    summary_file = get_summary_file(pickle_file)
+    with atomic_output(summary_file) as temp_file, open(temp_file, 'w') as output:
+        json.dump(contents, output)
+    return summary_file
+
+
+def _read_summary_file(pickle_file: str) -> Optional[Dict[str, Any]]:
+    with open(get_summary_file(pickle_file), 'r') as summary_file:
+        contents = json.load(summary_file)
+    # the pickle was replaced after the summary was written
+    stat = os.stat(pickle_file)
+    if contents.get('file_size') != stat.st_size or contents.get('file_mtime_ns') != stat.st_mtime_ns:
+        return None
+    return contents.get('summary')
+
+
+def is_result_file(file_name: str) -> bool:
+    return file_name.endswith(EXTENSION)
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import List, Optional, Dict, Tuple
 
 from trace_representation.simpleperf_python_datatypes import CallChain, Symbol
 from trace_representation.time_unit import TimeUnit
@@ -46,9 +46,69 @@ class PowerSample(object):
 
 
 
+class RunningStats(object):
+    """
+    Running count, mean and sum of squared deviations from the mean (Welford), which can be merged with other
+    RunningStats (Chan et al.) without keeping the values themselves.
+    """
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.count: int = count
+        self.mean: float = mean
+        self.m2: float = m2
+
+    def add(self, value: float, count: int = 1):
+        """
+        Adds value count times.
+        """
+        self.merge(RunningStats(count, value, 0.0))
+
+    def merge(self, other: "RunningStats"):
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+    def squared_deviation(self, center: float) -> float:
+        """
+        :return: sum of (value - center) ** 2 over all values
+        """
+        return self.m2 + self.count * (self.mean - center) ** 2
+
+    @staticmethod
+    def from_counts(counts: Dict["PowerSample", int]) -> "RunningStats":
+        stats = RunningStats()
+        stats.count = sum(counts.values())
+        if stats.count > 0:
+            stats.mean = sum(power_sample.power * count for power_sample, count in counts.items()) / stats.count
+            stats.m2 = sum(count * (power_sample.power - stats.mean) ** 2 for power_sample, count in counts.items())
+        return stats
+
+
+def _add_counts(counts: Dict["PowerSample", int], other: Dict["PowerSample", int]):
+    for power_sample, count in other.items():
+        counts[power_sample] = counts.get(power_sample, 0) + count
+
+
+def _expand_counts(counts: Dict["PowerSample", int]) -> List["PowerSample"]:
+    power_list = []
+    for power_sample, count in counts.items():
+        power_list += [power_sample] * count
+    return power_list
+
+
 class PowerPeriod(object):
     """
     Accumulates the power used by samples of a function.  not useful without knowing the amount of time it ran for.
+    Instead of a list with the PowerSample of every sample, it keeps how often each distinct PowerSample was seen,
+    and running statistics over all the samples.  So the size depends on the number of distinct power readings,
+    not on the number of samples.
     """
 
     def __init__(self, local_power: Optional[PowerSample] = None, nonlocal_power: Optional[PowerSample] = None):
@@ -58,10 +118,13 @@ class PowerPeriod(object):
         """
         self.local_power: float = local_power.power if local_power is not None else 0.0
         self.nonlocal_power: float = nonlocal_power.power if nonlocal_power is not None else 0.0
-        # if local_power is 0, then this wasn't a local sample.
-        # don't add it to the list.
-        self._local_power_list: List[PowerSample] = [local_power] if local_power is not None else list()
-        self._nonlocal_power_list: List[PowerSample] = [nonlocal_power] if nonlocal_power is not None else list()
+        # if local_power is None, then this wasn't a local sample.
+        # don't count it.
+        self._local_counts: Dict[PowerSample, int] = {local_power: 1} if local_power is not None else {}
+        self._nonlocal_counts: Dict[PowerSample, int] = {nonlocal_power: 1} if nonlocal_power is not None else {}
+        self._local_stats = RunningStats(1, local_power.power) if local_power is not None else RunningStats()
+        self._nonlocal_stats = RunningStats(1, nonlocal_power.power) if nonlocal_power is not None \
+            else RunningStats()
 
     def __iadd__(self, other):
         if not isinstance(other, PowerPeriod):
@@ -69,32 +132,90 @@ class PowerPeriod(object):
         self.local_power += other.local_power
         self.nonlocal_power += other.nonlocal_power
 
-        self._local_power_list += other._local_power_list
-        self._nonlocal_power_list += other._nonlocal_power_list
+        _add_counts(self._local_counts, other._local_counts)
+        _add_counts(self._nonlocal_counts, other._nonlocal_counts)
+        self._local_stats.merge(other._local_stats)
+        self._nonlocal_stats.merge(other._nonlocal_stats)
 
         return self
 
+    def __setstate__(self, state):
+        # pickles from before the counts were introduced have the full lists
+        if '_local_power_list' in state:
+            local_counts, nonlocal_counts = {}, {}
+            for power_sample in state.pop('_local_power_list'):
+                local_counts[power_sample] = local_counts.get(power_sample, 0) + 1
+            for power_sample in state.pop('_nonlocal_power_list'):
+                nonlocal_counts[power_sample] = nonlocal_counts.get(power_sample, 0) + 1
+            state['_local_counts'] = local_counts
+            state['_nonlocal_counts'] = nonlocal_counts
+            state['_local_stats'] = RunningStats.from_counts(local_counts)
+            state['_nonlocal_stats'] = RunningStats.from_counts(nonlocal_counts)
+        self.__dict__.update(state)
+
+    @classmethod
+    def from_counts(cls, local_power: float, nonlocal_power: float, local_counts: Dict[PowerSample, int],
+                    nonlocal_counts: Dict[PowerSample, int]) -> "PowerPeriod":
+        """
+        Creates a PowerPeriod from already accumulated power, instead of adding up PowerPeriods one by one.
+        :param local_power: summed up local power
+        :param nonlocal_power: summed up non-local power
+        :param local_counts: number of local samples for each PowerSample
+        :param nonlocal_counts: number of non-local samples for each PowerSample
+        """
+        period = cls()
+        period.local_power = local_power
+        period.nonlocal_power = nonlocal_power
+        period._local_counts = local_counts
+        period._nonlocal_counts = nonlocal_counts
+        period._local_stats = RunningStats.from_counts(local_counts)
+        period._nonlocal_stats = RunningStats.from_counts(nonlocal_counts)
+        return period
+
+    def get_local_counts(self) -> Dict[PowerSample, int]:
+        return self._local_counts
+
+    def get_nonlocal_counts(self) -> Dict[PowerSample, int]:
+        return self._nonlocal_counts
+
+    def get_local_deviation(self, center: float, filter_dupes: bool = True) -> Tuple[int, float]:
+        """
+        :param center: value to take the deviation from, usually the mean local power
+        :param filter_dupes: only count every distinct PowerSample once
+        :return: number of (distinct) samples, and the sum of their squared deviations from center
+        """
+        return _get_deviation(self._local_counts, self._local_stats, center, filter_dupes)
+
+    def get_nonlocal_deviation(self, center: float, filter_dupes: bool = True) -> Tuple[int, float]:
+        """
+        Same as get_local_deviation, for the non-local samples.
+        """
+        return _get_deviation(self._nonlocal_counts, self._nonlocal_stats, center, filter_dupes)
+
     def get_combined_power(self, filter_dupes: bool = True):
         if filter_dupes:
-            return set(self._local_power_list).union(set(self._nonlocal_power_list))
+            return set(self._local_counts).union(set(self._nonlocal_counts))
         else:
-            return self._local_power_list + self._nonlocal_power_list
+            return _expand_counts(self._local_counts) + _expand_counts(self._nonlocal_counts)
 
     def get_local_power(self, filter_dupes: bool = True):
         if filter_dupes:
-            return set(self._local_power_list)
+            return set(self._local_counts)
         else:
-            return self._local_power_list
+            return _expand_counts(self._local_counts)
 
     def get_nonlocal_power(self, filter_dupes: bool = True):
         if filter_dupes:
-            return set(self._nonlocal_power_list)
+            return set(self._nonlocal_counts)
         else:
-            return self._nonlocal_power_list
-
-
+            return _expand_counts(self._nonlocal_counts)
 
 
+def _get_deviation(counts: Dict[PowerSample, int], stats: RunningStats, center: float,
+                   filter_dupes: bool) -> Tuple[int, float]:
+    if filter_dupes:
+        return len(counts), sum((power_sample.power - center) ** 2 for power_sample in counts)
+    return stats.count, stats.squared_deviation(center)
 
 
 class AppState(object):
@@ -1,7 +1,7 @@
 # python versions of simpleperf data structures.
 # yes, this is very memory inefficient.  just download more ram
 import copy
-from typing import List
+from typing import List, Dict, Tuple, Optional
 
 from simpleperf_report_lib import CallChainStructure, CallChainEntryStructure, SymbolStruct
 
@@ -44,21 +44,84 @@ class Symbol(object):
         return self.symbol_name
 
 
+class SymbolTable(object):
+    """
+    Interning table for the Symbols of one parse.  A trace has far fewer distinct symbols than callchain entries,
+    so each distinct symbol is only decoded and allocated once and every entry refers to that one Symbol.
+    Symbols are keyed on (dso_name, symbol_addr), and are given a small integer id in order of first appearance.
+    The vaddr of an interned symbol is the one of the first entry it was seen in, the vaddr of every entry is kept
+    next to it (CallChainEntry.vaddr, TraceTable.callchain_vaddrs).
+    """
+
+    def __init__(self):
+        self.symbols: List[Symbol] = []
+        self._symbol_ids: Dict[Tuple[str, int], int] = {}
+        # ids by the raw (undecoded) dso name of the SymbolStruct, so known symbols are found without decoding
+        self._raw_symbol_ids: Dict[Tuple[Optional[bytes], int], int] = {}
+
+    def get_id(self, symbol: SymbolStruct) -> int:
+        """
+        Returns the id of the given symbol, adding it to the table if it has not been seen before.
+        :param symbol: SymbolStruct from simpleperf
+        :return: index of the Symbol in self.symbols
+        """
+        raw_key = (symbol._dso_name, symbol.symbol_addr)
+        symbol_id = self._raw_symbol_ids.get(raw_key)
+        if symbol_id is None:
+            # only decoded the first time, different raw names that decode the same still share a Symbol
+            symbol_id = self.add_symbol(Symbol(symbol))
+            self._raw_symbol_ids[raw_key] = symbol_id
+        return symbol_id
+
+    def add_symbol(self, symbol: "Symbol") -> int:
+        """
+        Same as get_id, but for a Symbol that was already converted from simpleperf.
+        :param symbol: Symbol to intern
+        :return: index of the (possibly different, but equal) Symbol in self.symbols
+        """
+        key = (symbol.dso_name, symbol.symbol_addr)
+        symbol_id = self._symbol_ids.get(key)
+        if symbol_id is None:
+            symbol_id = len(self.symbols)
+            self.symbols.append(symbol)
+            self._symbol_ids[key] = symbol_id
+        return symbol_id
+
+    def get_symbol(self, symbol: SymbolStruct) -> Symbol:
+        return self.symbols[self.get_id(symbol)]
+
+    def __getitem__(self, symbol_id: int) -> Symbol:
+        return self.symbols[symbol_id]
+
+    def __len__(self):
+        return len(self.symbols)
+
+
 class CallChainEntry(object):
     """
     Contains a single entry in a callchain, consisting of an instruction pointer address and
-    a 'Symbol'
+    a 'Symbol'.  vaddr is the address of the entry in its file, which is kept here because an interned Symbol is
+    shared by many entries.
     """
 
-    def __init__(self, entry: CallChainEntryStructure):
+    def __init__(self, entry: CallChainEntryStructure, symbol_table: Optional[SymbolTable] = None):
+        """
+        :param entry: simpleperf callchain entry
+        :param symbol_table: Optional table to intern the symbol in, if not given a new Symbol is created
+        """
         self.ip: int = entry.ip
-        self.symbol: Symbol = Symbol(entry.symbol)
+        self.vaddr: int = entry.symbol.vaddr_in_file
+        self.symbol: Symbol = symbol_table.get_symbol(entry.symbol) if symbol_table is not None \
+            else Symbol(entry.symbol)
 
     def __contains__(self, item):
         if item == self.ip:
             return True
 
-        return item in self.symbol
+        # same as `item in self.symbol`, but with the vaddr of this entry instead of the one of the shared Symbol
+        symbol = self.symbol
+        return item in symbol.dso_name or item in symbol.symbol_name \
+            or item == symbol.symbol_addr or item == self.vaddr
 
     def __str__(self):
         return str(self.symbol)
@@ -69,10 +132,14 @@ class CallChain(object):
     Contains a list of CallChainEntries associated with this CallChain
     """
 
-    def __init__(self, chain: CallChainStructure):
+    def __init__(self, chain: CallChainStructure, symbol_table: Optional[SymbolTable] = None):
+        """
+        :param chain: simpleperf callchain
+        :param symbol_table: Optional table to intern the symbols of the entries in
+        """
         self.entries: List[CallChainEntry] = []
         for i in range(0, chain.nr):
-            self.entries.append(CallChainEntry(chain.entries[i]))
+            self.entries.append(CallChainEntry(chain.entries[i], symbol_table))
 
     def __contains__(self, item):
         return any(item in entry for entry in self.entries)
@@ -83,7 +150,7 @@ class TimePeriod(object):
     Class that represents the amount of execution time used locally and non-locally by a function
     """
 
-    def __init__(self, local_time: TimeUnit = TimeUnit(), accumulated_time: TimeUnit = TimeUnit()):
+    def __init__(self, local_time: TimeUnit = TimeUnit.ZERO, accumulated_time: TimeUnit = TimeUnit.ZERO):
         """
         :param local_time: Local execution time
         :param accumulated_time: non-local execution time
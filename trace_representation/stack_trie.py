@@ -0,0 +1,150 @@
+from typing import List, Optional, Dict, Tuple, Iterable, Iterator
+
+import numpy as np
+
+from trace_representation.app_sample import AppState, PowerSample
+from trace_representation.simpleperf_python_datatypes import Symbol
+from trace_representation.trace_table import TraceTable
+
+
+class StackNode(object):
+    """
+    Node in a StackTrie.  The path from the root to a node is a stack, outermost caller first.
+    The accumulated values only count the samples whose stack ends exactly at this node.
+    """
+
+    def __init__(self, symbol: Optional[Symbol], parent: Optional["StackNode"]):
+        self.symbol: Optional[Symbol] = symbol
+        self.parent: Optional[StackNode] = parent
+        self.children: Dict[Symbol, StackNode] = {}
+        self.num_samples: int = 0
+        self.period: int = 0  # nanoseconds
+        self.energy: float = 0.0
+        self.power: float = 0.0  # summed up power of the samples
+        self.power_samples: Dict[PowerSample, int] = {}  # PowerSamples of the samples, with how often they occur
+
+    def add_sample(self, period: int, energy: float, power: Optional[PowerSample]):
+        self.num_samples += 1
+        self.period += period
+        self.energy += energy
+        if power is not None:
+            self.power += power.power
+            self.power_samples[power] = self.power_samples.get(power, 0) + 1
+
+    def get_stack(self) -> List[Symbol]:
+        """
+        :return: symbols of the stack ending in this node, in callchain order (this node's symbol first)
+        """
+        stack = []
+        node = self
+        while node.parent is not None:
+            stack.append(node.symbol)
+            node = node.parent
+        return stack
+
+    def get_inclusive_samples(self) -> int:
+        """
+        :return: number of samples whose stack passes through this node
+        """
+        return self.num_samples + sum(child.get_inclusive_samples() for child in self.children.values())
+
+
+class StackTrie(object):
+    """
+    Prefix trie of the stacks in a trace.  Samples with an identical stack are first combined, so every distinct
+    stack is inserted only once, with the number of samples and their summed period, energy and power.
+    """
+
+    def __init__(self):
+        self.root: StackNode = StackNode(None, None)
+        self.stacks: List[StackNode] = []  # nodes where at least one stack ends, in order of first appearance
+        self.num_samples: int = 0
+        self.total_period: int = 0  # nanoseconds
+        self._stack_nodes: Dict[Tuple[Symbol, ...], StackNode] = {}
+
+    def get_node(self, stack: Tuple[Symbol, ...]) -> StackNode:
+        """
+        Finds the node of a stack, inserting it if it is new.
+        :param stack: symbols of the stack in callchain order, so leaf first
+        :return: node where the stack ends
+        """
+        node = self._stack_nodes.get(stack)
+        if node is None:
+            node = self.root
+            for symbol in reversed(stack):
+                child = node.children.get(symbol)
+                if child is None:
+                    child = StackNode(symbol, node)
+                    node.children[symbol] = child
+                node = child
+            self._stack_nodes[stack] = node
+            self.stacks.append(node)
+        return node
+
+    def add_sample(self, stack: Tuple[Symbol, ...], period: int, energy: float, power: Optional[PowerSample]):
+        self.get_node(stack).add_sample(period, energy, power)
+        self.num_samples += 1
+        self.total_period += period
+
+    def add_state(self, state: AppState):
+        sample = state.sample.get_first_sample()
+        stack = (sample.symbol, *[entry.symbol for entry in sample.trace.entries])
+        self.add_sample(stack, state.period.to_nanos(), state.energy_consumed, state.power)
+
+    def __iter__(self) -> Iterator[StackNode]:
+        return iter(self.stacks)
+
+    def __len__(self):
+        return len(self.stacks)
+
+    @staticmethod
+    def from_states(states: Iterable[AppState]) -> "StackTrie":
+        trie = StackTrie()
+        for state in states:
+            trie.add_state(state)
+        return trie
+
+    @staticmethod
+    def from_table(table: TraceTable) -> "StackTrie":
+        """
+        Builds the trie from a TraceTable.  The samples are grouped by stack first, so the per-stack sums are done
+        with bincount instead of one sample at a time.
+        """
+        trie = StackTrie()
+        num_states = len(table)
+        symbols = table.symbol_table.symbols
+        frames = table.callchain_frames.tolist()
+        offsets = table.callchain_offsets.tolist()
+
+        stack_ids: Dict[Tuple[int, ...], int] = {}
+        stack_of_state = np.fromiter((stack_ids.setdefault((leaf, *frames[offsets[i]:offsets[i + 1]]), len(stack_ids))
+                                      for i, leaf in enumerate(table.symbol_id.tolist())),
+                                     dtype=np.int64, count=num_states)
+        num_stacks = len(stack_ids)
+        nodes = [trie.get_node(tuple(symbols[symbol_id] for symbol_id in stack)) for stack in stack_ids]
+
+        num_samples = np.bincount(stack_of_state, minlength=num_stacks).tolist()
+        period = np.zeros(num_stacks, dtype=np.int64)
+        np.add.at(period, stack_of_state, table.period)
+        energy = np.bincount(stack_of_state, weights=table.energy, minlength=num_stacks).tolist()
+        has_power = table.power_id >= 0
+        power = np.bincount(stack_of_state[has_power], weights=table.power[has_power], minlength=num_stacks).tolist()
+        # count every (stack, power log) pair
+        pairs = stack_of_state[has_power] * max(len(table.power_samples), 1) + table.power_id[has_power]
+        pairs, pair_counts = np.unique(pairs, return_counts=True)
+
+        for node, count, node_period, node_energy, node_power in zip(nodes, num_samples, period.tolist(), energy,
+                                                                     power):
+            node.num_samples += count
+            node.period += node_period
+            node.energy += node_energy
+            node.power += node_power
+        power_samples = table.power_samples
+        for pair, count in zip(pairs.tolist(), pair_counts.tolist()):
+            node = nodes[pair // len(power_samples)]
+            power_sample = power_samples[pair % len(power_samples)]
+            node.power_samples[power_sample] = node.power_samples.get(power_sample, 0) + count
+
+        trie.num_samples += num_states
+        trie.total_period += int(table.period.sum())
+        return trie
@@ -1,114 +1,142 @@
-import copy
-import math
+import numbers
 from decimal import *
 from typing import Union
 
+_NANOS_PER_MICRO = 1000
+_NANOS_PER_MILLI = 1000000
+_NANOS_PER_SECOND = 1000000000
 
-def _convert_up(input_number: int) -> (int, int):
-    # Each of the units contains 1000 of the unit below it.
-    # By taking advantage of this, we can use one function for converting
-    # each smaller unit into the larger unit
-    given_unit = input_number % 1000
-    higher_unit = math.floor(input_number / 1000)
-    return higher_unit, given_unit
+_DECIMAL_NANOS_PER_MICRO = Decimal(_NANOS_PER_MICRO)
+_DECIMAL_NANOS_PER_MILLI = Decimal(_NANOS_PER_MILLI)
+_DECIMAL_NANOS_PER_SECOND = Decimal(_NANOS_PER_SECOND)
 
 
-def _convert_float_down(input_number: Union[float, Decimal]) -> (int, Union[float, Decimal]):
-    # Takes a float number, extracts the integer portion, and returns the remainder *1000 to be converted downwards
-    # in unit.
-    given_unit = int(input_number)
-    remainder = (input_number % 1) * 1000
-    return given_unit, remainder
+def _to_nanos(value, nanos_per_unit: int) -> Union[int, Decimal]:
+    # ints stay exact ints, anything else goes through Decimal so that e.g. 0.3 seconds is 300000000 nanos
+    # instead of whatever the closest float happens to truncate to.
+    if isinstance(value, int):
+        return value * nanos_per_unit
+    if isinstance(value, Decimal):
+        return value * nanos_per_unit
+    if isinstance(value, numbers.Integral):
+        return int(value) * nanos_per_unit
+    return Decimal(repr(float(value))) * nanos_per_unit
 
 
 class TimeUnit(object):
     """
-    TimeUnit represents time internally as integer counters of nanos, micros, millis, and seconds.
-    It will automatically keep track of these to prevent overflowing, and will allow combining two objects.
+    TimeUnit represents an immutable amount of time as an integer number of nanoseconds.
+    Arithmetic returns new TimeUnits, so they can safely be shared (e.g. as default arguments).
     """
+    __slots__ = ('_nanos',)
 
     def __init__(self, seconds=0, millis=0, micros=0, nanos=0):
+        if type(seconds) is int and type(millis) is int and type(micros) is int and type(nanos) is int:
+            total = nanos + micros * _NANOS_PER_MICRO + millis * _NANOS_PER_MILLI + seconds * _NANOS_PER_SECOND
+        else:
+            # don't do any conversion to nanos until the end, we'll coerce it
+            total = int(_to_nanos(nanos, 1) + _to_nanos(micros, _NANOS_PER_MICRO)
+                        + _to_nanos(millis, _NANOS_PER_MILLI) + _to_nanos(seconds, _NANOS_PER_SECOND))
+        object.__setattr__(self, '_nanos', total)
+
+    @classmethod
+    def from_nanos(cls, nanos: int) -> "TimeUnit":
+        """
+        Fast constructor for hot loops, skips all the unit conversion.
+        :param nanos: integer number of nanoseconds
+        """
+        new = object.__new__(cls)
+        object.__setattr__(new, '_nanos', nanos)
+        return new
 
-        if isinstance(seconds, float) or isinstance(seconds, Decimal):
-            (seconds, new_millis) = _convert_float_down(seconds)
-            millis += new_millis
+    @property
+    def nanos(self) -> int:
+        return self._nanos
 
-        if isinstance(millis, float) or isinstance(millis, Decimal):
-            millis, new_micros = _convert_float_down(millis)
-            micros += new_micros
+    def __setattr__(self, key, value):
+        raise AttributeError('TimeUnit is immutable')
 
-        if isinstance(micros, float) or isinstance(millis, Decimal):
-            micros, new_nanos = _convert_float_down(micros)
-            nanos += new_nanos
+    def __delattr__(self, item):
+        raise AttributeError('TimeUnit is immutable')
 
-        # don't do any conversion to nanos, we'll coerce it
+    # pickles from before TimeUnit was slotted store a dict, so accept both
+    def __getstate__(self):
+        return self._nanos
 
-        self.nanos = int(nanos) + int(micros) * 1000 + int(millis) * 1000000 + int(seconds) * 10000000000
+    def __setstate__(self, state):
+        nanos = state['nanos'] if isinstance(state, dict) else state
+        object.__setattr__(self, '_nanos', nanos)
 
-    def __add__(self, other):
-        if not isinstance(other, TimeUnit):
-            raise TypeError(f'Unsupported operand type {type(other)}')
-        new = copy.copy(self)
-        new.nanos += other.nanos
-        return new
+    def __reduce__(self):
+        return TimeUnit.from_nanos, (self._nanos,)
 
-    def __iadd__(self, other):
+    def __add__(self, other):
         if not isinstance(other, TimeUnit):
             raise TypeError(f'Unsupported operand type {type(other)}')
-        self.nanos += other.nanos
-        return self
+        return TimeUnit.from_nanos(self._nanos + other._nanos)
 
     def __sub__(self, other):
         if not isinstance(other, TimeUnit):
             raise TypeError(f'Unsupported operand type {type(other)}')
-        new = copy.copy(self)
-        new.nanos -= other.nanos
-        return new
+        return TimeUnit.from_nanos(self._nanos - other._nanos)
 
-    def __isub__(self, other):
-        if not isinstance(other, TimeUnit):
-            raise TypeError(f'Unsupported operand type {type(other)}')
-        self.nanos -= other.nanos
-        return self
+    def __abs__(self):
+        return self if self._nanos >= 0 else TimeUnit.from_nanos(-self._nanos)
 
     def __eq__(self, other):
         if not isinstance(other, TimeUnit):
             raise TypeError(f'Unsupported operand type {type(other)}')
-        return self.nanos == other.nanos
+        return self._nanos == other._nanos
+
+    def __hash__(self):
+        return hash(self._nanos)
 
     def __gt__(self, other):
         if not isinstance(other, TimeUnit):
             raise TypeError(f'Unsupported operand type {type(other)}')
-        return self.nanos > other.nanos
+        return self._nanos > other._nanos
 
     def __ge__(self, other):
         if not isinstance(other, TimeUnit):
             raise TypeError(f'Unsupported operand type {type(other)}')
-        return self.nanos >= other.nanos
+        return self._nanos >= other._nanos
 
     def __lt__(self, other):
         if not isinstance(other, TimeUnit):
             raise TypeError(f'Unsupported operand type {type(other)}')
-        return self.nanos < other.nanos
+        return self._nanos < other._nanos
 
     def __le__(self, other):
         if not isinstance(other, TimeUnit):
             raise TypeError(f'Unsupported operand type {type(other)}')
-        return self.nanos <= other.nanos
+        return self._nanos <= other._nanos
 
     def __str__(self):
-        return f"{self.nanos}"
+        return f"{self._nanos}"
 
     # convert to decimals as there is a potential loss of precision. I don't think this is a realistic issue, but if
     # some timestamp is (ex.) millis since the unix epoch, it would cause issues as it is too large to fit in a float.
+    # use the float versions below in hot loops, where this precision isn't needed.
     def to_seconds(self) -> Decimal:
-        return Decimal(self.nanos) / Decimal(1e9)
+        return Decimal(self._nanos) / _DECIMAL_NANOS_PER_SECOND
 
     def to_millis(self) -> Decimal:
-        return Decimal(self.nanos) / Decimal(1e6)
+        return Decimal(self._nanos) / _DECIMAL_NANOS_PER_MILLI
 
     def to_micros(self) -> Decimal:
-        return Decimal(self.nanos) / Decimal(1e3)
+        return Decimal(self._nanos) / _DECIMAL_NANOS_PER_MICRO
 
     def to_nanos(self) -> int:
-        return self.nanos
+        return self._nanos
+
+    def to_seconds_float(self) -> float:
+        return self._nanos / _NANOS_PER_SECOND
+
+    def to_millis_float(self) -> float:
+        return self._nanos / _NANOS_PER_MILLI
+
+    def to_micros_float(self) -> float:
+        return self._nanos / _NANOS_PER_MICRO
+
+
+TimeUnit.ZERO = TimeUnit.from_nanos(0)
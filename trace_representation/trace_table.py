@@ -0,0 +1,294 @@
+from array import array
+from typing import List, Optional, Iterator, Iterable, Dict, Tuple
+
+import numpy as np
+
+from trace_representation.app_sample import AppState, AppSample, EnvironmentState, ThreadSample, PowerSample
+from trace_representation.simpleperf_python_datatypes import SymbolTable, Symbol, CallChain, CallChainEntry
+from trace_representation.time_unit import TimeUnit
+
+
+class TraceTable(object):
+    """
+    Columnar version of a list of AppStates.  Instead of an object graph per sample, every field is stored in
+    one array with one entry per sample:
+    timestamp: sample timestamp in nanoseconds
+    period: sample period in nanoseconds
+    energy: energy consumed by the sample in joules
+    power: power in watts at the time of the sample
+    power_id: index of the sample's PowerSample in power_samples, -1 if the power has not been joined yet
+    symbol_id: index of the symbol of the sample (the leaf of the callchain) in the symbol table
+    The callchains are stored CSR-style: the frames of sample i are
+    callchain_frames[callchain_offsets[i]:callchain_offsets[i + 1]], in the same order as CallChain.entries,
+    with the matching instruction pointers in callchain_ips and addresses in the file in callchain_vaddrs (the
+    interned Symbols only have the vaddr of the first entry they were seen in).
+    Samples from simpleperf are in time order.  For a table in time order, time windows are found with a binary
+    search on timestamp instead of a scan over all the samples, see get_window_indices.
+    """
+
+    def __init__(self, timestamp: np.ndarray, period: np.ndarray, symbol_id: np.ndarray,
+                 callchain_offsets: np.ndarray, callchain_frames: np.ndarray, callchain_ips: np.ndarray,
+                 symbol_table: SymbolTable, energy: Optional[np.ndarray] = None, power: Optional[np.ndarray] = None,
+                 power_id: Optional[np.ndarray] = None, power_samples: Optional[List[PowerSample]] = None,
+                 callchain_vaddrs: Optional[np.ndarray] = None):
+        num_samples = len(timestamp)
+        self.timestamp: np.ndarray = timestamp
+        self.period: np.ndarray = period
+        self.symbol_id: np.ndarray = symbol_id
+        self.callchain_offsets: np.ndarray = callchain_offsets
+        self.callchain_frames: np.ndarray = callchain_frames
+        self.callchain_ips: np.ndarray = callchain_ips
+        self.callchain_vaddrs: np.ndarray = callchain_vaddrs if callchain_vaddrs is not None \
+            else np.zeros(len(callchain_frames), dtype=np.uint64)
+        self.symbol_table: SymbolTable = symbol_table
+        self.energy: np.ndarray = energy if energy is not None else np.zeros(num_samples, dtype=np.float64)
+        self.power: np.ndarray = power if power is not None else np.zeros(num_samples, dtype=np.float64)
+        self.power_id: np.ndarray = power_id if power_id is not None else np.full(num_samples, -1, dtype=np.int64)
+        self.power_samples: List[PowerSample] = power_samples if power_samples is not None else []
+        self._time_sorted: Optional[bool] = None
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # tables pickled before the vaddrs were kept don't have them
+        if 'callchain_vaddrs' not in state:
+            self.callchain_vaddrs = np.zeros(len(self.callchain_frames), dtype=np.uint64)
+
+    def __iter__(self) -> Iterator[AppState]:
+        return self.iter_states()
+
+    def get_frames(self, index: int) -> np.ndarray:
+        """
+        :param index: index of the sample
+        :return: symbol ids of the callchain of the sample
+        """
+        return self.callchain_frames[self.callchain_offsets[index]:self.callchain_offsets[index + 1]]
+
+    def get_state(self, index: int) -> AppState:
+        """
+        Materializes a single sample as an AppState.  The Symbols are shared with the symbol table.
+        :param index: index of the sample
+        :return: new AppState for the sample
+        """
+        symbols = self.symbol_table.symbols
+        begin = self.callchain_offsets[index]
+        end = self.callchain_offsets[index + 1]
+        chain = CallChain.__new__(CallChain)
+        chain.entries = [_make_entry(ip, vaddr, symbols[frame]) for ip, vaddr, frame in
+                         zip(self.callchain_ips[begin:end].tolist(), self.callchain_vaddrs[begin:end].tolist(),
+                             self.callchain_frames[begin:end].tolist())]
+        power_id = self.power_id[index]
+        power = self.power_samples[power_id] if power_id >= 0 else None
+        thread_sample = ThreadSample(symbols[self.symbol_id[index]], chain)
+        return AppState(TimeUnit.from_nanos(int(self.timestamp[index])), TimeUnit.from_nanos(int(self.period[index])),
+                        float(self.energy[index]), AppSample([thread_sample]), EnvironmentState(), power)
+
+    def select(self, keep: np.ndarray) -> "TraceTable":
+        """
+        :param keep: boolean mask with one entry per sample
+        :return: new TraceTable with only the samples in keep, sharing the symbol table and PowerSamples
+        """
+        lengths = np.diff(self.callchain_offsets)
+        frame_keep = np.repeat(keep, lengths)
+        offsets = np.zeros(np.count_nonzero(keep) + 1, dtype=np.int64)
+        np.cumsum(lengths[keep], out=offsets[1:])
+        return TraceTable(self.timestamp[keep], self.period[keep], self.symbol_id[keep], offsets,
+                          self.callchain_frames[frame_keep], self.callchain_ips[frame_keep], self.symbol_table,
+                          self.energy[keep], self.power[keep], self.power_id[keep], self.power_samples,
+                          self.callchain_vaddrs[frame_keep])
+
+    def take(self, indices: np.ndarray) -> "TraceTable":
+        """
+        :param indices: indices of the samples to take, in the order they should be in
+        :return: new TraceTable with the given samples, sharing the symbol table and PowerSamples
+        """
+        lengths = np.diff(self.callchain_offsets)[indices]
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        frame_pos = np.repeat(self.callchain_offsets[:-1][indices] - offsets[:-1], lengths) + \
+            np.arange(offsets[-1], dtype=np.int64)
+        return TraceTable(self.timestamp[indices], self.period[indices], self.symbol_id[indices], offsets,
+                          self.callchain_frames[frame_pos], self.callchain_ips[frame_pos], self.symbol_table,
+                          self.energy[indices], self.power[indices], self.power_id[indices], self.power_samples,
+                          self.callchain_vaddrs[frame_pos])
+
+    def slice(self, begin: int, end: int) -> "TraceTable":
+        """
+        :param begin: index of the first sample
+        :param end: index after the last sample
+        :return: TraceTable with the samples begin up to end.  Its columns are views on the columns of this table.
+        """
+        frame_begin = self.callchain_offsets[begin]
+        frame_end = self.callchain_offsets[end]
+        table = TraceTable(self.timestamp[begin:end], self.period[begin:end], self.symbol_id[begin:end],
+                           self.callchain_offsets[begin:end + 1] - frame_begin,
+                           self.callchain_frames[frame_begin:frame_end], self.callchain_ips[frame_begin:frame_end],
+                           self.symbol_table, self.energy[begin:end], self.power[begin:end],
+                           self.power_id[begin:end], self.power_samples, self.callchain_vaddrs[frame_begin:frame_end])
+        table._time_sorted = self.is_time_sorted() or None
+        return table
+
+    def is_time_sorted(self) -> bool:
+        """
+        :return: whether the samples are in time order.  Checked once, the table is not supposed to be modified.
+        """
+        # tables pickled before the time index was added don't have the attribute
+        time_sorted = getattr(self, '_time_sorted', None)
+        if time_sorted is None:
+            time_sorted = bool(np.all(self.timestamp[1:] >= self.timestamp[:-1]))
+            self._time_sorted = time_sorted
+        return time_sorted
+
+    def sort_by_time(self) -> "TraceTable":
+        """
+        :return: this table if it is in time order, otherwise a copy with the samples stably sorted on timestamp
+        """
+        if self.is_time_sorted():
+            return self
+        table = self.take(np.argsort(self.timestamp, kind='stable'))
+        table._time_sorted = True
+        return table
+
+    def get_window_indices(self, begin_time: Optional[TimeUnit] = None,
+                           end_time: Optional[TimeUnit] = None) -> Tuple[int, int]:
+        """
+        Binary search for a time window.  Only valid for a table in time order.
+        :param begin_time: if given, the window starts at this time
+        :param end_time: if given, the window ends at this time (inclusive)
+        :return: index of the first sample in the window and the index after the last one
+        """
+        begin = 0 if begin_time is None else int(np.searchsorted(self.timestamp, begin_time.to_nanos(), 'left'))
+        end = len(self) if end_time is None else int(np.searchsorted(self.timestamp, end_time.to_nanos(), 'right'))
+        return begin, max(begin, end)
+
+    def between(self, begin_time: Optional[TimeUnit] = None, end_time: Optional[TimeUnit] = None) -> "TraceTable":
+        """
+        :param begin_time: if given, drop the samples before this time
+        :param end_time: if given, drop the samples after this time
+        :return: TraceTable with the samples in the (inclusive) time window, or this table if there is no window
+        """
+        if begin_time is None and end_time is None:
+            return self
+        if self.is_time_sorted():
+            return self.slice(*self.get_window_indices(begin_time, end_time))
+        keep = np.ones(len(self), dtype=bool)
+        if begin_time is not None:
+            keep &= self.timestamp >= begin_time.to_nanos()
+        if end_time is not None:
+            keep &= self.timestamp <= end_time.to_nanos()
+        return self.select(keep)
+
+    def iter_states(self) -> Iterator[AppState]:
+        """
+        Materializes the samples as AppStates one at a time, so the table can be used by anything that takes a
+        list of AppStates without holding all of them in memory.
+        """
+        for index in range(len(self)):
+            yield self.get_state(index)
+
+    @staticmethod
+    def from_states(states: Iterable[AppState], power_samples: Optional[List[PowerSample]] = None) -> "TraceTable":
+        """
+        Converts AppStates into a TraceTable.
+        :param states: AppStates to convert
+        :param power_samples: PowerSamples that the states refer to.  PowerSamples not in this list are appended.
+        :return: TraceTable containing the same samples
+        """
+        builder = TraceTableBuilder(power_samples=power_samples)
+        for state in states:
+            builder.add_state(state)
+        return builder.build()
+
+
+def _make_entry(ip: int, vaddr: int, symbol: Symbol) -> CallChainEntry:
+    entry = CallChainEntry.__new__(CallChainEntry)
+    entry.ip = ip
+    entry.vaddr = vaddr
+    entry.symbol = symbol
+    return entry
+
+
+class TraceTableBuilder(object):
+    """
+    Collects samples into growable typed arrays, then converts them into a TraceTable in one go.
+    """
+
+    def __init__(self, symbol_table: Optional[SymbolTable] = None, power_samples: Optional[List[PowerSample]] = None):
+        self.symbol_table: SymbolTable = symbol_table if symbol_table is not None else SymbolTable()
+        self.power_samples: List[PowerSample] = list(power_samples) if power_samples is not None else []
+        self._power_ids: Dict[PowerSample, int] = {sample: index for index, sample in enumerate(self.power_samples)}
+        self._timestamp = array('q')
+        self._period = array('q')
+        self._symbol_id = array('q')
+        self._offsets = array('q', [0])
+        self._frames = array('q')
+        self._ips = array('Q')
+        self._vaddrs = array('Q')
+        self._energy = array('d')
+        self._power = array('d')
+        self._power_id = array('q')
+
+    def add_sample(self, timestamp: int, period: int, symbol_id: int, frames: Iterable[int], ips: Iterable[int],
+                   energy: float = 0.0, power: float = 0.0, power_id: int = -1,
+                   vaddrs: Optional[Iterable[int]] = None):
+        """
+        Adds one sample.
+        :param timestamp: timestamp in nanoseconds
+        :param period: period in nanoseconds
+        :param symbol_id: id of the sample's symbol in the symbol table
+        :param frames: ids of the symbols in the callchain
+        :param ips: instruction pointers of the callchain entries
+        :param energy: energy consumed in joules
+        :param power: power in watts
+        :param power_id: index of the PowerSample in power_samples
+        :param vaddrs: addresses in the file of the callchain entries, 0 for every entry if not given
+        """
+        self._timestamp.append(timestamp)
+        self._period.append(period)
+        self._symbol_id.append(symbol_id)
+        self._frames.extend(frames)
+        self._ips.extend(ips)
+        if vaddrs is not None:
+            self._vaddrs.extend(vaddrs)
+        self._vaddrs.extend([0] * (len(self._frames) - len(self._vaddrs)))
+        self._offsets.append(len(self._frames))
+        self._energy.append(energy)
+        self._power.append(power)
+        self._power_id.append(power_id)
+
+    def add_state(self, state: AppState):
+        sample = state.sample.get_first_sample()
+        symbol_table = self.symbol_table
+        entries = sample.trace.entries
+        power_id = -1
+        power = 0.0
+        if state.power is not None:
+            power = state.power.power
+            power_id = self._power_ids.get(state.power, -1)
+            if power_id == -1:
+                power_id = len(self.power_samples)
+                self.power_samples.append(state.power)
+                self._power_ids[state.power] = power_id
+
+        self.add_sample(state.timestamp.to_nanos(), state.period.to_nanos(), symbol_table.add_symbol(sample.symbol),
+                        [symbol_table.add_symbol(entry.symbol) for entry in entries],
+                        [entry.ip for entry in entries], state.energy_consumed, power, power_id,
+                        [entry.vaddr for entry in entries])
+
+    def build(self) -> TraceTable:
+        return TraceTable(
+            timestamp=np.frombuffer(self._timestamp, dtype=np.int64).copy(),
+            period=np.frombuffer(self._period, dtype=np.int64).copy(),
+            symbol_id=np.frombuffer(self._symbol_id, dtype=np.int64).copy(),
+            callchain_offsets=np.frombuffer(self._offsets, dtype=np.int64).copy(),
+            callchain_frames=np.frombuffer(self._frames, dtype=np.int64).copy(),
+            callchain_ips=np.frombuffer(self._ips, dtype=np.uint64).copy(),
+            symbol_table=self.symbol_table,
+            energy=np.frombuffer(self._energy, dtype=np.float64).copy(),
+            power=np.frombuffer(self._power, dtype=np.float64).copy(),
+            power_id=np.frombuffer(self._power_id, dtype=np.int64).copy(),
+            power_samples=self.power_samples,
+            callchain_vaddrs=np.frombuffer(self._vaddrs, dtype=np.uint64).copy()
+        )